@@ -1,33 +1,206 @@
+import json
 import subprocess
+import threading
 import time
+import urllib.error
+import urllib.request
 from appium.webdriver.appium_service import AppiumService
+from device_actions import DeviceActions
+from transport import close_pools
 import os
 
 CURRENT_FILE = os.path.basename(__file__)
+# Runtime state shared between runs on this machine, kept out of the source tree
+STATE_DIR = os.environ.get('AUTOMATION_STATE_DIR', os.path.join(os.path.expanduser('~'), '.appcard-automation'))
+SESSION_FILE = os.path.join(STATE_DIR, "sessions.json")
+# Seconds a pooled session may sit idle before Appium ends it. Appium's own default (60s) is shorter
+# than the gap between two --reuse runs or two daemon jobs, which would leave only dead sessions to reuse.
+NEW_COMMAND_TIMEOUT = int(os.environ.get('APPIUM_NEW_COMMAND_TIMEOUT', 3600))
+
+# Pools for several devices may update the session file from different threads.
+_session_file_lock = threading.Lock()
 
 class AppiumManager:
     """Manages the Appium server lifecycle."""
 
-    def __init__(self, port=4723):
+    def __init__(self, port=4723, host='127.0.0.1', keep_alive=False):
         self.port = port
+        self.host = host
+        self.keep_alive = keep_alive
+        self.owns_server = False
         self.service = AppiumService()
 
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def is_server_ready(self, timeout=1):
+        """Returns True if an Appium server answers /status on this port and reports itself ready."""
+        try:
+            with urllib.request.urlopen(f"{self.url}/status", timeout=timeout) as response:
+                status = json.loads(response.read().decode('utf-8'))
+        except (urllib.error.URLError, OSError, ValueError):
+            return False
+        value = status.get('value') or {}
+        return value.get('ready', True) is not False
+
+    def wait_until_ready(self, timeout=60):
+        """Polls the /status health check until the server is ready, instead of sleeping a fixed time."""
+        start = time.monotonic()
+        interval = 0.1
+        while time.monotonic() - start < timeout:
+            if self.is_server_ready():
+                print(f"✅ Appium server ready after {time.monotonic() - start:.2f}s. (from {CURRENT_FILE})")
+                return True
+            time.sleep(interval)
+            interval = min(interval * 1.5, 1.0)
+        raise TimeoutError(f"Appium server at {self.url} was not ready within {timeout}s")
+
     def start_server(self):
-        """Starts the Appium server."""
+        """Attaches to an Appium server already running on this port, or starts one."""
+        if self.is_server_ready():
+            print(f"♻️ Attaching to the running Appium server at {self.url} (from {CURRENT_FILE})")
+            return
         print("🚀 Starting Appium server...")
         try:
-            self.service.start()
+            # A long-lived server must not write into pipes nobody reads, or it blocks once they fill up.
+            output = subprocess.DEVNULL if self.keep_alive else subprocess.PIPE
+            self.service.start(
+                args=['--address', self.host, '--port', str(self.port)],
+                timeout_ms=0,
+                stdout=output,
+                stderr=output,
+            )
+            self.owns_server = True
+            self.wait_until_ready()
             print("✅ Appium server started successfully.")
-            time.sleep(5)  # Give the server a moment to get ready
         except Exception as e:
             print(f"❌ Failed to start Appium server: {e}")
             raise
 
     def stop_server(self):
-        """Stops the Appium server."""
+        """Stops the Appium server, unless it is kept alive for later runs or was started by someone else."""
+        if self.keep_alive or not self.owns_server:
+            print(f"♻️ Leaving the Appium server at {self.url} running. (from {CURRENT_FILE})")
+            return
         print("👋 Shutting down Appium server...")
+        close_pools(self.url)
         try:
             self.service.stop()
+            self.owns_server = False
             print("✅ Appium server shut down.")
         except Exception as e:
-            print(f"❌ Failed to stop Appium server: {e}")
\ No newline at end of file
+            print(f"❌ Failed to stop Appium server: {e}")
+
+
+class SessionPool:
+    """
+    Keeps one warmed driver session per device and hands it to successive flows.
+    Session ids are saved to a file so the next run can re-attach instead of creating a new
+    session; only the app state is reset between flows. Sessions are created with a
+    newCommandTimeout of new_command_timeout seconds (unless the capabilities set one), so they
+    outlive the idle time between runs.
+    """
+
+    def __init__(self, appium_url, session_file=SESSION_FILE, reset_mode='clear', new_command_timeout=NEW_COMMAND_TIMEOUT):
+        self.appium_url = appium_url
+        self.session_file = session_file
+        self.reset_mode = reset_mode
+        self.new_command_timeout = new_command_timeout
+        self.sessions = {}
+
+    @staticmethod
+    def device_key(capabilities):
+        return capabilities.get('udid') or capabilities.get('deviceName')
+
+    def acquire(self, capabilities, reset=True):
+        """
+        Returns a connected DeviceActions for the device, reusing a live session when possible.
+        A reused session has its app state reset unless reset=False (e.g. to resume a flow where it stopped).
+        """
+        device = self.device_key(capabilities)
+        device_actions = self.sessions.get(device)
+        if device_actions and device_actions.is_session_alive():
+            print(f"♻️ Reusing the in-process session for {device} (from {CURRENT_FILE})")
+            if reset:
+                self.reset_app_state(device_actions, capabilities)
+            return device_actions
+
+        session_id = self._load().get(device)
+        if session_id:
+            device_actions = DeviceActions(self.appium_url)
+            device_actions.attach(session_id, capabilities)
+            if device_actions.is_session_alive():
+                print(f"♻️ Re-attached to session {session_id} for {device} (from {CURRENT_FILE})")
+                self.sessions[device] = device_actions
+                if reset:
+                    self.reset_app_state(device_actions, capabilities)
+                return device_actions
+            print(f"⚠️ Saved session {session_id} for {device} is gone, creating a new one. (from {CURRENT_FILE})")
+
+        device_actions = DeviceActions(self.appium_url)
+        device_actions.connect(dict({'newCommandTimeout': self.new_command_timeout}, **capabilities))
+        self.sessions[device] = device_actions
+        self._save(device, device_actions.driver.session_id)
+        return device_actions
+
+    def reset_app_state(self, device_actions, capabilities):
+        """
+        Brings the app back to a fresh start without a new session.
+        'clear' wipes app data like noReset=False does; 'restart' only relaunches the app.
+        """
+        app_package = capabilities['appPackage']
+        print(f"🔄 Resetting app state for {app_package} ({self.reset_mode}) (from {CURRENT_FILE})")
+        if self.reset_mode == 'clear':
+            device_actions.driver.execute_script('mobile: clearApp', {'appId': app_package})
+        else:
+            device_actions.driver.terminate_app(app_package)
+        device_actions.driver.activate_app(app_package)
+        device_actions.invalidate_snapshot()
+        device_actions.invalidate_keypad()
+
+    def release(self, device_actions, keep=True):
+        """Returns a session to the pool; with keep=False the session is closed and forgotten."""
+        device = next((key for key, value in self.sessions.items() if value is device_actions), None)
+        if keep:
+            return
+        device_actions.quit()
+        if device:
+            self.sessions.pop(device, None)
+            self._save(device, None)
+
+    def close_all(self):
+        """Quits every pooled session and clears the saved session ids."""
+        for device_actions in self.sessions.values():
+            device_actions.quit()
+        self.sessions = {}
+        if os.path.exists(self.session_file):
+            os.remove(self.session_file)
+
+    def _load(self):
+        if not os.path.exists(self.session_file):
+            return {}
+        try:
+            with open(self.session_file, 'r') as f:
+                saved = json.load(f)
+        except (ValueError, OSError):
+            return {}
+        return saved.get(self.appium_url, {})
+
+    def _save(self, device, session_id):
+        with _session_file_lock:
+            saved = {}
+            if os.path.exists(self.session_file):
+                try:
+                    with open(self.session_file, 'r') as f:
+                        saved = json.load(f)
+                except (ValueError, OSError):
+                    saved = {}
+            sessions = saved.setdefault(self.appium_url, {})
+            if session_id:
+                sessions[device] = session_id
+            else:
+                sessions.pop(device, None)
+            os.makedirs(os.path.dirname(os.path.abspath(self.session_file)), exist_ok=True)
+            with open(self.session_file, 'w') as f:
+                json.dump(saved, f, indent=2)
@@ -0,0 +1,191 @@
+import base64
+import gzip
+import json
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from screens import APPCARD_SCREENS
+from ui_snapshot import UiSnapshot
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+RING_CAPACITY = 200
+
+
+class ArtifactRecorder:
+    """
+    Keeps the last RING_CAPACITY driver commands of a run in a ring buffer and, when a step fails,
+    saves what is needed to debug it without a rerun: a screenshot, the page source, the logcat
+    entries since the oldest buffered command, the buffered commands and the run state.
+
+    A passing run only pays for one deque append per command. On a failure the three captures are
+    fetched right away, while the device still shows the failure; compressing and writing them is
+    left to a background worker so the flow's own error handling is not held up.
+    """
+
+    def __init__(self, run_id=None, output_dir=ARTIFACTS_DIR, capacity=RING_CAPACITY):
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.output_dir = output_dir
+        self.commands = deque(maxlen=capacity)
+        self.state = {}
+        self.captures = []
+        self._device_actions = None
+        self._executor = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def attach(self, device_actions):
+        """Starts recording the commands of a connected DeviceActions."""
+        self._device_actions = device_actions
+        self._hook_driver()
+        return self
+
+    def _hook_driver(self):
+        """Records every command the driver sends; re-hooks after a reconnect creates a new driver."""
+        driver = self._device_actions.driver if self._device_actions else None
+        if driver is None or getattr(driver, '_artifact_recorder', None) is self:
+            return
+        execute = driver.execute
+        commands = self.commands
+
+        def recorded_execute(driver_command, params=None):
+            # [wall clock, command, params, ms or error]; formatted only if a capture needs it
+            entry = [time.time(), driver_command, params, None]
+            commands.append(entry)
+            start = time.perf_counter()
+            try:
+                response = execute(driver_command, params)
+            except Exception as e:
+                entry[3] = e.__class__.__name__
+                raise
+            entry[3] = round((time.perf_counter() - start) * 1000, 1)
+            return response
+
+        driver.execute = recorded_execute
+        driver._artifact_recorder = self
+
+    def note(self, **state):
+        """Records run state (phone number, device, ...) that is saved with every capture."""
+        self.state.update(state)
+
+    @contextmanager
+    def step(self, name):
+        """Captures artifacts if the step raises; the exception is re-raised unchanged."""
+        self._hook_driver()
+        previous_step = self.state.get('step')
+        self.state['step'] = name
+        try:
+            yield
+        except Exception as e:
+            if not getattr(e, '_artifacts_captured', False):
+                self.capture(name, e)
+            raise
+        finally:
+            self.state['step'] = previous_step
+
+    def capture(self, name, error=None):
+        """Fetches the failure captures from the device and queues them for writing. Returns the directory."""
+        driver = self._device_actions.driver if self._device_actions else None
+        if error is not None:
+            try:
+                error._artifacts_captured = True
+            except AttributeError:
+                pass
+        since = self.commands[0][0] if self.commands else time.time()
+        records = list(self.commands)
+        captured = {}
+        failures = {}
+        # A logcat stream has already drained the device's logcat; take the lines from its buffer
+        stream = getattr(self._device_actions, 'log_stream', None)
+        fetch_logcat = (lambda: [{'timestamp': int(received * 1000), 'message': line}
+                                 for received, line in stream.recent_lines(since)]) if stream else \
+            (lambda: driver.get_log('logcat'))
+        for kind, fetch in (('screenshot', lambda: driver.get_screenshot_as_base64()),
+                            ('page_source', lambda: driver.page_source),
+                            ('logcat', fetch_logcat)):
+            if driver is None:
+                failures[kind] = 'no driver'
+                continue
+            try:
+                captured[kind] = fetch()
+            except Exception as e:
+                failures[kind] = f"{e.__class__.__name__}: {e}".strip()
+        with self._lock:
+            index = len(self.captures) + 1
+            directory = os.path.join(self.output_dir, self.run_id, f"{index:02d}-{_slug(name)}")
+            self.captures.append(directory)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='artifact-writer')
+            context = {
+                'step': name,
+                'error': f"{error.__class__.__name__}: {error}" if error is not None else None,
+                'traceback': ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+                if error is not None else None,
+                'captured_at': datetime.now().isoformat(),
+                'state': dict(self.state),
+                'capture_failures': failures,
+            }
+            self._pending.append(self._executor.submit(self._write, directory, context, records, since, captured))
+        print(f"📦 Capturing failure artifacts for '{name}' to {directory} (from {CURRENT_FILE})")
+        return directory
+
+    def _write(self, directory, context, records, since, captured):
+        os.makedirs(directory, exist_ok=True)
+        if 'screenshot' in captured:
+            # PNG is already compressed
+            with open(os.path.join(directory, 'screenshot.png'), 'wb') as f:
+                f.write(base64.b64decode(captured['screenshot']))
+        if 'page_source' in captured:
+            _write_gzip(os.path.join(directory, 'page_source.xml.gz'), captured['page_source'])
+            try:
+                context['screen'] = APPCARD_SCREENS.classify(UiSnapshot(captured['page_source']))
+            except Exception:
+                context['screen'] = None
+        if 'logcat' in captured:
+            lines = [f"{entry.get('timestamp')} {entry.get('level', '')} {entry.get('message', '')}"
+                     for entry in captured['logcat'] if (entry.get('timestamp') or 0) >= since * 1000]
+            _write_gzip(os.path.join(directory, 'logcat.txt.gz'), '\n'.join(lines) + '\n')
+        context['commands'] = [
+            {'at': round(at, 3), 'command': command, 'params': params, 'result': result}
+            for at, command, params, result in records
+        ]
+        _write_gzip(os.path.join(directory, 'context.json.gz'),
+                    json.dumps(context, indent=2, ensure_ascii=False, default=str))
+        return directory
+
+    def flush(self):
+        """Waits for queued captures to be written and returns their directories."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        written = []
+        for future in pending:
+            try:
+                written.append(future.result())
+            except Exception as e:
+                print(f"⚠️ Failed to write failure artifacts: {e} (from {CURRENT_FILE})")
+        return written
+
+    def close(self):
+        """Writes out queued captures and stops the writer."""
+        written = self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for directory in written:
+            print(f"📦 Failure artifacts written to {directory} (from {CURRENT_FILE})")
+        return written
+
+
+def _slug(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'step'
+
+
+def _write_gzip(path, text):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(text)
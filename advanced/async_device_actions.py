@@ -0,0 +1,443 @@
+import asyncio
+import base64
+import time
+from appium.options.android import UiAutomator2Options
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common.exceptions import (
+    InvalidArgumentException, InvalidSelectorException, InvalidSessionIdException, NoSuchElementException,
+    StaleElementReferenceException, TimeoutException, WebDriverException,
+)
+from device_actions import (
+    INITIAL_POLL_INTERVAL, KEY_GAP_SECONDS, KEY_PRESS_SECONDS, KEYPAD_BUTTON_CLASS, KEYPAD_DELETE, MAX_POLL_INTERVAL,
+    POLL_BACKOFF, UNSUPPORTED_LOCATOR_ERRORS, keypad_echo, locators_for, text_locators,
+)
+from screens import APPCARD_SCREENS, UnexpectedScreenError
+from ui_snapshot import UiSnapshot
+import visual
+import os
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+CURRENT_FILE = os.path.basename(__file__)
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+DEFAULT_POOL_SIZE = 8
+
+# W3C error codes -> the exceptions the synchronous client raises for them
+W3C_ERRORS = {
+    'no such element': NoSuchElementException,
+    'stale element reference': StaleElementReferenceException,
+    'invalid selector': InvalidSelectorException,
+    'invalid argument': InvalidArgumentException,
+    'invalid session id': InvalidSessionIdException,
+}
+TRANSIENT_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+
+def create_http_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Returns a pooled aiohttp session. Share one between devices on the same event loop:
+    each Appium server gets up to pool_size keep-alive connections.
+    """
+    if aiohttp is None:
+        raise ImportError("aiohttp is required for AsyncDeviceActions: pip install aiohttp")
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=0, limit_per_host=pool_size),
+        timeout=aiohttp.ClientTimeout(total=120),
+    )
+
+
+class AsyncDeviceActions:
+    """
+    An asyncio counterpart of DeviceActions that talks W3C WebDriver to the Appium server
+    directly over a pooled HTTP client. Independent checks can be in flight at the same time
+    (see validate_all), and many devices can be driven from one event loop.
+    """
+
+    def __init__(self, appium_url='http://localhost:4723', http_session=None, pool_size=DEFAULT_POOL_SIZE,
+                 screens=None):
+        self.appium_url = appium_url.rstrip('/')
+        self.screens = screens or APPCARD_SCREENS
+        self.session_id = None
+        self.wait_log = []
+        self.locator_stats = {}
+        self.command_count = 0
+        self._http = http_session
+        self._owns_http = http_session is None
+        self._pool_size = pool_size
+        self._keypad = None
+        # See DeviceActions.visual_mode
+        self.visual_mode = None
+        self.visual_warnings = []
+
+    async def _command(self, method, path, payload=None):
+        """Sends one WebDriver command and returns its 'value', raising the matching WebDriverException."""
+        if self._http is None:
+            self._http = create_http_session(self._pool_size)
+        if self.session_id:
+            path = f"/session/{self.session_id}{path}"
+        self.command_count += 1
+        async with self._http.request(method, self.appium_url + path, json=payload) as response:
+            body = await response.json(content_type=None)
+        value = (body or {}).get('value')
+        if response.status >= 400 or (isinstance(value, dict) and 'error' in value):
+            error = value.get('error', '') if isinstance(value, dict) else ''
+            message = value.get('message', '') if isinstance(value, dict) else str(body)
+            raise W3C_ERRORS.get(error, WebDriverException)(f"{error}: {message}" if error else message)
+        return value
+
+    # --- session -------------------------------------------------------------------------
+
+    async def connect(self, capabilities):
+        """Creates a new session with the given capabilities."""
+        print(f"🔗 Attempting to connect to the device... (from {CURRENT_FILE})")
+        options = UiAutomator2Options().load_capabilities(capabilities)
+        self.session_id = None
+        payload = {'capabilities': {'alwaysMatch': options.to_capabilities(), 'firstMatch': [{}]}}
+        value = await self._command('POST', '/session', payload)
+        self.session_id = value['sessionId']
+        print(f"✅ Connection established. (from {CURRENT_FILE})")
+
+    def attach(self, session_id):
+        """Binds to an already running session on the Appium server."""
+        self.session_id = session_id
+
+    async def quit(self):
+        """Ends the session and closes the HTTP pool if this instance created it."""
+        try:
+            if self.session_id:
+                print(f"🔌 Closing the driver session... (from {CURRENT_FILE})")
+                await self._command('DELETE', '')
+                self.session_id = None
+        finally:
+            if self._owns_http and self._http is not None:
+                await self._http.close()
+                self._http = None
+
+    async def current_activity(self):
+        return await self._command('POST', '/execute/sync', {'script': 'mobile: getCurrentActivity', 'args': []})
+
+    async def page_source(self):
+        return await self._command('GET', '/source')
+
+    async def screenshot(self):
+        """The current screen as PNG bytes."""
+        return base64.b64decode(await self._command('GET', '/screenshot'))
+
+    # --- elements ------------------------------------------------------------------------
+
+    async def find_element(self, by, value):
+        """Returns the element reference (an id string) of the first match."""
+        found = await self._command('POST', '/element', {'using': by, 'value': value})
+        return found[ELEMENT_KEY]
+
+    async def find_elements(self, by, value):
+        found = await self._command('POST', '/elements', {'using': by, 'value': value})
+        return [element[ELEMENT_KEY] for element in found]
+
+    async def click(self, element):
+        await self._command('POST', f'/element/{element}/click', {})
+
+    async def text(self, element):
+        return await self._command('GET', f'/element/{element}/text')
+
+    async def is_displayed(self, element):
+        return await self._command('GET', f'/element/{element}/displayed')
+
+    async def is_enabled(self, element):
+        return await self._command('GET', f'/element/{element}/enabled')
+
+    async def send_keys(self, element, text):
+        await self._command('POST', f'/element/{element}/value', {'text': text, 'value': list(text)})
+
+    async def is_clickable(self, element):
+        """Displayed and enabled, with both properties fetched concurrently."""
+        displayed, enabled = await asyncio.gather(self.is_displayed(element), self.is_enabled(element))
+        return displayed and enabled
+
+    # --- waits ---------------------------------------------------------------------------
+
+    async def wait_for(self, check, description, timeout=10, replaces_sleep=0.0):
+        """
+        Polls an async check (a coroutine function taking this instance) with the same backoff
+        as DeviceActions.wait_for. Element-not-found-yet errors count as "not ready".
+        Returns the check's result and records the wait in wait_log.
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        interval = INITIAL_POLL_INTERVAL
+        polls = 0
+        while True:
+            polls += 1
+            try:
+                result = await check(self)
+            except TRANSIENT_EXCEPTIONS:
+                result = False
+            now = time.monotonic()
+            if result:
+                self._record_wait(description, now - start, polls, replaces_sleep, True)
+                return result
+            if now >= deadline:
+                self._record_wait(description, now - start, polls, replaces_sleep, False)
+                raise TimeoutException(f"Timed out after {timeout}s waiting for {description}")
+            await asyncio.sleep(min(interval, deadline - now))
+            interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+    def _record_wait(self, description, elapsed, polls, replaces_sleep, succeeded):
+        self.wait_log.append({
+            'condition': description,
+            'elapsed': elapsed,
+            'polls': polls,
+            'replaces_sleep': replaces_sleep,
+            'succeeded': succeeded,
+        })
+        status = "✅" if succeeded else "❌"
+        print(f"{status} Waited {elapsed:.2f}s for {description} ({polls} polls) (from {CURRENT_FILE})")
+
+    async def locate(self, candidates, call_site, timeout=10, clickable=False):
+        """Resolves an element from locator candidates, last winning strategy first (see DeviceActions.locate)."""
+        stats = self.locator_stats.get(call_site)
+        if stats:
+            candidates = sorted(candidates, key=lambda candidate: candidate[0] != stats['strategy'])
+        winner = []
+
+        usable = list(candidates)
+
+        async def check(actions):
+            while True:
+                strategy, by, value = usable[0]
+                try:
+                    element = await actions.find_element(by, value)
+                except UNSUPPORTED_LOCATOR_ERRORS:
+                    if len(usable) == 1:
+                        raise
+                    usable.pop(0)
+                    continue
+                if clickable and not await actions.is_clickable(element):
+                    return False
+                winner.append(strategy)
+                return element
+
+        start = time.monotonic()
+        if timeout:
+            element = await self.wait_for(check, call_site, timeout=timeout)
+        else:
+            element = await check(self)
+            if not element:
+                raise NoSuchElementException(f"No element found for {call_site}")
+        stats = self.locator_stats.setdefault(call_site, {'calls': 0, 'total_time': 0.0, 'wins': {}})
+        elapsed = time.monotonic() - start
+        stats['calls'] += 1
+        stats['total_time'] += elapsed
+        stats['wins'][winner[-1]] = stats['wins'].get(winner[-1], 0) + 1
+        stats['strategy'] = winner[-1]
+        stats['elapsed'] = elapsed
+        return element
+
+    # --- independent checks --------------------------------------------------------------
+
+    async def check(self, check, timeout=10):
+        """
+        Waits for one assertion tuple (the same forms as UiSnapshot.evaluate) using element queries.
+        Returns (passed, detail) instead of raising, so a batch can report every failure.
+        """
+        kind = check[0]
+        if kind == 'text_present':
+            detail = f"text '{check[1]}'"
+            candidates = text_locators(check[1], contains=True)
+
+            async def probe(actions):
+                element = await actions.locate(candidates, f"check:text_present:{check[1]}", timeout=0)
+                return await actions.is_displayed(element)
+        elif kind == 'element_present':
+            detail = f"element '{check[1]}'"
+
+            async def probe(actions):
+                return await actions.find_element(AppiumBy.ID, check[1])
+        elif kind == 'element_text':
+            detail = f"element '{check[1]}' text '{check[2]}'"
+
+            async def probe(actions):
+                return await actions.text(await actions.find_element(AppiumBy.ID, check[1])) == check[2]
+        elif kind == 'element_clickable':
+            detail = f"element '{check[1]}' clickable"
+
+            async def probe(actions):
+                return await actions.is_clickable(await actions.find_element(AppiumBy.ID, check[1]))
+        else:
+            raise ValueError(f"Unknown check: {kind}")
+        try:
+            await self.wait_for(probe, detail, timeout=timeout)
+            return True, detail
+        except TimeoutException:
+            return False, detail
+
+    async def validate_all(self, checks, timeout=10):
+        """
+        Runs independent checks concurrently, each with its own element queries and polling,
+        so the batch takes about as long as its slowest check. Returns (check, detail) pairs;
+        raises if any check does not pass within the timeout.
+        """
+        print(f"🔍 Validating {len(checks)} checks concurrently (from {CURRENT_FILE})")
+        results = await asyncio.gather(*(self.check(check, timeout) for check in checks))
+        failures = [detail for passed, detail in results if not passed]
+        if failures:
+            print(f"❌ Validation failed: {'; '.join(failures)} (from {CURRENT_FILE})")
+            raise Exception(f"Screen validation failed: {'; '.join(failures)}")
+        for _, detail in results:
+            print(f"✅ Validation successful: {detail} (from {CURRENT_FILE})")
+        return [(check, detail) for check, (_, detail) in zip(checks, results)]
+
+    async def validate_visual(self, regions, timeout=5, strict=None):
+        """
+        Checks that each region looks like its reference image in one screenshot, retaking it until
+        all pass (see DeviceActions.validate_visual). Returns the results; after the timeout raises,
+        or with strict=False warns and returns the last results; strict=None follows visual_mode.
+        """
+        print(f"🖼️ Validating {len(regions)} regions against one screenshot (from {CURRENT_FILE})")
+        failures = []
+        latest = []
+
+        async def check_all(actions):
+            # Decoding and matching is CPU work; keep it off the event loop
+            results, _ = await asyncio.to_thread(visual.check_regions, await actions.screenshot(), regions)
+            failures[:] = [result['detail'] for result in results if not result['passed']]
+            latest[:] = results
+            return None if failures else results
+
+        try:
+            results = await self.wait_for(check_all, f"{len(regions)} visual checks", timeout=timeout)
+        except TimeoutException:
+            if strict is None:
+                strict = self.visual_mode != 'warn'
+            if not strict:
+                print(f"⚠️ Visual mismatch, not failing the run: {'; '.join(failures)} (from {CURRENT_FILE})")
+                self.visual_warnings.extend(failures)
+                return list(latest)
+            print(f"❌ Visual validation failed: {'; '.join(failures)} (from {CURRENT_FILE})")
+            raise Exception(f"Visual validation failed: {'; '.join(failures)}")
+        for result in results:
+            print(f"✅ Visual validation successful: {result['detail']} (from {CURRENT_FILE})")
+        return results
+
+    # --- screens -------------------------------------------------------------------------
+
+    async def current_screen(self):
+        """Classifies the current screen from one hierarchy fetch (see DeviceActions.current_screen)."""
+        return self.screens.classify(UiSnapshot(await self.page_source()))
+
+    async def expect_screen(self, expected, leaving=(), timeout=10):
+        """
+        Waits until the terminal shows one of the expected screens and returns its name; any other
+        known screen than those in leaving raises UnexpectedScreenError at once (see DeviceActions.expect_screen).
+        """
+        expected = [expected] if isinstance(expected, str) else list(expected)
+        leaving = [leaving] if isinstance(leaving, str) else list(leaving)
+
+        async def check(actions):
+            screen = await actions.current_screen()
+            if screen in expected:
+                return screen
+            if screen is not None and screen not in leaving:
+                print(f"❌ Unexpected screen: {screen} (expected {' or '.join(expected)}) (from {CURRENT_FILE})")
+                raise UnexpectedScreenError(expected, screen)
+            return False
+
+        screen = await self.wait_for(check, f"screen {' or '.join(expected)}", timeout=timeout)
+        print(f"🧭 On the {screen} screen. (from {CURRENT_FILE})")
+        return screen
+
+    # --- actions -------------------------------------------------------------------------
+
+    async def enter_phone_number(self, phone_number):
+        """
+        Types a phone number on the keypad as one W3C actions sequence, reads it back and enters
+        it key by key if the taps missed (see DeviceActions.enter_phone_number).
+        """
+        print(f"📱 Entering phone number: {phone_number} (from {CURRENT_FILE})")
+        snapshot = UiSnapshot(await self.page_source())
+        screen = self.screens.classify(snapshot)
+        if (self._keypad is None or screen is None or self._keypad['screen'] != screen
+                or not set(phone_number) <= set(self._keypad['keys'])):
+            keys = {}
+            for node in snapshot.by_class.get(KEYPAD_BUTTON_CLASS, []):
+                if len(node.text) == 1 and node.text.isdigit() and node.center:
+                    keys[node.text] = node.center
+            self._keypad = {'screen': screen, 'keys': keys}
+        keys = self._keypad['keys']
+        missing = [digit for digit in phone_number if digit not in keys]
+        if missing:
+            raise NoSuchElementException(f"Keypad buttons not found for digits: {''.join(sorted(set(missing)))}")
+        expected = keypad_echo(snapshot) + phone_number
+        taps = []
+        for digit in phone_number:
+            x, y = keys[digit]
+            taps += [
+                {'type': 'pointerMove', 'duration': 0, 'x': x, 'y': y, 'origin': 'viewport'},
+                {'type': 'pointerDown', 'button': 0},
+                {'type': 'pause', 'duration': int(KEY_PRESS_SECONDS * 1000)},
+                {'type': 'pointerUp', 'button': 0},
+                {'type': 'pause', 'duration': int(KEY_GAP_SECONDS * 1000)},
+            ]
+        await self._command('POST', '/actions', {'actions': [
+            {'type': 'pointer', 'id': 'finger', 'parameters': {'pointerType': 'touch'}, 'actions': taps},
+        ]})
+        shown = keypad_echo(UiSnapshot(await self.page_source()))
+        if shown != expected:
+            print(f"⚠️ The keypad shows '{shown}' instead of '{expected}', entering it key by key. (from {CURRENT_FILE})")
+            self._keypad = None
+            for label in KEYPAD_DELETE * len(shown) + expected:
+                await self.click_by_id_or_text(text=label)
+            shown = keypad_echo(UiSnapshot(await self.page_source()))
+            if shown != expected:
+                raise Exception(f"The keypad shows '{shown}' instead of '{expected}'")
+        print(f"✅ Phone number entered successfully. (from {CURRENT_FILE})")
+
+    async def click_button_by_text(self, text):
+        """Finds and clicks a button by its text."""
+        print(f"🖱️ Clicking button with text: '{text}' (from {CURRENT_FILE})")
+        button = await self.locate(text_locators(text, 'android.widget.Button'), f"click_button_by_text:{text}", timeout=0)
+        await self.click(button)
+        print(f"✅ Button '{text}' clicked. (from {CURRENT_FILE})")
+
+    async def click_by_id_or_text(self, resource_id=None, text=None, timeout=10):
+        """Waits for an element by ID or button text to be clickable, then clicks it."""
+        if resource_id:
+            print(f"🖱️ Clicking element with ID: '{resource_id}' (from {CURRENT_FILE})")
+            candidates, call_site = locators_for(AppiumBy.ID, resource_id), f"click_by_id_or_text:{resource_id}"
+        elif text:
+            print(f"🖱️ Clicking element with text: '{text}' (from {CURRENT_FILE})")
+            candidates, call_site = text_locators(text, 'android.widget.Button'), f"click_by_id_or_text:{text}"
+        else:
+            raise ValueError("Must provide either a resource_id or text.")
+        try:
+            element = await self.locate(candidates, call_site, timeout, clickable=True)
+        except TimeoutException:
+            raise NoSuchElementException(f"Timed out waiting for element with {'ID' if resource_id else 'text'}: "
+                                         f"{resource_id or text}")
+        await self.click(element)
+        print(f"✅ Element clicked successfully. (from {CURRENT_FILE})")
+
+    async def wait_for_element_and_click(self, locator_type, locator_value, timeout=10, expected_text=None):
+        """Waits for an element, validates its text (if provided), and clicks it."""
+        print(f"⏳ Waiting for element: {locator_value} (from {CURRENT_FILE})")
+        element = await self.locate(locators_for(locator_type, locator_value),
+                                    f"wait_for_element_and_click:{locator_value}", timeout)
+        if expected_text:
+            found = await self.text(element)
+            assert found == expected_text, f"Element text mismatch. Expected '{expected_text}' but found '{found}'."
+        await self.click(element)
+        print(f"✅ Element found and clicked. (from {CURRENT_FILE})")
+        return element
+
+    async def enter_text_by_xpath(self, xpath, text, timeout=10):
+        """Waits for a text field by XPATH and enters text."""
+        print(f"📝 Waiting for text field with XPATH: '{xpath}' to enter text: '{text}' (from {CURRENT_FILE})")
+        try:
+            text_field = await self.locate(locators_for(AppiumBy.XPATH, xpath), f"enter_text_by_xpath:{xpath}", timeout)
+        except TimeoutException:
+            raise NoSuchElementException(f"Timed out waiting for element with XPATH: {xpath}")
+        await self.send_keys(text_field, text)
+        print(f"✅ Text entered successfully. (from {CURRENT_FILE})")
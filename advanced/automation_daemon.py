@@ -0,0 +1,233 @@
+import json
+import queue
+import signal
+import socket
+import socketserver
+import threading
+import time
+from main import close_phone_allocator, option_value
+from ntrctl import DAEMON_SOCKET
+from parallel_runner import discover_devices
+from scheduler import PROBE_INTERVAL, QUARANTINE_AFTER, Scheduler, jobs_from_spec, print_schedule_summary, write_schedule_report
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+# How often a client's stream re-checks its jobs while no event arrives
+EVENT_POLL_INTERVAL = 1.0
+
+
+class StepResults(dict):
+    """A job's action_results that reports each step result as the flow records it."""
+
+    def __init__(self, on_step):
+        super().__init__()
+        self.on_step = on_step
+
+    def __setitem__(self, step, result):
+        super().__setitem__(step, result)
+        self.on_step(step, result)
+
+
+class AutomationDaemon:
+    """
+    Keeps the terminal bench warm between runs: the Appium and Selenium imports, one Appium server
+    and session per device (held by a Scheduler's DeviceLeases) and the flow caches are set up once.
+    Clients (see ntrctl.py) send one JSON request per connection over a Unix socket and get JSON
+    events back, one per line, while their jobs run:
+
+        {"command": "run", "jobs": [{"flow": "enrollment", "count": 1}], "wait": true}
+        {"command": "status"}
+        {"command": "shutdown"}
+    """
+
+    def __init__(self, devices, socket_path=DAEMON_SOCKET, quarantine_after=QUARANTINE_AFTER,
+                 probe_interval=PROBE_INTERVAL):
+        self.socket_path = socket_path
+        self.scheduler = Scheduler(devices, quarantine_after=quarantine_after, probe_interval=probe_interval)
+        self.started = None
+        self._server = None
+
+    def warm_up(self):
+        """Connects every device up front, in parallel, so the first job finds its session ready."""
+        start = time.monotonic()
+
+        def prepare(lease):
+            try:
+                lease.prepare(self.scheduler.flake_db)
+            except Exception as e:
+                # The lease connects again when it gets its first job
+                print(f"⚠️ [{lease.udid}] Could not connect: {e.__class__.__name__}: {e} (from {CURRENT_FILE})")
+
+        threads = [threading.Thread(target=prepare, args=(lease,), name=f"warm-up-{lease.udid}")
+                   for lease in self.scheduler.leases.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        connected = sum(lease.device_actions is not None for lease in self.scheduler.leases.values())
+        print(f"🔥 {connected}/{len(threads)} devices connected in {time.monotonic() - start:.1f}s (from {CURRENT_FILE})")
+
+    def serve(self):
+        """Serves requests until a shutdown request or SIGINT/SIGTERM, then finishes the queued jobs."""
+        self._claim_socket()
+        self.started = time.monotonic()
+        self.warm_up()
+        self.scheduler.start()
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.automation_daemon = self
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stop())
+        print(f"🟢 Automation daemon {os.getpid()} listening on {self.socket_path} (from {CURRENT_FILE})")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.scheduler.close()
+            self.scheduler.join()
+            close_phone_allocator()
+        return self.scheduler.report()
+
+    def stop(self):
+        # serve_forever() only returns once shutdown() is called from another thread
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, name='daemon-shutdown').start()
+
+    def _claim_socket(self):
+        """Removes a socket file left behind by a daemon that died; refuses to start next to a live one."""
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.socket_path)
+        else:
+            raise Exception(f"An automation daemon is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def handle(self, request, send):
+        """Runs one client request, passing each reply event to send(event)."""
+        command = request.get('command')
+        if command == 'run':
+            self._run(request, send)
+        elif command == 'status':
+            send(self._status())
+        elif command == 'shutdown':
+            send({'event': 'bye'})
+            self.stop()
+        else:
+            send({'event': 'error', 'message': f"Unknown command: {command}"})
+
+    def _run(self, request, send):
+        try:
+            jobs = [job for spec in request.get('jobs') or [] for job in jobs_from_spec(spec)]
+        except (ValueError, KeyError) as e:
+            send({'event': 'error', 'message': f"Invalid job spec: {e}"})
+            return
+        if not jobs:
+            send({'event': 'error', 'message': "No jobs to run"})
+            return
+        # Events come from the device threads; only this thread writes to the client
+        events = queue.Queue()
+        for job in jobs:
+            job.listener = lambda job, event: events.put({'event': event, 'job': _job_state(job)})
+            job.action_results = StepResults(
+                lambda step, result, job_id=job.id: events.put({'event': 'step', 'job_id': job_id,
+                                                                 'step': step, 'result': result}))
+        start = time.monotonic()
+        try:
+            for job in jobs:
+                self.scheduler.submit(job)
+                send({'event': 'queued', 'job': _job_state(job)})
+        except Exception as e:
+            send({'event': 'error', 'message': str(e)})
+            return
+        if not request.get('wait', True):
+            return
+        unfinished = {job.id: job for job in jobs}
+        while unfinished:
+            try:
+                event = events.get(timeout=EVENT_POLL_INTERVAL)
+            except queue.Empty:
+                # Every finished job queues a 'finished' event; this only covers one that never arrives
+                for job in [job for job in unfinished.values() if job.finished is not None]:
+                    del unfinished[job.id]
+                    send({'event': 'finished', 'job': _job_state(job)})
+                continue
+            if event['event'] == 'finished':
+                if unfinished.pop(event['job']['id'], None) is None:
+                    continue  # already reported
+            send(event)
+        failed = sum(1 for job in jobs if job.error)
+        send({'event': 'done', 'passed': len(jobs) - failed, 'failed': failed, 'elapsed': time.monotonic() - start})
+
+    def _status(self):
+        report = self.scheduler.report()
+        devices = {udid: {'quarantined': device['quarantined'], 'jobs': device['jobs'], 'passed': device['passed'],
+                          'failed': device['failed'],
+                          'connected': self.scheduler.leases[udid].device_actions is not None}
+                   for udid, device in report['devices'].items()}
+        jobs = report['jobs']
+        return {
+            'event': 'status',
+            'pid': os.getpid(),
+            'uptime': time.monotonic() - self.started,
+            'queued': sum(1 for job in jobs if job['device'] is None and not job['done']),
+            'running': sum(1 for job in jobs if job['device'] is not None and not job['done']),
+            'devices': devices,
+        }
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        def send(event):
+            self.wfile.write(json.dumps(event, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            send({'event': 'error', 'message': f"Invalid request: {e}"})
+            return
+        try:
+            self.server.automation_daemon.handle(request, send)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped following; its jobs keep running
+            pass
+
+
+def _job_state(job):
+    return {
+        'id': job.id,
+        'flow': job.flow,
+        'phone': job.phone,
+        'priority': job.priority,
+        'device': job.ran_on,
+        'queue_wait': job.queue_wait,
+        'elapsed': job.finished - job.started if job.started is not None and job.finished else None,
+        'error': job.error,
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python automation_daemon.py [--devices devices.json] [--socket PATH] [--quarantine-after N]
+    #                                   [--probe-interval SECONDS]
+    # Then submit flows with ntrctl.py, e.g.: python ntrctl.py run --flow enrollment --count 1
+    devices = discover_devices(option_value('--devices'))
+    daemon = AutomationDaemon(devices, socket_path=option_value('--socket', DAEMON_SOCKET),
+                              quarantine_after=int(option_value('--quarantine-after', QUARANTINE_AFTER)),
+                              probe_interval=float(option_value('--probe-interval', PROBE_INTERVAL)))
+    print(f"🛠️ Starting the automation daemon for {len(devices)} devices from {CURRENT_FILE}")
+    report = daemon.serve()
+    if report['jobs']:
+        print_schedule_summary(report)
+        print(f"📊 Schedule report written to {write_schedule_report(report)}")
@@ -0,0 +1,230 @@
+import sys
+import time
+from collections import Counter
+from contextlib import nullcontext
+from appium_manager import AppiumManager, SessionPool
+from artifacts import ArtifactRecorder
+from instrumentation import Instrumentation
+from main import (
+    DEFAULT_DEVICE_NAME, build_capabilities, close_phone_allocator, get_and_update_phone_number, option_value,
+    run_enrollment_flow,
+)
+from retry import FlakeDB
+from screens import OUTSIDE_APP, UnexpectedScreenError
+from selenium.common.exceptions import TimeoutException
+from wait_conditions import ScreenCondition
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+# Ways back to the welcome screen, cheapest first
+RESET_LADDER = ('back', 'activate', 'restart', 'clear')
+MAX_BACK_PRESSES = 4
+# Consecutive failed enrollments after which the batch stops instead of burning more numbers
+DEFAULT_STOP_AFTER = 3
+
+
+class WelcomeNavigator:
+    """
+    Brings the app back to the welcome screen between enrollments, in the same session, through
+    the cheapest path that works:
+        back      in-app back presses, no relaunch (keeps the cached keypad layout)
+        activate  brings the app to the front when something else is on top
+        restart   terminates and relaunches the app
+        clear     wipes the app data and relaunches it, as a new session with noReset=False would
+    The rung that worked is remembered per starting screen and tried first the next time.
+    """
+
+    def __init__(self, device_actions, capabilities, ladder=RESET_LADDER, timeout=10):
+        self.device_actions = device_actions
+        self.app_package = capabilities['appPackage']
+        self.ladder = tuple(ladder)
+        self.timeout = timeout
+        self.learned = {}
+        self.stats = Counter()
+
+    def return_to_welcome(self):
+        """Returns the name of the rung that reached the welcome screen ('none' if already there)."""
+        screen = self.device_actions.current_screen(use_activity=True)
+        if screen == 'welcome':
+            self.stats['none'] += 1
+            return 'none'
+        start = self.ladder.index(self.learned[screen]) if screen in self.learned else 0
+        for rung in self.ladder[start:]:
+            if not self._applies(rung, screen):
+                continue
+            print(f"↩️ Returning to the welcome screen from {screen or 'an unrecognized screen'} ({rung}) "
+                  f"(from {CURRENT_FILE})")
+            try:
+                reached = getattr(self, f"_{rung}")()
+            except (TimeoutException, UnexpectedScreenError) as e:
+                print(f"⚠️ '{rung}' did not reach the welcome screen: {e} (from {CURRENT_FILE})")
+                reached = False
+            if reached:
+                self.learned[screen] = rung
+                self.stats[rung] += 1
+                return rung
+        raise Exception(f"Could not return to the welcome screen from {screen or 'an unrecognized screen'}")
+
+    @staticmethod
+    def _applies(rung, screen):
+        if rung == 'back':
+            return screen != OUTSIDE_APP
+        if rung == 'activate':
+            return screen == OUTSIDE_APP
+        return True
+
+    def _back(self):
+        previous = self.device_actions.current_screen()
+        for _ in range(MAX_BACK_PRESSES):
+            self.device_actions.press_back()
+
+            def moved(driver):
+                screen = self.device_actions.current_screen()
+                return screen is not None and screen != previous and screen
+
+            # A back press the app ignores leaves the screen as it was; stop pressing then
+            try:
+                previous = self.device_actions.wait_for(ScreenCondition("screen change after back", moved), timeout=2)
+            except TimeoutException:
+                return False
+            if previous == 'welcome':
+                return True
+        return False
+
+    def _activate(self):
+        self.device_actions.driver.activate_app(self.app_package)
+        self.device_actions.invalidate_snapshot()
+        return self.device_actions.expect_screen('welcome', timeout=self.timeout)
+
+    def _restart(self):
+        self.device_actions.driver.terminate_app(self.app_package)
+        self.device_actions.driver.activate_app(self.app_package)
+        self.device_actions.invalidate_snapshot()
+        self.device_actions.invalidate_keypad()
+        return self.device_actions.expect_screen('welcome', timeout=self.timeout)
+
+    def _clear(self):
+        self.device_actions.driver.execute_script('mobile: clearApp', {'appId': self.app_package})
+        self.device_actions.driver.activate_app(self.app_package)
+        self.device_actions.invalidate_snapshot()
+        self.device_actions.invalidate_keypad()
+        return self.device_actions.expect_screen('welcome', timeout=self.timeout)
+
+
+def parse_phone_numbers(phones=None, number_range=None, count=None):
+    """
+    Returns the phone numbers to enroll, from one of:
+        phones        a comma separated list
+        number_range  FIRST-LAST, both included
+        count         that many numbers from the shared PhoneAllocator, allocated as they are used
+    Listed and ranged numbers are not registered with the allocator.
+    """
+    if phones:
+        return [phone.strip() for phone in phones.split(',') if phone.strip()]
+    if number_range:
+        first, last = (int(part) for part in number_range.split('-'))
+        if last < first:
+            raise ValueError(f"Empty phone number range: {number_range}")
+        return [str(phone) for phone in range(first, last + 1)]
+    if count:
+        return (get_and_update_phone_number() for _ in range(int(count)))
+    raise ValueError("Give the phone numbers to enroll with --phones, --range or --count.")
+
+
+def run_batch(device_actions, capabilities, phone_numbers, instrumentation=None, navigator=None,
+              stop_after=DEFAULT_STOP_AFTER, artifacts=None):
+    """
+    Enrolls every phone number back to back on one connected session and returns one result per
+    attempted number. Between enrollments the app is brought back to the welcome screen by the
+    navigator instead of a new session; the batch stops after stop_after consecutive failures.
+    """
+    navigator = navigator or WelcomeNavigator(device_actions, capabilities)
+    results = []
+    failures_in_a_row = 0
+    for index, phone in enumerate(phone_numbers):
+        action_results = {}
+        error_message = None
+        reset = None
+        start = time.monotonic()
+        print(f"\n📇 Enrollment {index + 1}: {phone} (from {CURRENT_FILE})")
+        try:
+            if index:
+                with instrumentation.step('Return to Welcome') if instrumentation else nullcontext():
+                    reset = navigator.return_to_welcome()
+                action_results['Return to Welcome'] = f"✅ Success ({reset})"
+            run_enrollment_flow(device_actions, capabilities, action_results, phone_number_provider=lambda: phone,
+                                instrumentation=instrumentation, artifacts=artifacts)
+        except Exception as e:
+            error_message = str(e)
+            print(f"🛑 Enrollment of {phone} failed: {error_message} (from {CURRENT_FILE})")
+            action_results['Final Status'] = '❌ Failure'
+        results.append({
+            'phone': phone,
+            'action_results': action_results,
+            'error': error_message,
+            'reset': reset,
+            'elapsed': time.monotonic() - start,
+        })
+        failures_in_a_row = failures_in_a_row + 1 if error_message else 0
+        if stop_after and failures_in_a_row >= stop_after:
+            print(f"🛑 {failures_in_a_row} enrollments failed in a row, stopping the batch. (from {CURRENT_FILE})")
+            break
+    return results
+
+
+def print_batch_summary(results, elapsed, navigator=None):
+    print("\n--- Batch Enrollment Summary ---")
+    for result in results:
+        status = '❌ Failure' if result['error'] else '✅ Success'
+        print(f"{status} {result['phone']} ({result['elapsed']:.1f}s)")
+        if result['error']:
+            print(f"   🛑 {result['error']}")
+    enrolled = sum(1 for result in results if not result['error'])
+    rate = enrolled / elapsed * 3600 if elapsed else 0.0
+    print(f"\n⏱️ {enrolled} of {len(results)} enrolled in {elapsed:.1f}s ({rate:.0f} per hour)")
+    if navigator and navigator.stats:
+        paths = ', '.join(f"{rung} {count}x" for rung, count in navigator.stats.most_common())
+        print(f"↩️ Returned to the welcome screen via: {paths}")
+
+
+if __name__ == "__main__":
+    # Usage: python batch_enroll.py (--phones A,B,... | --range FIRST-LAST | --count N) [--stop-after N] [--reuse]
+    reuse = '--reuse' in sys.argv
+    phone_numbers = parse_phone_numbers(option_value('--phones'), option_value('--range'), option_value('--count'))
+    stop_after = int(option_value('--stop-after', DEFAULT_STOP_AFTER))
+    appium_manager = AppiumManager(keep_alive=reuse)
+    session_pool = SessionPool(appium_manager.url)
+    instrumentation = Instrumentation(flow='batch_enrollment', device=DEFAULT_DEVICE_NAME)
+    artifacts = ArtifactRecorder(run_id=instrumentation.run_id)
+    device_actions = None
+    navigator = None
+    results = []
+    start = time.monotonic()
+
+    print(f"🛠️ Starting batch enrollment from {CURRENT_FILE}")
+    try:
+        appium_manager.start_server()
+        capabilities = build_capabilities()
+        with instrumentation.step('Connection & App Launch'), instrumentation.session_setup(session_pool.appium_url):
+            device_actions = session_pool.acquire(capabilities)
+        instrumentation.instrument(device_actions)
+        artifacts.attach(device_actions)
+        device_actions.retrier.flake_db = FlakeDB()
+        device_actions.retrier.run_id = instrumentation.run_id
+        navigator = WelcomeNavigator(device_actions, capabilities)
+        results = run_batch(device_actions, capabilities, phone_numbers, instrumentation, navigator, stop_after,
+                            artifacts)
+    except Exception as e:
+        print(f"🛑 An error occurred: {e} (from {CURRENT_FILE})")
+    finally:
+        if device_actions and device_actions.driver:
+            session_pool.release(device_actions, keep=reuse)
+        appium_manager.stop_server()
+        close_phone_allocator()
+        artifacts.close()
+        print_batch_summary(results, time.monotonic() - start, navigator)
+        instrumentation.write()
+        if device_actions:
+            device_actions.retrier.flush()
+    if not results or any(result['error'] for result in results):
+        sys.exit(1)
@@ -0,0 +1,258 @@
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+from appium.webdriver.common.appiumby import AppiumBy
+from async_device_actions import AsyncDeviceActions
+from device_actions import DeviceActions
+from fake_appium_server import LATENCY_PROFILES, FakeAppiumServer
+from instrumentation import Instrumentation
+from main import (
+    EMAIL_CONFIRM_ID, EMAIL_XPATH, HEADER_ID, HEADER_REGION, TERMS_ID, WELCOME_CHECKS,
+    app_loaded, build_capabilities, option_value, run_enrollment_flow,
+)
+from screens import APP_ID
+from stats import percentile
+from transport import TransportConfig, close_pools
+import visual
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+
+# The benchmark's cases use the flow's own locators and checks (main.py); only the featured screen,
+# which the flow ends on without clicking, has its element here.
+FEATURED_CLIP_ID = APP_ID + "view_featured_clip"
+PHONE_FIELD_CHECK = WELCOME_CHECKS['Phone Number Field Validation']
+# Benchmark numbers stay in their own range, away from the PhoneAllocator's blocks
+BENCHMARK_PHONE_PREFIX = '4130'
+BENCHMARK_PHONE = BENCHMARK_PHONE_PREFIX + '009999'
+APP_LOADED = app_loaded(build_capabilities())
+
+# (name, screen to start on with its field values, call on a connected DeviceActions)
+METHOD_CASES = [
+    ('is_session_alive', ('welcome', {}), lambda da: da.is_session_alive()),
+    ('wait_for', ('welcome', {}), lambda da: da.wait_for(APP_LOADED)),
+    ('validate_screen', ('welcome', {}), lambda da: da.validate_screen(list(WELCOME_CHECKS.values()))),
+    ('is_text_present', ('welcome', {}), lambda da: da.is_text_present("Esp")),
+    ('validate_element_by_id', ('welcome', {}), lambda da: da.validate_element_by_id(HEADER_ID)),
+    # One screenshot for the header's rendering, next to one element query for its presence
+    *([('validate_visual', ('welcome', {}), lambda da: da.validate_visual([HEADER_REGION]))] if visual.available() else []),
+    ('validate_element_id_and_text', ('welcome', {}),
+     lambda da: da.validate_element_id_and_text(*PHONE_FIELD_CHECK[1:])),
+    ('validate_element_and_clickable', ('welcome', {}), lambda da: da.validate_element_and_clickable(TERMS_ID)),
+    ('snapshot', ('welcome', {}), lambda da: da.snapshot(refresh=True)),
+    ('enter_phone_number', ('welcome', {}), lambda da: da.enter_phone_number(BENCHMARK_PHONE)),
+    ('click_button_by_text', ('welcome', {'phone': BENCHMARK_PHONE}), lambda da: da.click_button_by_text('OK')),
+    ('click_by_id_or_text (text)', ('confirm', {'phone': BENCHMARK_PHONE}),
+     lambda da: da.click_by_id_or_text(text="Confirm")),
+    ('enter_text_by_xpath', ('email', {}), lambda da: da.enter_text_by_xpath(EMAIL_XPATH, 'bench@appcard.com')),
+    ('click_by_id_or_text (id)', ('email', {'email': 'bench@appcard.com'}),
+     lambda da: da.click_by_id_or_text(resource_id=EMAIL_CONFIRM_ID)),
+    ('wait_for_element_and_click', ('featured', {}),
+     lambda da: da.wait_for_element_and_click(AppiumBy.ID, FEATURED_CLIP_ID, expected_text='Clip it!')),
+]
+
+
+@contextlib.contextmanager
+def quiet(verbose=False):
+    """Silences the DeviceActions progress prints while measuring, unless verbose."""
+    if verbose:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def summarize(samples):
+    """Returns p50/p95 wall ms and first/typical command counts from (wall ms, commands) samples."""
+    walls = [wall for wall, _ in samples]
+    commands = [count for _, count in samples]
+    return {
+        'runs': len(samples),
+        'p50_ms': percentile(walls, 0.50),
+        'p95_ms': percentile(walls, 0.95),
+        'first_commands': commands[0],
+        'commands': percentile(commands, 0.50),
+    }
+
+
+def benchmark_methods(server, runs=20, keypad_mode='batched', verbose=False):
+    """
+    Times every DeviceActions primitive on its own, each starting from the screen it needs.
+    One DeviceActions is kept for all runs, so the first run pays for cold caches (keypad layout,
+    locator strategy) and the rest show the steady state.
+    """
+    capabilities = build_capabilities()
+    device_actions = DeviceActions(server.url, keypad_mode=keypad_mode)
+    results = {}
+    with quiet(verbose):
+        device_actions.connect(capabilities)
+        try:
+            for name, (screen, fields), call in METHOD_CASES:
+                samples = []
+                for _ in range(runs):
+                    server.device.reset(screen, **fields)
+                    device_actions.invalidate_snapshot()
+                    commands_before = server.total_commands()
+                    start = time.perf_counter()
+                    call(device_actions)
+                    samples.append(((time.perf_counter() - start) * 1000, server.total_commands() - commands_before))
+                results[name] = summarize(samples)
+        finally:
+            device_actions.quit()
+    return results
+
+
+def benchmark_flow(server, runs=10, keypad_mode='batched', verbose=False):
+    """
+    Runs the advanced/main.py enrollment flow end to end and returns per-step and total
+    timings, with the Appium commands each step sent as counted by the server.
+    """
+    capabilities = build_capabilities()
+    device_actions = DeviceActions(server.url, keypad_mode=keypad_mode)
+    # One Instrumentation collects the step records of every run.
+    instrumentation = Instrumentation(flow='enrollment-benchmark', device='fake')
+    totals = []
+    with quiet(verbose):
+        device_actions.connect(capabilities)
+        instrumentation.instrument(device_actions)
+        try:
+            for run in range(runs):
+                server.device.reset()
+                device_actions.invalidate_snapshot()
+                commands_before = server.total_commands()
+                start = time.perf_counter()
+                run_enrollment_flow(device_actions, capabilities, {},
+                                    phone_number_provider=lambda: f"{BENCHMARK_PHONE_PREFIX}0{run:05d}", instrumentation=instrumentation)
+                totals.append(((time.perf_counter() - start) * 1000, server.total_commands() - commands_before))
+        finally:
+            device_actions.quit()
+    steps = {}
+    for name, wall_ms, commands in instrumentation.step_summary():
+        steps.setdefault(name, []).append((wall_ms, commands))
+    results = {name: summarize(samples) for name, samples in steps.items()}
+    results['Total'] = summarize(totals)
+    return results
+
+
+def benchmark_async_validation(server, runs=10, verbose=False):
+    """
+    Compares the welcome screen checks done by AsyncDeviceActions one at a time with the same
+    checks in flight together (validate_all).
+    """
+    checks = list(WELCOME_CHECKS.values())
+
+    async def measure():
+        device_actions = AsyncDeviceActions(server.url)
+        await device_actions.connect(build_capabilities())
+
+        async def one_by_one(checks):
+            for check in checks:
+                await device_actions.check(check)
+
+        samples = {'sequential checks': [], 'validate_all (gathered)': []}
+        variants = [('sequential checks', one_by_one), ('validate_all (gathered)', device_actions.validate_all)]
+        try:
+            for _ in range(runs):
+                for name, validate in variants:
+                    server.device.reset()
+                    commands_before = server.total_commands()
+                    start = time.perf_counter()
+                    await validate(checks)
+                    samples[name].append(((time.perf_counter() - start) * 1000, server.total_commands() - commands_before))
+        finally:
+            await device_actions.quit()
+        return {name: summarize(variant_samples) for name, variant_samples in samples.items()}
+
+    with quiet(verbose):
+        return asyncio.run(measure())
+
+
+def benchmark_transport(server, devices=4, runs=3, verbose=False):
+    """
+    Runs the enrollment flow from several threads at once against one server, each thread
+    connecting a fresh session per run as the session pool and batch runs do. Compares the
+    default Remote transport with the shared keep-alive pool by TCP connections opened and wall
+    time per command.
+    """
+    capabilities = build_capabilities()
+    modes = [
+        ('default transport', None),
+        ('pooled', TransportConfig(pool_size=devices)),
+    ]
+
+    def device_runs(transport):
+        samples = []
+        for run in range(runs):
+            device_actions = DeviceActions(server.url, transport=transport)
+            if transport is None:
+                options = UiAutomator2Options().load_capabilities(capabilities)
+                device_actions.driver = webdriver.Remote(server.url, options=options)
+            else:
+                device_actions.connect(capabilities)
+            # Instrumentation only to count the commands this thread sends
+            counter = Instrumentation()
+            counter.instrument(device_actions)
+            start = time.perf_counter()
+            run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: f"{BENCHMARK_PHONE_PREFIX}1{run:05d}",
+                                instrumentation=counter)
+            samples.append(((time.perf_counter() - start) * 1000, counter.command_count))
+            device_actions.quit()
+        return samples
+
+    results = {}
+    with quiet(verbose):
+        for name, transport in modes:
+            close_pools()
+            connections_before = server.connections
+            with ThreadPoolExecutor(max_workers=devices) as executor:
+                samples = [sample for device in executor.map(device_runs, [transport] * devices) for sample in device]
+            stats = summarize(samples)
+            stats['connections'] = server.connections - connections_before
+            stats['ms_per_command'] = sum(wall for wall, _ in samples) / sum(count for _, count in samples)
+            results[name] = stats
+    close_pools()
+    return results
+
+
+def print_table(title, results):
+    print(f"\n--- {title} ---")
+    print(f"{'name':<36} {'runs':>5} {'p50 ms':>8} {'p95 ms':>8} {'cmds 1st':>9} {'cmds':>6}")
+    for name, stats in results.items():
+        print(f"{name[:36]:<36} {stats['runs']:>5} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+              f"{stats['first_commands']:>9} {stats['commands']:>6}")
+
+
+if __name__ == "__main__":
+    # Usage: python benchmark.py [--profile none|device] [--runs N] [--devices N] [--keypad batched|per_digit]
+    #                           [--json PATH] [--verbose]
+    profile = option_value('--profile', 'none')
+    runs = int(option_value('--runs', '10'))
+    keypad_mode = option_value('--keypad', 'batched')
+    json_path = option_value('--json')
+    verbose = '--verbose' in sys.argv
+
+    print(f"🛠️ Benchmarking DeviceActions against the fake Appium server "
+          f"(profile '{profile}', {runs} runs, {keypad_mode} keypad) from {CURRENT_FILE}")
+    with FakeAppiumServer(latency=LATENCY_PROFILES[profile]) as server:
+        method_results = benchmark_methods(server, runs, keypad_mode, verbose)
+        flow_results = benchmark_flow(server, runs, keypad_mode, verbose)
+        async_results = benchmark_async_validation(server, runs, verbose)
+        transport_results = benchmark_transport(server, devices=int(option_value('--devices', '4')), verbose=verbose)
+    print_table("DeviceActions Methods", method_results)
+    print_table("Enrollment Flow Steps", flow_results)
+    print_table("Welcome Checks: Sequential vs Concurrent", async_results)
+    print_table("Multi-Device Transport (flow per session)", transport_results)
+    for name, stats in transport_results.items():
+        print(f"🌐 {name}: {stats['connections']} TCP connections, {stats['ms_per_command']:.2f} ms per command")
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'profile': profile, 'runs': runs, 'keypad_mode': keypad_mode, 'methods': method_results,
+                       'flow': flow_results, 'async_validation': async_results, 'transport': transport_results}, f, indent=2, ensure_ascii=False)
+        print(f"\n📊 Wrote benchmark results to {json_path} (from {CURRENT_FILE})")
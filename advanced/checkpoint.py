@@ -0,0 +1,212 @@
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from phone_allocator import pid_alive
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints")
+
+
+class ResumeError(Exception):
+    """Raised when the device is not on a screen the flow can be resumed from."""
+
+
+class CheckpointLocked(Exception):
+    """Raised when another run holds the checkpoint of the same flow and device."""
+
+
+class FlowStep:
+    """
+    One resumable flow step. screens are the screens the step starts on (None: any screen);
+    done(device_actions, data) tells whether the step's effect is already on the device, for
+    steps whose effect does not change the screen; results are the action_results names it reports.
+    """
+
+    def __init__(self, name, run, screens=None, done=None, results=None):
+        self.name = name
+        self.run = run
+        self.screens = tuple(screens) if screens is not None else None
+        self.done = done
+        self.results = list(results or [name])
+
+    def starts_on(self, screen):
+        return self.screens is None or screen in self.screens
+
+    def __repr__(self):
+        return f"FlowStep({self.name})"
+
+
+class Checkpoint:
+    """
+    The progress of one flow run on one device: its data (the identity in use), the session and
+    the steps completed so far. Saved to checkpoints/<flow>-<device>.json after every step so a
+    later process can resume it as well; with directory=None it is only kept in memory.
+    A run holds <flow>-<device>.json.lock while it uses a saved checkpoint, so two runs on the
+    same flow and device cannot overwrite each other's progress.
+    """
+
+    def __init__(self, device, flow='enrollment', directory=CHECKPOINT_DIR):
+        self.device = device
+        self.flow = flow
+        self.path = os.path.join(directory, f"{flow}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', str(device))}.json") \
+            if directory is not None else None
+        self.data = {}
+        self.completed = []
+        self.session_id = None
+        self._owner = None
+
+    @classmethod
+    def load(cls, device, flow='enrollment', directory=CHECKPOINT_DIR):
+        """
+        Locks and returns the saved checkpoint of a device's flow, or an empty one.
+        Raises CheckpointLocked while another run holds it.
+        """
+        checkpoint = cls(device, flow, directory).lock()
+        if os.path.exists(checkpoint.path):
+            try:
+                with open(checkpoint.path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+            except (ValueError, OSError):
+                return checkpoint
+            checkpoint.data = saved.get('data', {})
+            checkpoint.completed = saved.get('completed', [])
+            checkpoint.session_id = saved.get('session_id')
+        return checkpoint
+
+    @property
+    def last_completed(self):
+        return self.completed[-1] if self.completed else None
+
+    @property
+    def lock_path(self):
+        return f"{self.path}.lock" if self.path else None
+
+    def lock(self):
+        """
+        Takes the checkpoint for this run by creating its lock file with O_EXCL. A lock left behind
+        by a process that died is taken over; one held by a live process (this one included, for
+        another thread's run) raises CheckpointLocked.
+        """
+        if self.path is None or self._owner is not None:
+            return self
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        token = uuid.uuid4().hex[:8]
+        owner = f"{os.getpid()} {token}"
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    stale = self._read_lock(self.lock_path)
+                except FileNotFoundError:
+                    continue  # released in the meantime
+                holder = self._holder_pid(stale)
+                if holder is None or pid_alive(holder):
+                    raise CheckpointLocked(f"{self.flow} on {self.device} is in use by process {holder or '?'} "
+                                           f"({self.lock_path})")
+                self._take_over(stale, holder, token)
+                continue
+            os.write(fd, owner.encode('ascii'))
+            os.close(fd)
+            self._owner = owner
+            return self
+
+    def _take_over(self, stale, holder, token):
+        """
+        Moves a dead process's lock out of the way. Like a phone block (see phone_allocator.py),
+        the lock only moves by os.rename, so of several runs taking it over one rename succeeds;
+        the file it moved is then checked to be the dead lock, and put back if another run had
+        already replaced it with its own.
+        """
+        taken_path = f"{self.lock_path}.{os.getpid()}.{token}"
+        try:
+            os.rename(self.lock_path, taken_path)
+        except FileNotFoundError:
+            return  # another run moved it first
+        if self._read_lock(taken_path) != stale:
+            os.replace(taken_path, self.lock_path)
+            return
+        print(f"♻️ Taking over the checkpoint lock of dead process {holder} (from {CURRENT_FILE})")
+        os.remove(taken_path)
+
+    @staticmethod
+    def _read_lock(path):
+        with open(path, 'r') as f:
+            return f.read()
+
+    @staticmethod
+    def _holder_pid(content):
+        """The pid in a lock file's content, or None while it is being written."""
+        pid = content.split()[:1]
+        return int(pid[0]) if pid and pid[0].isdigit() else None
+
+    def release(self):
+        """Gives up the lock; the saved progress stays for a later --resume."""
+        if self._owner is None:
+            return
+        try:
+            with open(self.lock_path, 'r') as f:
+                mine = f.read() == self._owner
+            if mine:
+                os.remove(self.lock_path)
+        except FileNotFoundError:
+            pass
+        self._owner = None
+
+    def complete(self, step_name):
+        self.completed.append(step_name)
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        self.lock()
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'flow': self.flow,
+                'device': self.device,
+                'session_id': self.session_id,
+                'data': self.data,
+                'completed': self.completed,
+                'updated': datetime.now(timezone.utc).isoformat(),
+            }, f, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def clear(self):
+        """Forgets the run once it has finished and releases the lock."""
+        self.data = {}
+        self.completed = []
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.release()
+
+
+def resume_index(steps, checkpoint, screen, device_actions, end_screen=None):
+    """
+    Returns the index of the step to resume from, given the screen the device is on: the step
+    after the last completed one if it starts on this screen, or the one after that if the failed
+    step's effect already landed (its done check passes, or it left a screen it does not start on
+    for one the following step starts on). len(steps) means the flow is already finished.
+    Raises ResumeError when the screen fits neither.
+    """
+    names = [step.name for step in steps]
+    following = names.index(checkpoint.last_completed) + 1 if checkpoint.last_completed in names else 0
+    if following < len(steps) and steps[following].starts_on(screen):
+        return following
+    if following < len(steps):
+        failed = steps[following]
+        if failed.done is not None:
+            landed = failed.done(device_actions, checkpoint.data)
+        else:
+            landed = screen is not None and not failed.starts_on(screen)
+        if landed:
+            if following + 1 == len(steps):
+                if end_screen is None or screen == end_screen:
+                    return len(steps)
+            elif steps[following + 1].starts_on(screen):
+                return following + 1
+    raise ResumeError(f"Cannot resume after '{checkpoint.last_completed or 'the start'}' "
+                      f"from the {screen or 'unrecognized'} screen")
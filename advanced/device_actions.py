@@ -2,40 +2,543 @@ import time
 from appium import webdriver
 from appium.webdriver.common.appiumby import AppiumBy
 from appium.options.android import UiAutomator2Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.actions import interaction
+from selenium.webdriver.common.actions.action_builder import ActionBuilder
+from selenium.webdriver.common.actions.pointer_input import PointerInput
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.common.exceptions import (
+    InvalidArgumentException, InvalidSelectorException, NoSuchElementException, TimeoutException,
+    UnknownMethodException, WebDriverException,
+)
+from element_cache import ElementCache, cache_key
+from retry import Retrier
+from text_input import TextInputEngine
+from screens import APP_ID, APPCARD_SCREENS, UnexpectedScreenError
+from transport import PooledAppiumConnection, TransportConfig, transport_stats
+from ui_snapshot import UiSnapshot
+from visual import Screenshot, check_regions
+from wait_conditions import ScreenCondition, element_clickable, element_present
 import os
+import re
 
 CURRENT_FILE = os.path.basename(__file__)
 
+# Adaptive polling: start fast so a ready screen is noticed almost immediately,
+# then back off so a slow screen does not flood the Appium server with queries.
+INITIAL_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+# With a logcat stream attached, log events wake the waits; hierarchy polls are only a backstop
+LOG_BACKSTOP_INTERVAL = 2.0
+POLL_BACKOFF = 1.5
+
+# Batched keypad entry: how long each key is held and the gap before the next key.
+KEY_PRESS_SECONDS = 0.05
+KEY_GAP_SECONDS = 0.05
+KEYPAD_BUTTON_CLASS = 'android.widget.Button'
+KEYPAD_DELETE = '⌫'
+# The view that echoes the number typed so far; batched taps raise no error when they miss
+KEYPAD_ECHO_ID = APP_ID + 'view_welcome_phone_number'
+
+
+# Locator layer: the same text/id inputs are tried with the fastest UiAutomator2 strategy first.
+# XPath forces a full hierarchy dump on the device, so it is only kept as the last fallback,
+# for a server that rejects the faster strategy; a faster strategy's "not found" is final.
+UNSUPPORTED_LOCATOR_ERRORS = (InvalidSelectorException, InvalidArgumentException, UnknownMethodException)
+XPATH_ATTRIBUTE = re.compile(r'^//([\w.]+|\*)\[@(text|resource-id)=(["\'])(.*?)\3\]$')
+XPATH_CONTAINS_TEXT = re.compile(r'^//([\w.]+|\*)\[contains\(@text,\s*(["\'])(.*?)\2\)\]$')
+
+
+def _ui_selector_literal(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def text_locators(text, class_name=None, contains=False):
+    """
+    Returns (strategy, by, value) candidates that find an element by its text, fastest first.
+    Every candidate matches exactly the same views, so a later one is only a fallback for a
+    server that does not support an earlier one.
+    """
+    selector = 'new UiSelector()'
+    if class_name:
+        selector += f'.className({_ui_selector_literal(class_name)})'
+    selector += f'.textContains({_ui_selector_literal(text)})' if contains else f'.text({_ui_selector_literal(text)})'
+    candidates = [('uiautomator', AppiumBy.ANDROID_UIAUTOMATOR, selector)]
+    node = class_name or '*'
+    predicate = f'contains(@text, "{text}")' if contains else f'@text="{text}"'
+    candidates.append(('xpath', AppiumBy.XPATH, f'//{node}[{predicate}]'))
+    return candidates
+
+
+def keypad_echo(snapshot):
+    """Returns the digits the keypad's number view shows in a snapshot ('' while it shows its prompt)."""
+    return re.sub(r'\D', '', snapshot.text_of(KEYPAD_ECHO_ID) or '')
+
+
+def locators_for(by, value):
+    """
+    Translates a (by, value) locator into equivalent candidates, fastest first.
+    Simple XPath forms (by class and text, contains text, resource-id) are rewritten;
+    anything else is used as given.
+    """
+    if by != AppiumBy.XPATH:
+        return [(by, by, value)]
+    match = XPATH_ATTRIBUTE.match(value)
+    if match:
+        node, attribute, _, literal = match.groups()
+        class_name = None if node == '*' else node
+        if attribute == 'resource-id':
+            return [('id', AppiumBy.ID, literal), ('xpath', AppiumBy.XPATH, value)]
+        return text_locators(literal, class_name)[:-1] + [('xpath', AppiumBy.XPATH, value)]
+    match = XPATH_CONTAINS_TEXT.match(value)
+    if match:
+        node, _, literal = match.groups()
+        class_name = None if node == '*' else node
+        return text_locators(literal, class_name, contains=True)[:-1] + [('xpath', AppiumBy.XPATH, value)]
+    return [('xpath', AppiumBy.XPATH, value)]
+
+class AttachedRemote(webdriver.Remote):
+    """A driver bound to an existing Appium session instead of creating a new one."""
+
+    def __init__(self, command_executor, session_id, options):
+        self._attach_session_id = session_id
+        super().__init__(command_executor, options=options)
+
+    def start_session(self, capabilities, browser_profile=None):
+        self.session_id = self._attach_session_id
+        self.caps = capabilities if isinstance(capabilities, dict) else capabilities.to_capabilities()
+
+
 class DeviceActions:
     """Performs actions and validations on the device."""
 
-    def __init__(self, appium_url='http://localhost:4723'):
+    def __init__(self, appium_url='http://localhost:4723', keypad_mode='batched', transport=None, screens=None,
+                 retrier=None, text_input=None):
         self.appium_url = appium_url
+        self.transport = transport or TransportConfig()
+        self.screens = screens or APPCARD_SCREENS
+        self.retrier = retrier or Retrier()
+        self.text_input = text_input or TextInputEngine()
         self.driver = None
+        self.wait_log = []
+        self.locator_stats = {}
+        self.keypad_mode = keypad_mode
+        self._keypad = None
+        self._snapshot = None
+        self._screenshot = None
+        self.visual_log = []
+        # The flow's visual checks: None skips them, 'warn' reports mismatches, 'strict' fails on them
+        self.visual_mode = None
+        self.visual_warnings = []
+        self.element_cache = ElementCache(self._find_first)
+        self.log_stream = None
 
     def connect(self, capabilities):
         """Connects to the device with the given capabilities."""
         print(f"🔗 Attempting to connect to the device... (from {CURRENT_FILE})")
         options = UiAutomator2Options().load_capabilities(capabilities)
-        self.driver = webdriver.Remote(self.appium_url, options=options)
+        self.driver = webdriver.Remote(PooledAppiumConnection(self.appium_url, self.transport), options=options)
         print(f"✅ Connection established. (from {CURRENT_FILE})")
 
+    def attach(self, session_id, capabilities):
+        """Binds to an already running session on the Appium server, skipping the session handshake."""
+        print(f"🔗 Attaching to session {session_id}... (from {CURRENT_FILE})")
+        options = UiAutomator2Options().load_capabilities(capabilities)
+        self.driver = AttachedRemote(PooledAppiumConnection(self.appium_url, self.transport), session_id, options)
+
+    def is_session_alive(self):
+        """Returns True if the driver's session still answers commands."""
+        if not self.driver:
+            return False
+        try:
+            self.driver.current_activity
+            return True
+        except Exception:
+            return False
+
+    def transport_stats(self):
+        """Returns the request, byte and connection counters of this device's Appium server."""
+        return transport_stats(self.appium_url)
+
+    def wait_for(self, condition, timeout=10, replaces_sleep=0.0):
+        """
+        Polls a screen condition until it holds, backing off between polls.
+        Returns the condition's result and records how long the wait actually took.
+        replaces_sleep is the fixed pause this wait stands in for, used to report time saved.
+        With a logcat stream attached, a matching log event ends the pause between polls at once;
+        if the stream has stopped, the wait goes back to polling on a timer.
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        interval = INITIAL_POLL_INTERVAL
+        stream = self.log_stream
+        max_interval = LOG_BACKSTOP_INTERVAL if stream else MAX_POLL_INTERVAL
+        polls = 0
+        woken = 0
+        while True:
+            if stream and not stream.alive:
+                stream = None
+                max_interval = MAX_POLL_INTERVAL
+                interval = min(interval, max_interval)
+            polls += 1
+            mark = stream.mark() if stream else None
+            # Whatever was cached before this poll may predate a change the app made by itself
+            self.element_cache.invalidate()
+            result = condition(self.driver)
+            now = time.monotonic()
+            if result:
+                self._record_wait(condition, now - start, polls, replaces_sleep, True, woken)
+                return self._cache_result(condition, result)
+            if now >= deadline:
+                self._record_wait(condition, now - start, polls, replaces_sleep, False, woken)
+                raise TimeoutException(f"Timed out after {timeout}s waiting for {condition}{self._screen_note()}")
+            pause = min(interval, deadline - now)
+            if stream:
+                if stream.wait(since=mark, timeout=pause):
+                    woken += 1
+            else:
+                time.sleep(pause)
+            interval = min(interval * POLL_BACKOFF, max_interval)
+
+    def attach_log_stream(self, stream):
+        """Lets waits wake on log events (see logcat_stream.py) instead of polling on a timer."""
+        self.log_stream = stream
+
+    def wait_for_log(self, names, predicate=None, timeout=10, since=None, replaces_sleep=0.0):
+        """
+        Waits for a log event (e.g. 'ntr_message') without touching the hierarchy and returns it.
+        since is a stream mark (0 also searches the buffered events); by default only new events count.
+        """
+        if self.log_stream is None:
+            raise Exception("No logcat stream attached; see attach_log_stream")
+        description = f"log event {names if isinstance(names, str) else ' or '.join(names)}"
+        start = time.monotonic()
+        event = self.log_stream.wait(names, since=since, predicate=predicate, timeout=timeout)
+        self._record_wait(description, time.monotonic() - start, 0, replaces_sleep, event is not None)
+        if event is None:
+            raise TimeoutException(f"Timed out after {timeout}s waiting for {description}")
+        return event
+
+    def _cache_result(self, condition, result):
+        """Keeps the element an element condition found, so the next lookup of its locator is free."""
+        locator = getattr(condition, 'locator', None)
+        if locator is None or not isinstance(result, WebElement):
+            return result
+        cached = self.element_cache.put([('condition',) + tuple(locator)], result)
+        if condition.clickable:
+            cached.remember(displayed=True, enabled=True)
+        return cached
+
+    def _screen_note(self):
+        """Names the screen the terminal is on, for timeout messages. Costs one hierarchy fetch, only on failure."""
+        try:
+            screen = self.current_screen()
+        except Exception:
+            return ''
+        return f" (the terminal is on the {screen} screen)" if screen else " (the terminal is on an unrecognized screen)"
+
+    def _record_wait(self, condition, elapsed, polls, replaces_sleep, succeeded, woken=0):
+        self.wait_log.append({
+            'condition': str(condition),
+            'elapsed': elapsed,
+            'polls': polls,
+            'woken': woken,
+            'replaces_sleep': replaces_sleep,
+            'succeeded': succeeded,
+        })
+        status = "✅" if succeeded else "❌"
+        wakeups = f", {woken} log wakeups" if woken else ''
+        print(f"{status} Waited {elapsed:.2f}s for {condition} ({polls} polls{wakeups}) (from {CURRENT_FILE})")
+
+    def wait_summary(self):
+        """Returns total time spent waiting and the time saved versus the fixed sleeps that were replaced."""
+        waited = sum(entry['elapsed'] for entry in self.wait_log)
+        replaced = sum(entry['replaces_sleep'] for entry in self.wait_log)
+        return {'waits': len(self.wait_log), 'waited': waited, 'replaced_sleep': replaced, 'saved': replaced - waited}
+
+    def locate(self, candidates, call_site, timeout=10, clickable=False):
+        """
+        Resolves an element from locator candidates, trying the strategy that last won for this
+        call site first. Each poll asks one strategy: the next candidate is only tried when the
+        server rejects a strategy, not when it finds nothing. With timeout=0 the lookup is tried
+        once and NoSuchElementException is raised if nothing matches. Records the winning strategy
+        and lookup time per call site. An element already resolved for the same locator on this
+        screen is reused (see ElementCache).
+        """
+        cached = self.element_cache.get(candidates)
+        if cached and (not clickable or cached.is_known_clickable()):
+            return cached
+        stats = self.locator_stats.get(call_site)
+        if stats:
+            candidates = sorted(candidates, key=lambda candidate: candidate[0] != stats['strategy'])
+        usable = list(candidates)
+        winner = []
+
+        def check(driver):
+            while True:
+                strategy, by, value = usable[0]
+                try:
+                    element = driver.find_element(by, value)
+                except UNSUPPORTED_LOCATOR_ERRORS:
+                    if len(usable) == 1:
+                        raise
+                    usable.pop(0)
+                    continue
+                if clickable and not (element.is_displayed() and element.is_enabled()):
+                    return False
+                winner.append(strategy)
+                return element
+
+        condition = ScreenCondition(f"{call_site}", check)
+        start = time.monotonic()
+        if timeout:
+            element = self.wait_for(condition, timeout=timeout)
+        else:
+            element = condition(self.driver)
+            if not element:
+                raise NoSuchElementException(f"No element found for {call_site}")
+        self._record_locator(call_site, winner[-1], time.monotonic() - start)
+        element = self.element_cache.put(candidates, element)
+        if clickable:
+            element.remember(displayed=True, enabled=True)
+        return element
+
+    def _find_first(self, candidates):
+        """Returns the element the first supported candidate finds, without waiting."""
+        for _, by, value in candidates[:-1]:
+            try:
+                return self.driver.find_element(by, value)
+            except UNSUPPORTED_LOCATOR_ERRORS:
+                continue
+        _, by, value = candidates[-1]
+        return self.driver.find_element(by, value)
+
+    def _record_locator(self, call_site, strategy, elapsed):
+        stats = self.locator_stats.setdefault(call_site, {'calls': 0, 'total_time': 0.0, 'wins': {}})
+        stats['calls'] += 1
+        stats['total_time'] += elapsed
+        stats['wins'][strategy] = stats['wins'].get(strategy, 0) + 1
+        stats['strategy'] = strategy
+        stats['elapsed'] = elapsed
+
     def enter_phone_number(self, phone_number):
-        """Types a phone number one digit at a time."""
+        """
+        Types a phone number on the on-screen keypad.
+        In 'batched' keypad mode the whole number is sent as one W3C actions sequence and read back
+        afterwards; in 'per_digit' mode each key is looked up and clicked separately.
+        """
         print(f"📱 Entering phone number: {phone_number} (from {CURRENT_FILE})")
-        for digit in phone_number:
-            button = self.driver.find_element(by=AppiumBy.XPATH, value=f'//android.widget.Button[@text="{digit}"]')
-            button.click()
-            time.sleep(0.5)
+        if self.keypad_mode == 'batched':
+            self._tap_keypad_sequence(phone_number)
+        else:
+            self._press_keys(phone_number)
         print(f"✅ Phone number entered successfully. (from {CURRENT_FILE})")
 
+    def _press_keys(self, labels):
+        """Looks up and clicks each keypad key in turn."""
+        for label in labels:
+            locator = (AppiumBy.XPATH, f'//{KEYPAD_BUTTON_CLASS}[@text="{label}"]')
+            button = self.wait_for(element_clickable(locator), replaces_sleep=0.5)
+            self.invalidate_snapshot()
+            button.click()
+
+    def load_keypad(self, refresh=False):
+        """
+        Reads the keypad layout from a single hierarchy dump (reusing the current screen snapshot
+        when there is one) and caches the center of every digit key.
+        The cache is tied to the screen the keypad was read on (see screens.py), so a different
+        screen forces a refresh.
+        """
+        snapshot = self.snapshot(refresh)
+        keys = {}
+        for node in snapshot.by_class.get(KEYPAD_BUTTON_CLASS, []):
+            if len(node.text) == 1 and node.text.isdigit() and node.center:
+                keys[node.text] = node.center
+        screen = self.screens.classify(snapshot)
+        self._keypad = {'screen': screen, 'keys': keys}
+        print(f"🔢 Cached {len(keys)} keypad keys for the {screen} screen (from {CURRENT_FILE})")
+        return keys
+
+    def invalidate_keypad(self):
+        """Drops the cached keypad layout so the next entry re-reads it."""
+        self._keypad = None
+
+    def _cached_keypad(self, digits):
+        screen = self.current_screen(refresh=False)
+        if self._keypad is None or screen is None or self._keypad['screen'] != screen:
+            return self.load_keypad()
+        keys = self._keypad['keys']
+        if not set(digits) <= set(keys):
+            return self.load_keypad(refresh=True)
+        return keys
+
+    def _tap_keypad_sequence(self, digits):
+        keys = self._cached_keypad(digits)
+        expected = keypad_echo(self.snapshot()) + digits
+        try:
+            self._perform_taps(keys, digits)
+        except WebDriverException as e:
+            # The cached layout no longer matches the screen: refresh it once and retry.
+            print(f"⚠️ Keypad entry failed ({e.__class__.__name__}), refreshing the keypad cache. (from {CURRENT_FILE})")
+            keys = self.load_keypad(refresh=True)
+            self._perform_taps(keys, digits)
+        shown = keypad_echo(self.snapshot(refresh=True))
+        if shown == expected:
+            return
+        # Taps at stale coordinates land on other keys or nowhere without an error: start over key by key
+        print(f"⚠️ The keypad shows '{shown}' instead of '{expected}', entering it key by key. (from {CURRENT_FILE})")
+        self.invalidate_keypad()
+        self._press_keys(KEYPAD_DELETE * len(shown) + expected)
+        shown = keypad_echo(self.snapshot(refresh=True))
+        if shown != expected:
+            raise Exception(f"The keypad shows '{shown}' instead of '{expected}'")
+
+    def _perform_taps(self, keys, digits):
+        missing = [digit for digit in digits if digit not in keys]
+        if missing:
+            raise NoSuchElementException(f"Keypad buttons not found for digits: {''.join(sorted(set(missing)))}")
+        finger = PointerInput(interaction.POINTER_TOUCH, 'finger')
+        actions = ActionBuilder(self.driver, mouse=finger, duration=0)
+        for digit in digits:
+            x, y = keys[digit]
+            actions.pointer_action.move_to_location(x, y)
+            actions.pointer_action.pointer_down()
+            actions.pointer_action.pause(KEY_PRESS_SECONDS)
+            actions.pointer_action.release()
+            actions.pointer_action.pause(KEY_GAP_SECONDS)
+        self.invalidate_snapshot()
+        actions.perform()
+
+    def snapshot(self, refresh=False):
+        """
+        Returns an indexed snapshot of the current hierarchy, fetching page_source only when
+        there is no snapshot yet or the last one was invalidated by a UI-mutating action.
+        """
+        if refresh or self._snapshot is None:
+            self._snapshot = UiSnapshot(self.driver.page_source)
+        return self._snapshot
+
+    def screenshot(self, refresh=False):
+        """
+        Returns the current screen as a decoded Screenshot (see visual.py), taking one only when
+        there is none yet or the last one was invalidated by a UI-mutating action.
+        """
+        if refresh or self._screenshot is None:
+            self._screenshot = Screenshot(self.driver.get_screenshot_as_png())
+        return self._screenshot
+
+    def invalidate_snapshot(self):
+        """
+        Marks the cached snapshot, screenshot and element handles as outdated; called by every action that
+        changes the UI.
+        """
+        self._snapshot = None
+        self._screenshot = None
+        self.element_cache.invalidate()
+
+    def current_screen(self, refresh=True, use_activity=False):
+        """
+        Classifies the current screen with one hierarchy fetch and returns its name (see screens.py),
+        or None if no fingerprint matches. With use_activity, a current_activity call is tried first
+        and the hierarchy is only fetched when the activity does not identify the screen.
+        """
+        if use_activity:
+            screen = self.screens.classify_activity(self.driver.current_activity)
+            if screen is not None:
+                return screen
+        return self.screens.classify(self.snapshot(refresh))
+
+    def expect_screen(self, expected, leaving=(), timeout=10):
+        """
+        Waits until the terminal shows one of the expected screens and returns its name.
+        The screens in leaving (the one the last action navigates away from) and unrecognized
+        in-between states are waited out; any other known screen raises UnexpectedScreenError
+        at once instead of running into the timeout.
+        """
+        expected = [expected] if isinstance(expected, str) else list(expected)
+        leaving = [leaving] if isinstance(leaving, str) else list(leaving)
+
+        def check(driver):
+            screen = self.current_screen()
+            if screen in expected:
+                return screen
+            if screen is not None and screen not in leaving:
+                print(f"❌ Unexpected screen: {screen} (expected {' or '.join(expected)}) (from {CURRENT_FILE})")
+                raise UnexpectedScreenError(expected, screen)
+            return False
+
+        screen = self.wait_for(ScreenCondition(f"screen {' or '.join(expected)}", check), timeout=timeout)
+        print(f"🧭 On the {screen} screen. (from {CURRENT_FILE})")
+        return screen
+
+    def press_back(self):
+        """Presses the Android back key."""
+        self.driver.back()
+        self.invalidate_snapshot()
+
+    def validate_screen(self, checks, timeout=10):
+        """
+        Validates a batch of checks (see UiSnapshot.evaluate) against one hierarchy dump per poll.
+        Waits until every check passes in the same snapshot and returns the list of
+        (check, detail) pairs; raises if they do not all pass within the timeout.
+        """
+        print(f"🔍 Validating {len(checks)} checks against one screen snapshot (from {CURRENT_FILE})")
+        failures = []
+
+        def check_all(driver):
+            snapshot = self.snapshot(refresh=True)
+            results = [(check,) + snapshot.evaluate(check) for check in checks]
+            failures[:] = [detail for _, passed, detail in results if not passed]
+            return None if failures else [(check, detail) for check, _, detail in results]
+
+        try:
+            results = self.wait_for(ScreenCondition(f"{len(checks)} screen checks", check_all), timeout=timeout)
+        except TimeoutException:
+            print(f"❌ Validation failed: {'; '.join(failures)} (from {CURRENT_FILE})")
+            raise Exception(f"Screen validation failed: {'; '.join(failures)}")
+        for _, detail in results:
+            print(f"✅ Validation successful: {detail} (from {CURRENT_FILE})")
+        return results
+
+    def validate_visual(self, regions, timeout=5, strict=None):
+        """
+        Checks that each region (see visual.VisualRegion) looks like its reference image, matching
+        all of them against one screenshot per poll. Retakes the screenshot until every region
+        passes in the same capture and returns their results. If they do not within the timeout,
+        raises, or with strict=False prints a warning, keeps it in visual_warnings and returns the
+        last results. strict=None follows visual_mode: only 'warn' does not fail.
+        """
+        print(f"🖼️ Validating {len(regions)} regions against one screenshot (from {CURRENT_FILE})")
+        failures = []
+        latest = []
+
+        def check_all(driver):
+            results, elapsed_ms = check_regions(self.screenshot(refresh=bool(failures)), regions)
+            self.visual_log.append({'regions': len(regions), 'elapsed_ms': elapsed_ms,
+                                    'passed': all(result['passed'] for result in results)})
+            failures[:] = [result['detail'] for result in results if not result['passed']]
+            latest[:] = results
+            return None if failures else results
+
+        try:
+            results = self.wait_for(ScreenCondition(f"{len(regions)} visual checks", check_all), timeout=timeout)
+        except TimeoutException:
+            if strict is None:
+                strict = self.visual_mode != 'warn'
+            if not strict:
+                print(f"⚠️ Visual mismatch, not failing the run: {'; '.join(failures)} (from {CURRENT_FILE})")
+                self.visual_warnings.extend(failures)
+                return list(latest)
+            print(f"❌ Visual validation failed: {'; '.join(failures)} (from {CURRENT_FILE})")
+            raise Exception(f"Visual validation failed: {'; '.join(failures)}")
+        for result in results:
+            print(f"✅ Visual validation successful: {result['detail']} (from {CURRENT_FILE})")
+        return results
+
     def click_button_by_text(self, text):
         """Finds and clicks a button by its text."""
         print(f"🖱️ Clicking button with text: '{text}' (from {CURRENT_FILE})")
-        button = self.driver.find_element(by=AppiumBy.XPATH, value=f'//android.widget.Button[@text="{text}"]')
+        button = self.locate(text_locators(text, 'android.widget.Button'), f"click_button_by_text:{text}", timeout=0)
+        self.invalidate_snapshot()
         button.click()
         print(f"✅ Button '{text}' clicked. (from {CURRENT_FILE})")
 
@@ -45,15 +548,16 @@ class DeviceActions:
         This method is designed to prevent Stale Element exceptions.
         """
         print(f"⏳ Waiting for element: {locator_value} (from {CURRENT_FILE})")
-        wait = WebDriverWait(self.driver, timeout)
-        element = wait.until(EC.presence_of_element_located((locator_type, locator_value)))
+        element = self.locate(locators_for(locator_type, locator_value), f"wait_for_element_and_click:{locator_value}", timeout)
 
         if expected_text:
+            element.refreshed()
             print(f"🔍 Validating text on element. Expected: '{expected_text}', Found: '{element.text}' (from {CURRENT_FILE})")
             assert element.text == expected_text, f"Element text mismatch. Expected '{expected_text}' but found '{element.text}'."
             print(f"✅ Validation successful: Text is correct. (from {CURRENT_FILE})")
 
         print(f"🖱️ Clicking the element... (from {CURRENT_FILE})")
+        self.invalidate_snapshot()
         element.click()
         print(f"✅ Element found and clicked. (from {CURRENT_FILE})")
         return element
@@ -62,9 +566,8 @@ class DeviceActions:
         """Checks if a specific text is displayed on the screen."""
         print(f"🔍 Validating text: '{text}' (from {CURRENT_FILE})")
         try:
-            wait = WebDriverWait(self.driver, timeout)
-            element = wait.until(EC.presence_of_element_located((AppiumBy.XPATH, f'//*[contains(@text, "{text}")]')))
-            if element.is_displayed():
+            element = self.locate(text_locators(text, contains=True), f"is_text_present:{text}", timeout)
+            if element.refreshed().is_displayed():
                 print(f"✅ Validation successful: '{text}' is displayed. (from {CURRENT_FILE})")
                 return True
         except Exception:
@@ -79,8 +582,7 @@ class DeviceActions:
         """
         print(f"🔍 Validating element by resource ID: {resource_id} (from {CURRENT_FILE})")
         try:
-            wait = WebDriverWait(self.driver, timeout)
-            wait.until(EC.presence_of_element_located((AppiumBy.ID, resource_id)))
+            self.wait_for(element_present((AppiumBy.ID, resource_id)), timeout=timeout)
             print(f"✅ Validation successful: Element with ID '{resource_id}' is present. (from {CURRENT_FILE})")
             return True
         except Exception as e:
@@ -93,11 +595,10 @@ class DeviceActions:
         """
         print(f"🔍 Validating element ID and text: ID='{resource_id}', Text='{expected_text}' (from {CURRENT_FILE})")
         try:
-            wait = WebDriverWait(self.driver, timeout)
-            element = wait.until(EC.presence_of_element_located((AppiumBy.ID, resource_id)))
+            element = self.wait_for(element_present((AppiumBy.ID, resource_id)), timeout=timeout)
             
-            # Now validate the text of the found element
-            if element.text == expected_text:
+            # Now validate the text of the found element, as the device shows it now
+            if element.refreshed().text == expected_text:
                 print(f"✅ Validation successful: ID '{resource_id}' and text '{expected_text}' both match. (from {CURRENT_FILE})")
                 return True
             else:
@@ -113,8 +614,7 @@ class DeviceActions:
         """
         print(f"🔍 Validating if element with ID '{resource_id}' is clickable. (from {CURRENT_FILE})")
         try:
-            wait = WebDriverWait(self.driver, timeout)
-            element = wait.until(EC.element_to_be_clickable((AppiumBy.ID, resource_id)))
+            self.wait_for(element_clickable((AppiumBy.ID, resource_id)), timeout=timeout)
             print(f"✅ Validation successful: Element with ID '{resource_id}' is clickable. (from {CURRENT_FILE})")
             return True
         except Exception as e:
@@ -122,36 +622,72 @@ class DeviceActions:
             raise Exception(f"Element with ID '{resource_id}' was not clickable: {e}")
 
     def enter_text_by_xpath(self, xpath, text, timeout=10):
-        """Waits for a text field by XPATH and enters text."""
+        """
+        Waits for a text field by XPATH and enters text with the fastest method that reads back
+        correctly for that field (see text_input.py). Transient failures such as a stale field are
+        retried (see retry.py), a wait that ran out is not; once the text was sent it is only typed
+        again if no field shows it.
+        """
         print(f"📝 Waiting for text field with XPATH: '{xpath}' to enter text: '{text}' (from {CURRENT_FILE})")
-        wait = WebDriverWait(self.driver, timeout)
+
+        def attempt(progress):
+            text_field = self.locate(locators_for(AppiumBy.XPATH, xpath), f"enter_text_by_xpath:{xpath}", timeout)
+            self.invalidate_snapshot()
+            progress['dispatched'] = True
+            self.text_input.enter(self.driver, text_field, text, xpath)
+
+        def already_done():
+            return bool(self.snapshot(refresh=True).find_by_text(text, 'android.widget.EditText'))
+
         try:
-            text_field = wait.until(EC.presence_of_element_located((AppiumBy.XPATH, xpath)))
-            text_field.send_keys(text)
-            print(f"✅ Text entered successfully. (from {CURRENT_FILE})")
+            self.retrier.call('enter_text_by_xpath', xpath, attempt, already_done)
         except TimeoutException:
+            # The wait already used its whole timeout; it is reported as missing, not retried
             raise NoSuchElementException(f"Timed out waiting for element with XPATH: {xpath}")
+        print(f"✅ Text entered successfully. (from {CURRENT_FILE})")
 
     def click_by_id_or_text(self, resource_id=None, text=None, timeout=10):
-        """Finds and clicks an element by ID or text."""
-        wait = WebDriverWait(self.driver, timeout)
-        try:
-            if resource_id:
-                print(f"🖱️ Clicking element with ID: '{resource_id}' (from {CURRENT_FILE})")
-                element = wait.until(EC.element_to_be_clickable((AppiumBy.ID, resource_id)))
-            elif text:
-                print(f"🖱️ Clicking element with text: '{text}' (from {CURRENT_FILE})")
-                element = wait.until(EC.element_to_be_clickable((AppiumBy.XPATH, f'//android.widget.Button[@text="{text}"]')))
-            else:
-                raise ValueError("Must provide either a resource_id or text.")
-            
+        """
+        Finds and clicks an element by ID or text. Transient failures such as a stale element or an
+        intercepted click are retried (see retry.py), a wait that ran out is not; once the click was
+        sent it is only repeated if the terminal is still on the screen it was sent on (or, when
+        either screen is unrecognized, if the element is still there).
+        """
+        if resource_id:
+            print(f"🖱️ Clicking element with ID: '{resource_id}' (from {CURRENT_FILE})")
+            candidates = locators_for(AppiumBy.ID, resource_id)
+        elif text:
+            print(f"🖱️ Clicking element with text: '{text}' (from {CURRENT_FILE})")
+            candidates = text_locators(text, 'android.widget.Button')
+        else:
+            raise ValueError("Must provide either a resource_id or text.")
+        target = resource_id or text
+
+        clicked_on = []
+
+        def attempt(progress):
+            element = self.locate(candidates, f"click_by_id_or_text:{target}", timeout, clickable=True)
+            # The screen the click is sent on; the next screen may have a button with the same text
+            clicked_on[:] = [self.current_screen(refresh=False)]
+            self.invalidate_snapshot()
+            progress['dispatched'] = True
             element.click()
-            print(f"✅ Element clicked successfully. (from {CURRENT_FILE})")
+
+        def already_done():
+            screen = self.current_screen()
+            if clicked_on[0] is not None and screen is not None:
+                return screen != clicked_on[0]
+            snapshot = self.snapshot()
+            return not (snapshot.has_id(resource_id) if resource_id else snapshot.find_by_text(text))
+
+        try:
+            self.retrier.call('click_by_id_or_text', target, attempt, already_done)
         except TimeoutException:
+            # The wait already used its whole timeout; it is reported as missing, not retried
             if resource_id:
                 raise NoSuchElementException(f"Timed out waiting for element with ID: {resource_id}")
-            else:
-                raise NoSuchElementException(f"Timed out waiting for element with text: {text}")
+            raise NoSuchElementException(f"Timed out waiting for element with text: {text}")
+        print(f"✅ Element clicked successfully. (from {CURRENT_FILE})")
 
     def quit(self):
         """Quits the driver session."""
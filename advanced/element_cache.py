@@ -0,0 +1,128 @@
+from selenium.common.exceptions import StaleElementReferenceException
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+
+
+def cache_key(candidates):
+    """
+    The cache key of a lookup: the (by, value) of its last candidate. That is the locator as
+    the caller wrote it (locators_for and text_locators keep it as the final fallback), so a
+    wait on a locator and a later lookup of the same locator share one entry.
+    """
+    _, by, value = candidates[-1]
+    return by, value
+
+
+class CachedElement:
+    """
+    A WebElement handle reused for the lifetime of one screen. text, is_displayed() and
+    is_enabled() are read once per screen; when the handle is stale it is re-resolved from its
+    locator candidates and the read is retried once. Validations call refreshed() first, so they
+    always judge what the device shows now. Clicks and typing are sent once, and anything else is
+    passed to the WebElement.
+    """
+
+    def __init__(self, cache, candidates, element):
+        self._cache = cache
+        self._candidates = candidates
+        self._element = element
+        self._properties = {}
+
+    @property
+    def element(self):
+        return self._element
+
+    def _call(self, action):
+        try:
+            return action(self._element)
+        except StaleElementReferenceException:
+            self._element = self._cache.re_resolve(self._candidates)
+            self._properties.clear()
+            return action(self._element)
+
+    def _property(self, name, read):
+        if name in self._properties:
+            self._cache.stats['property_hits'] += 1
+            return self._properties[name]
+        self._cache.stats['property_misses'] += 1
+        value = self._call(read)
+        self._properties[name] = value
+        return value
+
+    def refreshed(self):
+        """Forgets the property values read so far, so the next reads ask the device; returns self."""
+        self._properties.clear()
+        return self
+
+    def remember(self, **properties):
+        """Records property values just read elsewhere (e.g. by a clickable wait)."""
+        self._properties.update(properties)
+
+    @property
+    def text(self):
+        return self._property('text', lambda element: element.text)
+
+    def is_displayed(self):
+        return self._property('displayed', lambda element: element.is_displayed())
+
+    def is_enabled(self):
+        return self._property('enabled', lambda element: element.is_enabled())
+
+    def is_known_clickable(self):
+        """True if this screen already showed the element displayed and enabled, without asking again."""
+        return self._properties.get('displayed') is True and self._properties.get('enabled') is True
+
+    def click(self):
+        # Not re-resolved when stale: the click may have landed, and only the caller can tell
+        # (see the already_done checks in retry.py)
+        return self._element.click()
+
+    def send_keys(self, *value):
+        return self._element.send_keys(*value)
+
+    def __getattr__(self, name):
+        return getattr(self._element, name)
+
+    def __repr__(self):
+        return f"CachedElement({cache_key(self._candidates)[1]})"
+
+
+class ElementCache:
+    """
+    Element handles keyed by locator, valid for one screen generation. DeviceActions starts a new
+    generation whenever it changes the UI (the same moment it drops its page_source snapshot),
+    and on every poll of a wait, since the app also changes the screen on its own (a button
+    enabling, a screen replacing another); either empties the cache.
+    """
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+        self.generation = 0
+        self.entries = {}
+        self.stats = {'hits': 0, 'misses': 0, 'stale_recoveries': 0, 'property_hits': 0, 'property_misses': 0}
+
+    def get(self, candidates):
+        element = self.entries.get(cache_key(candidates))
+        self.stats['hits' if element else 'misses'] += 1
+        return element
+
+    def put(self, candidates, element):
+        if isinstance(element, CachedElement):
+            element = element.element
+        cached = CachedElement(self, candidates, element)
+        self.entries[cache_key(candidates)] = cached
+        return cached
+
+    def re_resolve(self, candidates):
+        self.stats['stale_recoveries'] += 1
+        print(f"♻️ Stale element for {cache_key(candidates)[1]}, looking it up again. (from {CURRENT_FILE})")
+        return self._resolve(candidates)
+
+    def invalidate(self):
+        self.generation += 1
+        self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
@@ -0,0 +1,812 @@
+import base64
+import io
+import json
+import re
+import shlex
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import quoteattr
+import os
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+CURRENT_FILE = os.path.basename(__file__)
+HEADER_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "header.png")
+# The header is drawn smaller than header.png and centered in its view, as on a denser screen
+HEADER_ZOOM = 0.9
+
+APP_PACKAGE = 'com.appcard.androidterminal'
+MAIN_ACTIVITY = '.ui.MainActivity'
+LAUNCHER_ACTIVITY = '.Launcher'
+SCREEN_WIDTH = 1080
+SCREEN_HEIGHT = 1920
+KEYCODE_PASTE = 279
+KEYPAD_TOP = 900
+LOGCAT_CAPACITY = 500
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+
+# Seconds added to every command, per command name ('default' applies to the rest).
+# 'device' roughly matches a UiAutomator2 server on a terminal over USB: XPath and
+# page_source pay for a full hierarchy dump, the other lookups do not.
+LATENCY_PROFILES = {
+    'none': {},
+    'device': {
+        'default': 0.02,
+        'find_element:xpath': 0.25,
+        'find_elements:xpath': 0.25,
+        'page_source': 0.3,
+        'actions': 0.1,
+        'new_session': 1.0,
+        'screenshot': 0.15,
+        # send_keys injects text through the IME one character at a time
+        'send_keys_per_char': 0.012,
+    },
+}
+
+# W3C error code -> HTTP status
+ERROR_STATUS = {
+    'invalid argument': 400,
+    'invalid element state': 400,
+    'invalid selector': 400,
+    'invalid session id': 404,
+    'no such element': 404,
+    'stale element reference': 404,
+    'unknown command': 404,
+    'unsupported operation': 500,
+}
+
+UI_SELECTOR_CALL = re.compile(r'\.(\w+)\(("(?:[^"\\]|\\.)*")\)')
+XPATH_ATTRIBUTE = re.compile(r'^//([\w.]+|\*)\[@([\w-]+)=(["\'])(.*?)\3\]$')
+XPATH_CONTAINS = re.compile(r'^//([\w.]+|\*)\[contains\(@([\w-]+),\s*(["\'])(.*?)\3\)\]$')
+XPATH_CLASS = re.compile(r'^//([\w.]+)$')
+
+
+class WebDriverError(Exception):
+    """A W3C error answered to the client as {"value": {"error", "message"}}."""
+
+    def __init__(self, error, message):
+        super().__init__(message)
+        self.error = error
+
+
+def _id(name):
+    return f"{APP_PACKAGE}:id/{name}"
+
+
+def _node(class_name, bounds, text='', resource_id='', clickable=False, enabled=True, content_desc=''):
+    return {
+        'class': class_name,
+        'text': text,
+        'resource-id': resource_id,
+        'content-desc': content_desc,
+        'bounds': bounds,
+        'clickable': clickable,
+        'enabled': enabled,
+        'displayed': True,
+    }
+
+
+def _bounds(x1, y1, x2, y2):
+    return f"[{x1},{y1}][{x2},{y2}]"
+
+
+def _keypad_nodes(top=KEYPAD_TOP):
+    """The 3x4 keypad on the welcome screen: 1-9, then 0 and OK on the bottom row."""
+    nodes = []
+    labels = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '⌫', '0', 'OK']
+    for index, label in enumerate(labels):
+        row, column = divmod(index, 3)
+        x1, y1 = 240 + column * 200, top + row * 200
+        nodes.append(_node('android.widget.Button', _bounds(x1, y1, x1 + 180, y1 + 180), text=label, clickable=True))
+    return nodes
+
+
+class FakeDevice:
+    """
+    The scripted appcard terminal: a small state machine over the welcome/keypad, confirm,
+    email, name and featured clip screens. Every screen change bumps the generation, which
+    makes element references from earlier screens stale, as on a real device.
+    """
+
+    def __init__(self, known_phones=(), transition_delay=0.0):
+        self.known_phones = set(known_phones)
+        self.transition_delay = transition_delay
+        self.lock = threading.RLock()
+        self.logcat = deque(maxlen=LOGCAT_CAPACITY)
+        self.keypad_top = KEYPAD_TOP
+        self.reset()
+
+    def log(self, message, level='INFO'):
+        self.logcat.append({'timestamp': int(time.time() * 1000), 'level': level, 'message': message})
+
+    def drain_logcat(self):
+        """Returns the logcat entries since the last call, as Appium's 'logcat' log type does."""
+        with self.lock:
+            self._settle()
+            entries = list(self.logcat)
+            self.logcat.clear()
+            return entries
+
+    def reset(self, screen='welcome', **fields):
+        """Puts the app on a screen with the given field values, as after a fresh launch."""
+        with self.lock:
+            self.running = True
+            self.phone = fields.pop('phone', '')
+            self.fields = fields
+            self.focused = None
+            self.clipboard = ''
+            self.generation = 0
+            self.pending = None
+            self.log(f"I/ActivityTaskManager: Displayed {APP_PACKAGE}/{MAIN_ACTIVITY}: +412ms")
+            self._show(screen, delay=0)
+
+    def _show(self, screen, delay=None):
+        delay = self.transition_delay if delay is None else delay
+        self.generation += 1
+        if delay:
+            self.screen = 'loading'
+            self.pending = (screen, time.monotonic() + delay)
+        else:
+            self.screen = screen
+            self.pending = None
+            self._log_resumed(screen)
+        self._build()
+
+    def _settle(self):
+        if self.pending and time.monotonic() >= self.pending[1]:
+            self.screen, self.pending = self.pending[0], None
+            self.generation += 1
+            self._log_resumed(self.screen)
+            self._build()
+
+    def _log_resumed(self, screen):
+        fragment = ''.join(part.title() for part in screen.split('_')) + 'Fragment'
+        self.log(f"D/FragmentManager: moveto RESUMED: {fragment}{{{self.generation:x}}}", level='DEBUG')
+
+    def _log_lookup(self):
+        """The A lookup the terminal sends for a typed number, and its D response, as in mids.txt."""
+        self.txn = getattr(self, 'txn', 7644) + 1
+        name = 'Oren1 QA King' if self.phone in self.known_phones else ''
+        self.log(f"I/DispMsgsHelper: Msg Req  :  0  1 {self.txn} A 0 0 \\ {self.phone} \\")
+        self.log(f"I/MessagesHelper: Msg Resp : 54  1 {self.txn} D 1   \\ {self.phone}? \\ 0 \\ {name} \\ 389562 \\ C \\")
+
+    def _build(self):
+        nodes = []
+        if self.running:
+            nodes.append(_node('android.widget.ImageView', _bounds(0, 0, 1080, 200), resource_id=_id('activity_main_header')))
+        if not self.running or self.screen == 'loading':
+            pass
+        elif self.screen == 'welcome':
+            nodes += [
+                _node('android.widget.TextView', _bounds(880, 220, 1060, 300), text='Español', clickable=True,
+                      resource_id=_id('tv_language')),
+                _node('android.widget.TextView', _bounds(140, 700, 940, 820), text=self.phone or 'Enter your mobile #',
+                      resource_id=_id('view_welcome_phone_number' if self.phone else 'view_welcome_phone_number_empty')),
+            ]
+            nodes += _keypad_nodes(self.keypad_top)
+            nodes += [
+                _node('android.widget.TextView', _bounds(140, 1740, 520, 1800), text='Terms', clickable=True,
+                      resource_id=_id('tv_terms')),
+                _node('android.widget.TextView', _bounds(560, 1740, 940, 1800), text='Privacy Policy', clickable=True,
+                      resource_id=_id('tv_privacy_policy')),
+            ]
+        elif self.screen == 'confirm':
+            nodes += [
+                _node('android.widget.TextView', _bounds(140, 600, 940, 700), text=f"Is {self.phone} correct?"),
+                _node('android.widget.Button', _bounds(140, 1200, 520, 1320), text='Edit', clickable=True),
+                _node('android.widget.Button', _bounds(560, 1200, 940, 1320), text='Confirm', clickable=True),
+            ]
+        elif self.screen == 'email':
+            email = self.fields.get('email', '')
+            nodes += [
+                _node('android.widget.EditText', _bounds(140, 600, 940, 720), text=email or 'Enter E-mail Address',
+                      clickable=True, resource_id=_id('et_email'), content_desc='field:email'),
+                _node('android.widget.Button', _bounds(340, 1200, 740, 1320), text='Confirm', clickable=True,
+                      enabled=bool(email), resource_id=_id('view_email_confirm')),
+            ]
+        elif self.screen == 'name':
+            first_name = self.fields.get('first_name', '')
+            last_name = self.fields.get('last_name', '')
+            nodes += [
+                _node('android.widget.EditText', _bounds(140, 600, 940, 720), text=first_name or 'First name',
+                      clickable=True, resource_id=_id('et_first_name'), content_desc='field:first_name'),
+                _node('android.widget.EditText', _bounds(140, 760, 940, 880), text=last_name or 'Last name',
+                      clickable=True, resource_id=_id('et_last_name'), content_desc='field:last_name'),
+                _node('android.widget.TextView', _bounds(340, 1200, 740, 1320), text='Confirm', clickable=True,
+                      resource_id=_id('tvConfirm')),
+            ]
+        elif self.screen == 'featured':
+            clipped = self.fields.get('clipped')
+            nodes += [
+                _node('android.widget.TextView', _bounds(140, 300, 940, 400),
+                      text=f"Welcome, {self.fields.get('first_name') or 'member'}!"),
+                _node('android.widget.Button', _bounds(340, 1200, 740, 1320), text='Clipped!' if clipped else 'Clip it!',
+                      clickable=not clipped, resource_id=_id('view_featured_clip')),
+            ]
+        self.nodes = nodes
+
+    def move_keypad(self, top):
+        """Moves the keypad on the same screen, as when a banner appears above it."""
+        with self.lock:
+            self.keypad_top = top
+            self._build()
+
+    # --- queries -------------------------------------------------------------------------
+
+    @property
+    def activity(self):
+        return MAIN_ACTIVITY if self.running else LAUNCHER_ACTIVITY
+
+    def current(self):
+        with self.lock:
+            self._settle()
+            return self.generation, list(self.nodes)
+
+    def screenshot_png(self):
+        """
+        Draws the current screen: the header image scaled by HEADER_ZOOM and centered in the header
+        view, and an outline for every other view. Without Pillow, header.png itself is returned.
+        """
+        generation, nodes = self.current()
+        cached = getattr(self, '_screenshot', None)
+        if cached and cached[0] == generation:
+            return cached[1]
+        if Image is None:
+            with open(HEADER_IMAGE, 'rb') as f:
+                return f.read()
+        screen = Image.new('RGB', (SCREEN_WIDTH, SCREEN_HEIGHT), (250, 250, 250))
+        draw = ImageDraw.Draw(screen)
+        for node in nodes:
+            x1, y1, x2, y2 = (int(value) for value in re.findall(r'-?\d+', node['bounds']))
+            if node['resource-id'] == _id('activity_main_header'):
+                with Image.open(HEADER_IMAGE) as header:
+                    header = header.convert('RGB')
+                    size = (round(header.width * HEADER_ZOOM), round(header.height * HEADER_ZOOM))
+                    screen.paste(header.resize(size, Image.LANCZOS),
+                                 ((x1 + x2 - size[0]) // 2, (y1 + y2 - size[1]) // 2))
+            else:
+                draw.rectangle((x1, y1, x2 - 1, y2 - 1), outline=(120, 120, 120),
+                               fill=(225, 225, 225) if node['clickable'] else None)
+        output = io.BytesIO()
+        screen.save(output, 'PNG')
+        self._screenshot = (generation, output.getvalue())
+        return self._screenshot[1]
+
+    def element_id(self, generation, index):
+        return f"{generation}.{index}"
+
+    def node_for(self, element_id):
+        """Returns the node behind an element reference, or raises if it belongs to an earlier screen."""
+        with self.lock:
+            self._settle()
+            try:
+                generation, index = (int(part) for part in element_id.split('.'))
+            except ValueError:
+                raise WebDriverError('no such element', f"Unknown element reference {element_id}")
+            if generation != self.generation or index >= len(self.nodes):
+                raise WebDriverError('stale element reference',
+                                     f"The element {element_id} is no longer attached to the hierarchy")
+            return self.nodes[index]
+
+    def find(self, strategy, value):
+        """Returns the element references matching a locator on the current screen."""
+        matcher = _matcher(strategy, value)
+        with self.lock:
+            self._settle()
+            return [self.element_id(self.generation, index) for index, node in enumerate(self.nodes) if matcher(node)]
+
+    def page_source(self):
+        with self.lock:
+            self._settle()
+            lines = [
+                "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>",
+                f'<hierarchy index="0" class="hierarchy" rotation="0" width="{SCREEN_WIDTH}" height="{SCREEN_HEIGHT}">',
+                f'<android.widget.FrameLayout index="0" package="{APP_PACKAGE}" class="android.widget.FrameLayout" '
+                f'bounds="{_bounds(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)}" displayed="true">',
+            ]
+            for index, node in enumerate(self.nodes):
+                attributes = ' '.join(f'{name}={quoteattr(_attribute(node, name))}'
+                                      for name in ('class', 'text', 'resource-id', 'content-desc', 'clickable',
+                                                   'enabled', 'displayed', 'bounds'))
+                lines.append(f'<{node["class"]} index="{index}" package="{APP_PACKAGE}" {attributes} />')
+            lines += ['</android.widget.FrameLayout>', '</hierarchy>']
+            return '\n'.join(lines)
+
+    # --- interactions --------------------------------------------------------------------
+
+    def click(self, node):
+        with self.lock:
+            if not node['enabled']:
+                return
+            text = node['text']
+            if node['class'] == 'android.widget.EditText':
+                self.focused = node['content-desc'].split(':', 1)[-1]
+            elif self.screen == 'welcome' and node['class'] == 'android.widget.Button':
+                if text.isdigit():
+                    self.phone += text
+                    self._build()
+                elif text == '⌫':
+                    self.phone = self.phone[:-1]
+                    self._build()
+                elif text == 'OK' and self.phone:
+                    self._log_lookup()
+                    self._show('featured' if self.phone in self.known_phones else 'confirm')
+            elif self.screen == 'confirm' and text == 'Confirm':
+                self._show('email')
+            elif self.screen == 'confirm' and text == 'Edit':
+                self._show('welcome')
+            elif node['resource-id'] == _id('view_email_confirm'):
+                self._show('name')
+            elif node['resource-id'] == _id('tvConfirm'):
+                self._show('featured')
+            elif node['resource-id'] == _id('view_featured_clip'):
+                self.fields['clipped'] = True
+                self._build()
+
+    def set_text(self, node, text):
+        with self.lock:
+            if node['class'] != 'android.widget.EditText':
+                raise WebDriverError('invalid argument', f"Cannot set the text of a {node['class']}")
+            field = node['content-desc'].split(':', 1)[-1]
+            self.fields[field] = text
+            self._build()
+
+    def type_text(self, text):
+        """Types at the end of the focused field, as the IME does."""
+        with self.lock:
+            if not self.focused:
+                raise WebDriverError('invalid element state', "No text field has the focus")
+            self.fields[self.focused] = self.fields.get(self.focused, '') + text
+            self._build()
+
+    def tap(self, x, y):
+        """A pointer tap at screen coordinates clicks the clickable node under it."""
+        with self.lock:
+            self._settle()
+            for node in reversed(self.nodes):
+                box = [int(value) for value in re.findall(r'-?\d+', node['bounds'])]
+                if node['clickable'] and box[0] <= x < box[2] and box[1] <= y < box[3]:
+                    self.click(node)
+                    return
+
+    def back(self):
+        """The back key: one screen towards welcome; on the welcome screen it clears the typed number."""
+        with self.lock:
+            self._settle()
+            if not self.running:
+                return
+            if self.screen == 'welcome':
+                self.phone = ''
+                self.generation += 1
+                self._build()
+            elif self.screen in ('confirm', 'featured'):
+                self.phone = ''
+                self.fields = {}
+                self._show('welcome')
+            elif self.screen == 'email':
+                self._show('confirm')
+            elif self.screen == 'name':
+                self._show('email')
+
+    def terminate(self):
+        with self.lock:
+            self.log(f"I/ActivityManager: Force stopping {APP_PACKAGE}")
+            self.running = False
+            self.generation += 1
+            self._build()
+
+    def activate(self):
+        with self.lock:
+            if not self.running:
+                self.reset()
+
+
+def _attribute(node, name):
+    value = node.get(name, '')
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def _ui_selector_matcher(selector):
+    calls = UI_SELECTOR_CALL.findall(selector)
+    if not selector.startswith('new UiSelector()') or not calls:
+        raise WebDriverError('invalid selector', f"Unsupported UiSelector: {selector}")
+    checks = []
+    for method, literal in calls:
+        value = json.loads(literal)
+        if method == 'className':
+            checks.append(lambda node, value=value: node['class'] == value)
+        elif method == 'text':
+            checks.append(lambda node, value=value: node['text'] == value)
+        elif method == 'textContains':
+            checks.append(lambda node, value=value: value in node['text'])
+        elif method == 'resourceId':
+            checks.append(lambda node, value=value: node['resource-id'] == value)
+        elif method == 'description':
+            checks.append(lambda node, value=value: node['content-desc'] == value)
+        else:
+            raise WebDriverError('invalid selector', f"Unsupported UiSelector method: {method}")
+    return lambda node: all(check(node) for check in checks)
+
+
+def _xpath_matcher(xpath):
+    match = XPATH_ATTRIBUTE.match(xpath)
+    if match:
+        node_class, attribute, _, value = match.groups()
+        return lambda node: node_class in ('*', node['class']) and _attribute(node, attribute) == value
+    match = XPATH_CONTAINS.match(xpath)
+    if match:
+        node_class, attribute, _, value = match.groups()
+        return lambda node: node_class in ('*', node['class']) and value in _attribute(node, attribute)
+    match = XPATH_CLASS.match(xpath)
+    if match:
+        return lambda node: node['class'] == match.group(1)
+    raise WebDriverError('invalid selector', f"Unsupported XPath: {xpath}")
+
+
+def _matcher(strategy, value):
+    if strategy == 'id':
+        return lambda node: node['resource-id'] in (value, _id(value))
+    if strategy == 'css selector' and value.startswith('[id="'):
+        return _matcher('id', value[5:-2])
+    if strategy == 'class name':
+        return lambda node: node['class'] == value
+    if strategy == 'accessibility id':
+        return lambda node: node['content-desc'] == value
+    if strategy == '-android uiautomator':
+        return _ui_selector_matcher(value)
+    if strategy == 'xpath':
+        return _xpath_matcher(value)
+    raise WebDriverError('invalid selector', f"Locator strategy '{strategy}' is not supported")
+
+
+class FakeAppiumServer:
+    """
+    A local stand-in for an Appium UiAutomator2 server that speaks enough of the W3C WebDriver
+    protocol for DeviceActions: sessions, element lookup and interaction, page_source, W3C
+    actions, screenshots and the 'mobile:' extensions the scripts use. Commands are counted
+    per name and can be slowed down per name to model a real device. Every session drives its
+    own FakeDevice, like one Appium server hosting sessions for several terminals; `device` is
+    the one of the newest session.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, known_phones=(), transition_delay=0.0,
+                 relaxed_security=False):
+        self.known_phones = known_phones
+        self.relaxed_security = relaxed_security
+        self.transition_delay = transition_delay
+        self.device = FakeDevice(known_phones, transition_delay)
+        self.latency = dict(latency or {})
+        self.sessions = {}
+        self.command_counts = Counter()
+        self.connections = 0
+        # command -> [W3C error, times left, after]; see fail_next
+        self.faults = {}
+        self._counts_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-appium', daemon=True)
+        self._thread.start()
+        print(f"🧪 Fake Appium server listening on {self.url} (from {CURRENT_FILE})")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def total_commands(self):
+        with self._counts_lock:
+            return sum(self.command_counts.values())
+
+    def reset_stats(self):
+        with self._counts_lock:
+            self.command_counts.clear()
+
+    def fail_next(self, command, error='stale element reference', times=1, after=False):
+        """
+        Answers the next `times` calls of a command (a name as in command_counts) with a W3C error.
+        With after=True the command is carried out first, as when the device acted but the reply failed.
+        """
+        with self._counts_lock:
+            self.faults[command] = [error, times, after]
+
+    def _inject_fault(self, command, after=False):
+        with self._counts_lock:
+            fault = self.faults.get(command)
+            if not fault or fault[2] != after:
+                return
+            fault[1] -= 1
+            if fault[1] <= 0:
+                del self.faults[command]
+        raise WebDriverError(fault[0], f"Injected {fault[0]} for {command}")
+
+    def _count_connection(self):
+        with self._counts_lock:
+            self.connections += 1
+
+    def _count(self, command):
+        with self._counts_lock:
+            self.command_counts[command] += 1
+        delay = self.latency.get(command, self.latency.get('default', 0))
+        if delay:
+            time.sleep(delay)
+
+    # --- command handlers: each returns the JSON 'value' ----------------------------------
+
+    def new_session(self, body):
+        capabilities = dict((body.get('capabilities') or {}).get('alwaysMatch') or {})
+        session_id = uuid.uuid4().hex
+        self.device = FakeDevice(self.known_phones, self.transition_delay)
+        self.sessions[session_id] = self.device
+        return {'sessionId': session_id, 'capabilities': capabilities}
+
+    def delete_session(self, device, body):
+        self.sessions = {key: value for key, value in self.sessions.items() if value is not device}
+        return None
+
+    def find_element(self, device, body):
+        found = device.find(body.get('using'), body.get('value'))
+        if not found:
+            raise WebDriverError('no such element',
+                                 f"An element could not be located using {body.get('using')}={body.get('value')}")
+        return {ELEMENT_KEY: found[0], 'ELEMENT': found[0]}
+
+    def find_elements(self, device, body):
+        return [{ELEMENT_KEY: found, 'ELEMENT': found} for found in device.find(body.get('using'), body.get('value'))]
+
+    def click(self, device, element_id, body):
+        device.click(device.node_for(element_id))
+        return None
+
+    def element_text(self, device, element_id, body):
+        return device.node_for(element_id)['text']
+
+    def element_displayed(self, device, element_id, body):
+        return device.node_for(element_id)['displayed']
+
+    def element_enabled(self, device, element_id, body):
+        return device.node_for(element_id)['enabled']
+
+    def element_selected(self, device, element_id, body):
+        return False
+
+    def element_name(self, device, element_id, body):
+        return device.node_for(element_id)['class']
+
+    def element_attribute(self, device, element_id, name, body):
+        node = device.node_for(element_id)
+        aliases = {'resourceId': 'resource-id', 'className': 'class', 'contentDescription': 'content-desc'}
+        name = aliases.get(name, name)
+        return _attribute(node, name) if name in node else None
+
+    def element_rect(self, device, element_id, body):
+        x1, y1, x2, y2 = (int(value) for value in re.findall(r'-?\d+', device.node_for(element_id)['bounds']))
+        return {'x': x1, 'y': y1, 'width': x2 - x1, 'height': y2 - y1}
+
+    def send_keys(self, device, element_id, body):
+        text = body.get('text') if body.get('text') is not None else ''.join(body.get('value') or [])
+        time.sleep(len(text) * self.latency.get('send_keys_per_char', 0))
+        device.set_text(device.node_for(element_id), text)
+        return None
+
+    def clear(self, device, element_id, body):
+        device.set_text(device.node_for(element_id), '')
+        return None
+
+    def page_source(self, device, body):
+        return device.page_source()
+
+    def screenshot(self, device, body):
+        return base64.b64encode(device.screenshot_png()).decode('ascii')
+
+    def actions(self, device, body):
+        for source in body.get('actions', []):
+            if source.get('type') != 'pointer':
+                continue
+            x = y = None
+            for action in source.get('actions', []):
+                if action.get('type') == 'pointerMove':
+                    x, y = action.get('x'), action.get('y')
+                elif action.get('type') == 'pointerUp' and x is not None:
+                    device.tap(x, y)
+        return None
+
+    def release_actions(self, device, body):
+        return None
+
+    def back(self, device, body):
+        device.back()
+        return None
+
+    def get_log(self, device, body):
+        if body.get('type') != 'logcat':
+            raise WebDriverError('invalid argument', f"Unknown log type '{body.get('type')}'")
+        return device.drain_logcat()
+
+    def timeouts(self, device, body):
+        return None
+
+    def window_rect(self, device, body):
+        return {'x': 0, 'y': 0, 'width': SCREEN_WIDTH, 'height': SCREEN_HEIGHT}
+
+    def execute(self, device, body):
+        script = body.get('script', '')
+        args = body.get('args') or [{}]
+        options = args[0] if args and isinstance(args[0], dict) else {}
+        if script == 'mobile: getCurrentActivity':
+            return device.activity
+        if script == 'mobile: getCurrentPackage':
+            return APP_PACKAGE
+        if script == 'mobile: clearApp':
+            device.terminate()
+            return None
+        if script == 'mobile: terminateApp':
+            device.terminate()
+            return True
+        if script == 'mobile: activateApp':
+            device.activate()
+            return None
+        if script == 'mobile: replaceElementValue':
+            device.set_text(device.node_for(options.get('elementId')), options.get('text', ''))
+            return None
+        if script == 'mobile: type':
+            device.type_text(options.get('text', ''))
+            return None
+        if script == 'mobile: setClipboard':
+            device.clipboard = base64.b64decode(options.get('content', '')).decode('utf-8')
+            return None
+        if script == 'mobile: pressKey':
+            if options.get('keycode') == KEYCODE_PASTE:
+                device.type_text(device.clipboard)
+            return None
+        if script == 'mobile: shell':
+            if not self.relaxed_security:
+                raise WebDriverError('unknown error', "Potentially insecure feature 'adb_shell' has not been enabled")
+            arguments = options.get('args') or []
+            if options.get('command') == 'input' and arguments[:1] == ['text']:
+                # The device shell removes the quoting, then `input text` turns %s into spaces
+                device.type_text(' '.join(shlex.split(arguments[1])).replace('%s', ' '))
+                return ''
+            raise WebDriverError('invalid argument', f"Unsupported shell command: {options}")
+        raise WebDriverError('unsupported operation', f"'{script}' is not supported by the fake server ({options})")
+
+
+ROUTES = [
+    ('GET', r'/status', 'status'),
+    ('POST', r'/session', 'new_session'),
+    ('DELETE', r'/session/(?P<session_id>[^/]+)', 'delete_session'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/element', 'find_element'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/elements', 'find_elements'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/click', 'click'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/value', 'send_keys'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/clear', 'clear'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/text', 'element_text'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/displayed', 'element_displayed'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/enabled', 'element_enabled'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/selected', 'element_selected'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/name', 'element_name'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/rect', 'element_rect'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/element/(?P<element_id>[^/]+)/attribute/(?P<name>[^/]+)',
+     'element_attribute'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/source', 'page_source'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/screenshot', 'screenshot'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/actions', 'actions'),
+    ('DELETE', r'/session/(?P<session_id>[^/]+)/actions', 'release_actions'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/timeouts', 'timeouts'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/back', 'back'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/se/log', 'get_log'),
+    ('GET', r'/session/(?P<session_id>[^/]+)/window/rect', 'window_rect'),
+    ('POST', r'/session/(?P<session_id>[^/]+)/execute/sync', 'execute'),
+]
+COMPILED_ROUTES = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in ROUTES]
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like Appium, so client connection pooling behaves as it does against a real server.
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; with Nagle on, every reply would wait for a delayed ACK.
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            server._count_connection()
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+        def do_DELETE(self):
+            self._dispatch('DELETE')
+
+        def log_message(self, format, *args):
+            pass
+
+        def _dispatch(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            path = self.path.split('?')[0].rstrip('/')
+            if path.startswith('/wd/hub'):
+                path = path[len('/wd/hub'):]
+            try:
+                body = json.loads(raw) if raw else {}
+                for route_method, pattern, handler in COMPILED_ROUTES:
+                    match = pattern.match(path)
+                    if route_method != method or not match:
+                        continue
+                    params = match.groupdict()
+                    command = handler
+                    if handler in ('find_element', 'find_elements'):
+                        command = f"{handler}:{body.get('using', '').lstrip('-').split(' ')[-1]}"
+                    server._count(command)
+                    server._inject_fault(command)
+                    if handler == 'status':
+                        return self._reply(200, {'value': {'ready': True, 'message': 'Fake Appium server is ready'}})
+                    session_id = params.pop('session_id', None)
+                    if session_id is None:
+                        value = getattr(server, handler)(body)
+                    elif session_id not in server.sessions:
+                        raise WebDriverError('invalid session id', f"A session with id {session_id} does not exist")
+                    else:
+                        value = getattr(server, handler)(server.sessions[session_id], *params.values(), body)
+                    server._inject_fault(command, after=True)
+                    return self._reply(200, {'value': value})
+                raise WebDriverError('unknown command', f"{method} {path} is not implemented by the fake server")
+            except WebDriverError as e:
+                self._reply(ERROR_STATUS.get(e.error, 500), {'value': {'error': e.error, 'message': str(e), 'stacktrace': ''}})
+            except ValueError as e:
+                self._reply(400, {'value': {'error': 'invalid argument', 'message': str(e), 'stacktrace': ''}})
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+if __name__ == "__main__":
+    # Usage: python fake_appium_server.py [port] [--profile none|device]
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+    profile = sys.argv[sys.argv.index('--profile') + 1] if '--profile' in sys.argv[:-1] else 'none'
+    if profile in arguments:
+        arguments.remove(profile)
+    server = FakeAppiumServer(port=int(arguments[0]) if arguments else 4723, latency=LATENCY_PROFILES[profile])
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n📊 Commands served: {dict(server.command_counts)}")
+        server.stop()
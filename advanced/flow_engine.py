@@ -0,0 +1,366 @@
+import inspect
+import json
+import string
+import sys
+import time
+from contextlib import nullcontext
+from device_actions import DeviceActions
+import visual
+import wait_conditions
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FLOWS_DIR = os.path.join(BASE_DIR, "flows")
+
+# Condition specs usable in "wait_for" steps, e.g. {"element_present": ["id", "..."]}.
+CONDITION_FACTORIES = {
+    'activity_is': lambda value: wait_conditions.activity_is(value),
+    'element_present': lambda value: wait_conditions.element_present(tuple(value)),
+    'element_clickable': lambda value: wait_conditions.element_clickable(tuple(value)),
+    'element_absent': lambda value: wait_conditions.element_absent(tuple(value)),
+    'all_of': lambda value: wait_conditions.all_of(*(compile_condition(spec) for spec in value)),
+}
+
+# Switches an action can be run under with "when": it is skipped while the switch is off
+SWITCHES = {
+    'visual': lambda device_actions: bool(device_actions.visual_mode),
+}
+
+
+class FlowError(Exception):
+    """Raised when a flow definition is invalid."""
+
+
+def compile_condition(spec):
+    """Turns a condition spec like {"activity_is": "..."} into a ScreenCondition."""
+    if not isinstance(spec, dict) or len(spec) != 1:
+        raise FlowError(f"A condition must be a single-key object, got: {spec}")
+    (kind, value), = spec.items()
+    if kind not in CONDITION_FACTORIES:
+        raise FlowError(f"Unknown condition '{kind}'. Known: {', '.join(sorted(CONDITION_FACTORIES))}")
+    return CONDITION_FACTORIES[kind](value)
+
+
+def compile_regions(specs):
+    """
+    Turns region specs like {"name": "header", "reference": "header.png"} into visual.VisualRegion
+    objects; references are relative to this directory.
+    """
+    regions = []
+    for spec in specs:
+        if not isinstance(spec, dict) or 'name' not in spec or 'reference' not in spec:
+            raise FlowError(f"A region needs a 'name' and a 'reference' image, got: {spec}")
+        options = {key: value for key, value in spec.items() if key not in ('name', 'reference')}
+        if 'area' in options:
+            options['area'] = tuple(options['area'])
+        regions.append(visual.VisualRegion(spec['name'], os.path.join(BASE_DIR, spec['reference']), **options))
+    return regions
+
+
+# Arguments given as specs in the flow file and compiled once, when the flow is loaded
+ARG_FACTORIES = {
+    'condition': compile_condition,
+    'regions': compile_regions,
+}
+
+
+def template_fields(value):
+    """Returns the {placeholder} names used in a string, list or dict argument."""
+    if isinstance(value, str):
+        return {field for _, field, _, _ in string.Formatter().parse(value) if field}
+    if isinstance(value, list):
+        return set().union(*(template_fields(item) for item in value)) if value else set()
+    if isinstance(value, dict):
+        return set().union(*(template_fields(item) for item in value.values())) if value else set()
+    return set()
+
+
+def render(value, context):
+    """Fills {placeholders} in an argument from the run context."""
+    if isinstance(value, str):
+        return value.format_map(context) if '{' in value else value
+    if isinstance(value, list):
+        return [render(item, context) for item in value]
+    if isinstance(value, dict):
+        return {key: render(item, context) for key, item in value.items()}
+    return value
+
+
+class CompiledAction:
+    """
+    One DeviceActions call of a step: its arguments, the truth value it must return (expect), the
+    results that end the flow with a message (on) and the switch it only runs under (when).
+    """
+
+    def __init__(self, action, args, expect=None, on=None, when=None):
+        self.action = action
+        self.args = args
+        self.expect = expect
+        self.on = on or {}
+        self.when = when
+        self.is_templated = bool(template_fields(args))
+
+
+class CompiledStep:
+    """
+    One validated step, ready to run against a DeviceActions instance. screens, done and results
+    are what checkpoint.FlowStep needs to resume a flow at this step (see main.py).
+    """
+
+    def __init__(self, name, actions, screens=None, done=None, results=None):
+        self.name = name
+        self.actions = actions
+        self.screens = screens
+        self.done = done
+        self.results = list(results or [name])
+
+    def bind(self, context):
+        """Returns (action, kwargs) for each call of the step, with the placeholders filled."""
+        return [(action, render(action.args, context) if action.is_templated else action.args)
+                for action in self.actions]
+
+    def run(self, device_actions, context, calls=None):
+        """Runs the step's calls in order; a result that does not meet the action's checks raises."""
+        for action, kwargs in calls if calls is not None else self.bind(context):
+            if action.when is not None and not SWITCHES[action.when](device_actions):
+                continue
+            result = getattr(device_actions, action.action)(**kwargs)
+            if action.expect is not None and bool(result) != action.expect:
+                raise Exception(f"Step '{self.name}' returned {result!r}, expected {action.expect!r}")
+            if str(result) in action.on:
+                raise Exception(render(action.on[str(result)]['fail'], context))
+
+    def is_done(self, device_actions, context):
+        """Whether the step's done check already holds on the current screen (False without one)."""
+        if self.done is None:
+            return False
+        return device_actions.snapshot(refresh=True).evaluate(render(self.done, context))[0]
+
+
+class CompiledFlow:
+    """A loaded and validated flow: its inputs, derived variables and step plan."""
+
+    def __init__(self, name, inputs, variables, steps, capabilities):
+        self.name = name
+        self.inputs = inputs
+        self.variables = variables
+        self.steps = steps
+        self.capabilities = capabilities
+
+    def context(self, inputs):
+        """Returns the placeholder values for one run: the inputs and the variables derived from them."""
+        missing = [name for name in self.inputs if name not in inputs]
+        if missing:
+            raise FlowError(f"Flow '{self.name}' is missing inputs: {', '.join(missing)}")
+        context = dict(inputs)
+        context.update({name: template.format_map(inputs) for name, template in self.variables.items()})
+        return context
+
+
+class FlowEngine:
+    """
+    Loads flow definitions (JSON, or YAML when PyYAML is installed), validates every step against
+    the DeviceActions primitives, caches the compiled plan per file and runs it with per-step timing.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self.compile_times = {}
+
+    def load(self, path):
+        """Returns the compiled flow for a file, recompiling only when the file has changed."""
+        path = self.resolve_path(path)
+        modified = os.path.getmtime(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == modified:
+            return cached[1]
+        start = time.monotonic()
+        flow = self.compile(self._read(path), source=path)
+        self.compile_times[path] = time.monotonic() - start
+        self._cache[path] = (modified, flow)
+        print(f"📜 Compiled flow '{flow.name}' ({len(flow.steps)} steps) in "
+              f"{self.compile_times[path] * 1000:.1f} ms (from {CURRENT_FILE})")
+        return flow
+
+    @staticmethod
+    def resolve_path(path):
+        if os.path.exists(path):
+            return os.path.abspath(path)
+        for extension in ('', '.json', '.yaml', '.yml'):
+            candidate = os.path.join(FLOWS_DIR, path + extension)
+            if os.path.exists(candidate):
+                return candidate
+        raise FlowError(f"Flow file not found: {path}")
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise FlowError("PyYAML is required for YAML flows: pip install pyyaml")
+                return yaml.safe_load(f)
+            return json.load(f)
+
+    def compile(self, definition, source='<flow>'):
+        """
+        Validates a flow definition and returns its CompiledFlow. A step runs one action
+        ("action", "args", "expect") or several in order ("actions": a list of those, each with an
+        optional "on" and "when"), and may give the "screens" it starts on, a "done" snapshot check
+        (see UiSnapshot.evaluate) and the "results" it reports, for resuming.
+        """
+        if not isinstance(definition, dict) or not definition.get('steps'):
+            raise FlowError(f"{source}: a flow needs a non-empty 'steps' list")
+        inputs = list(definition.get('inputs', []))
+        variables = dict(definition.get('variables', {}))
+        known_names = set(inputs) | set(variables)
+        for variable, template in variables.items():
+            unknown = template_fields(template) - set(inputs)
+            if unknown:
+                raise FlowError(f"{source}: variable '{variable}' uses undeclared inputs {sorted(unknown)}")
+
+        steps = []
+        for index, step in enumerate(definition['steps'], start=1):
+            name = step.get('name') or f"Step {index}"
+            specs = step['actions'] if 'actions' in step else [step]
+            if not specs:
+                raise FlowError(f"{source}: step '{name}' has no actions")
+            actions = [self._compile_action(spec, f"{source}: step '{name}'", known_names) for spec in specs]
+            done = step.get('done')
+            if done is not None:
+                unknown = template_fields(done) - known_names
+                if unknown:
+                    raise FlowError(f"{source}: step '{name}' done check uses undefined placeholders {sorted(unknown)}")
+            steps.append(CompiledStep(name, actions, step.get('screens'), done, step.get('results')))
+
+        return CompiledFlow(
+            definition.get('name', os.path.splitext(os.path.basename(source))[0]),
+            inputs,
+            variables,
+            steps,
+            definition.get('capabilities', {}),
+        )
+
+    @staticmethod
+    def _compile_action(spec, where, known_names):
+        action = spec.get('action')
+        method = getattr(DeviceActions, action, None) if action else None
+        if action is None or action.startswith('_') or not callable(method):
+            raise FlowError(f"{where} has unknown action '{action}'")
+        args = dict(spec.get('args', {}))
+        unknown = template_fields(args) - known_names
+        if unknown:
+            raise FlowError(f"{where} uses undefined placeholders {sorted(unknown)}")
+        for arg, factory in ARG_FACTORIES.items():
+            if arg in args:
+                args[arg] = factory(args[arg])
+        try:
+            inspect.signature(method).bind(None, **args)
+        except TypeError as e:
+            raise FlowError(f"{where} has invalid args for {action}: {e}")
+        when = spec.get('when')
+        if when is not None and when not in SWITCHES:
+            raise FlowError(f"{where} has unknown switch '{when}'. Known: {', '.join(sorted(SWITCHES))}")
+        on = spec.get('on', {})
+        for result, branch in on.items():
+            if not isinstance(branch, dict) or set(branch) != {'fail'}:
+                raise FlowError(f"{where}: the '{result}' branch must only give a 'fail' message, got: {branch}")
+            unknown = template_fields(branch['fail']) - known_names
+            if unknown:
+                raise FlowError(f"{where}: the '{result}' branch uses undefined placeholders {sorted(unknown)}")
+        return CompiledAction(action, args, spec.get('expect'), on, when)
+
+    def run(self, flow, device_actions, inputs, action_results=None, instrumentation=None):
+        """
+        Runs a compiled flow. Records '✅ Success' per step result in action_results and returns the
+        per-step timings; the first failing step is recorded as '❌ Failure' and re-raised.
+        With instrumentation, each step is also written as a step record.
+        """
+        action_results = {} if action_results is None else action_results
+        context = flow.context(inputs)
+
+        timings = []
+        for step in flow.steps:
+            start = time.monotonic()
+            calls = step.bind(context)
+            action_start = time.monotonic()
+            try:
+                with instrumentation.step(step.name) if instrumentation else nullcontext():
+                    step.run(device_actions, context, calls)
+            except Exception:
+                action_results[step.name] = '❌ Failure'
+                timings.append(self._timing(step, start, action_start, False))
+                raise
+            for result in step.results:
+                action_results[result] = '✅ Success'
+            timings.append(self._timing(step, start, action_start, True))
+        return timings
+
+    @staticmethod
+    def _timing(step, start, action_start, succeeded):
+        end = time.monotonic()
+        timing = {
+            'step': step.name,
+            'action': ', '.join(action.action for action in step.actions),
+            'elapsed': end - start,
+            'overhead': action_start - start,
+            'succeeded': succeeded,
+        }
+        print(f"⏱️ {step.name}: {timing['elapsed'] * 1000:.0f} ms (from {CURRENT_FILE})")
+        return timing
+
+
+if __name__ == "__main__":
+    # Usage: python flow_engine.py <flow file or name> [phone]
+    from appium_manager import AppiumManager, SessionPool
+    from instrumentation import Instrumentation
+    from main import build_capabilities, close_phone_allocator, get_and_update_phone_number
+    from phone_allocator import TestIdentity
+
+    if len(sys.argv) < 2:
+        print("Usage: python flow_engine.py <flow file or name> [phone]")
+        sys.exit(2)
+    engine = FlowEngine()
+    flow = engine.load(sys.argv[1])
+    phone = sys.argv[2] if len(sys.argv) > 2 else get_and_update_phone_number()
+
+    appium_manager = AppiumManager()
+    session_pool = SessionPool(appium_manager.url)
+    instrumentation = Instrumentation(flow=flow.name)
+    device_actions = None
+    action_results = {}
+    error_message = None
+    timings = []
+    print(f"🛠️ Running flow '{flow.name}' from {CURRENT_FILE}")
+    try:
+        appium_manager.start_server()
+        capabilities = build_capabilities()
+        capabilities.update(flow.capabilities)
+        with instrumentation.step('Connection & App Launch'), instrumentation.session_setup(session_pool.appium_url):
+            device_actions = session_pool.acquire(capabilities)
+        action_results['Connection & App Launch'] = '✅ Success'
+        instrumentation.instrument(device_actions)
+        timings = engine.run(flow, device_actions, TestIdentity(phone).as_dict(), action_results, instrumentation)
+    except Exception as e:
+        error_message = str(e)
+        print(f"🛑 An error occurred: {error_message} (from {CURRENT_FILE})")
+    finally:
+        if device_actions and device_actions.driver:
+            session_pool.release(device_actions, keep=False)
+        appium_manager.stop_server()
+        close_phone_allocator()
+        instrumentation.write()
+
+        print("\n--- Flow Execution Summary ---")
+        for action, result in action_results.items():
+            print(f"{result} {action}")
+        total = sum(timing['elapsed'] for timing in timings)
+        overhead = sum(timing['overhead'] for timing in timings)
+        print(f"\n⏱️ {len(timings)} steps in {total:.2f}s (engine overhead {overhead * 1000:.1f} ms)")
+        if error_message:
+            print(f"\n🛑 Execution finished with an error: {error_message}")
+            sys.exit(1)
+        else:
+            print("\n🎉 Execution completed successfully, without errors.")
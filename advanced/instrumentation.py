@@ -0,0 +1,214 @@
+import csv
+import functools
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from transport import transport_stats
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+# Parallel runs append to the same report files.
+_write_lock = threading.Lock()
+CSV_FIELDS = ['run_id', 'timestamp', 'flow', 'device', 'kind', 'name', 'step', 'wall_ms', 'commands', 'strategy',
+              'extra_polls', 'succeeded', 'error']
+
+
+class Instrumentation:
+    """
+    Records wall time, Appium command count, locator strategy and extra wait polls (the polls
+    after each wait's first; retries are counted by the Retrier, see retry.py) for every
+    DeviceActions call and every flow step, and writes them as JSON Lines and CSV under reports/.
+    """
+
+    def __init__(self, run_id=None, output_dir=REPORTS_DIR, flow='enrollment', device=None):
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.output_dir = output_dir
+        self.flow = flow
+        self.device = device
+        self.records = []
+        self.command_count = 0
+        self._current_step = None
+        self._device_actions = None
+        # Call nesting and command counts are kept per thread, so when several threads share a session
+        # each call is only charged for the commands its own thread sent
+        self._local = threading.local()
+        self._count_lock = threading.Lock()
+
+    def instrument(self, device_actions):
+        """Wraps every public DeviceActions method on this instance with a timing recorder."""
+        self._device_actions = device_actions
+        for name in dir(type(device_actions)):
+            if name.startswith('_'):
+                continue
+            method = getattr(device_actions, name)
+            if callable(method) and not getattr(method, '_instrumented', False):
+                setattr(device_actions, name, self._wrap(name, method))
+        return device_actions
+
+    def _thread_commands(self):
+        return getattr(self._local, 'commands', 0)
+
+    def _hook_driver(self):
+        """
+        Counts every command the driver sends; re-hooks after a reconnect creates a new driver.
+        The hook is kept outermost, so commands other hooks (artifacts, trace recording) send on
+        their own while handling a command are not counted as the flow's.
+        """
+        driver = self._device_actions.driver if self._device_actions else None
+        if driver is None:
+            return
+        hooked = getattr(driver, '_instrumentation_execute', None)
+        if hooked is not None and driver.__dict__.get('execute') is hooked:
+            return
+        execute = driver.execute
+        local = self._local
+
+        def counted_execute(*args, **kwargs):
+            depth = getattr(local, 'executing', 0)
+            if not depth:
+                with self._count_lock:
+                    self.command_count += 1
+                local.commands = getattr(local, 'commands', 0) + 1
+            local.executing = depth + 1
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                local.executing = depth
+
+        driver.execute = counted_execute
+        driver._instrumentation_execute = counted_execute
+
+    def _wrap(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            depth = getattr(self._local, 'depth', 0)
+            if depth:
+                # Calls DeviceActions makes to itself are part of the outer call's record.
+                return method(*args, **kwargs)
+            self._hook_driver()
+            device_actions = self._device_actions
+            commands_before = self._thread_commands()
+            waits_before = len(device_actions.wait_log)
+            locator_calls_before = {site: stats['calls'] for site, stats in device_actions.locator_stats.items()}
+            start = time.perf_counter()
+            error = None
+            self._local.depth = depth + 1
+            try:
+                return method(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._local.depth = depth
+                wall = time.perf_counter() - start
+                self._hook_driver()
+                new_waits = device_actions.wait_log[waits_before:]
+                strategies = [
+                    stats['strategy'] for site, stats in device_actions.locator_stats.items()
+                    if stats['calls'] != locator_calls_before.get(site, 0)
+                ]
+                self._add('call', name, wall, self._thread_commands() - commands_before,
+                          strategy='+'.join(strategies),
+                          extra_polls=sum(max(entry['polls'] - 1, 0) for entry in new_waits),
+                          error=error)
+
+        wrapper._instrumented = True
+        return wrapper
+
+    @contextmanager
+    def step(self, name):
+        """Times one flow step, including every DeviceActions call made inside it."""
+        previous_step = self._current_step
+        self._current_step = name
+        commands_before = self.command_count
+        first_record = len(self.records)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            calls = [record for record in self.records[first_record:] if record['kind'] == 'call']
+            self._current_step = previous_step
+            self._add('step', name, wall, self.command_count - commands_before,
+                      strategy='+'.join(dict.fromkeys(record['strategy'] for record in calls if record['strategy'])),
+                      extra_polls=sum(record['extra_polls'] for record in calls),
+                      error=error,
+                      step=previous_step)
+
+    @contextmanager
+    def session_setup(self, appium_url):
+        """
+        Counts the commands of a session setup (new session, re-attach, app reset) from the server's
+        transport counters, since the driver that sends them is only hooked once it exists.
+        """
+        requests_before = transport_stats(appium_url)['requests']
+        commands_before = self.command_count
+        try:
+            yield
+        finally:
+            # Commands of an already hooked, reused driver were counted by the hook
+            unhooked = transport_stats(appium_url)['requests'] - requests_before - (self.command_count - commands_before)
+            with self._count_lock:
+                self.command_count += max(unhooked, 0)
+
+    def _add(self, kind, name, wall, commands, strategy='', extra_polls=0, error=None, step=None):
+        self.records.append({
+            'run_id': self.run_id,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'flow': self.flow,
+            'device': self.device,
+            'kind': kind,
+            'name': name,
+            'step': step if kind == 'step' else self._current_step,
+            'wall_ms': round(wall * 1000, 2),
+            'commands': commands,
+            'strategy': strategy,
+            'extra_polls': extra_polls,
+            'succeeded': error is None,
+            'error': f"{error.__class__.__name__}: {error}" if error else None,
+        })
+
+    def write(self):
+        """Appends this run's records to reports/runs.jsonl and reports/runs.csv."""
+        if not self.records:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        jsonl_path = os.path.join(self.output_dir, "runs.jsonl")
+        csv_path = os.path.join(self.output_dir, "runs.csv")
+        with _write_lock:
+            with open(jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record, ensure_ascii=False) + "\n" for record in self.records))
+            _retire_old_csv(csv_path)
+            write_header = not os.path.exists(csv_path)
+            with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+                if write_header:
+                    writer.writeheader()
+                writer.writerows(self.records)
+        print(f"📊 Wrote {len(self.records)} timing records for run {self.run_id} to {jsonl_path} (from {CURRENT_FILE})")
+        return jsonl_path
+
+    def step_summary(self):
+        """Returns (step name, wall ms, commands) for the steps of this run, in order."""
+        return [(record['name'], record['wall_ms'], record['commands'])
+                for record in self.records if record['kind'] == 'step']
+
+
+def _retire_old_csv(path):
+    """Moves aside a runs.csv written with other columns, so new rows never land under the wrong header."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f), None)
+    if header and header != CSV_FIELDS:
+        retired = f"{path[:-len('.csv')]}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv"
+        os.replace(path, retired)
+        print(f"📊 {os.path.basename(path)} had other columns; moved it to {retired} (from {CURRENT_FILE})")
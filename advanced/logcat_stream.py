@@ -0,0 +1,192 @@
+import re
+import subprocess
+import threading
+import time
+from collections import deque
+from selenium.webdriver.remote.command import Command
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+APP_PACKAGE = 'com.appcard.androidterminal'
+LINE_CAPACITY = 2000
+EVENT_CAPACITY = 500
+
+# Log lines that mean the terminal just did something a wait may be waiting for
+DEFAULT_PATTERNS = {
+    # The terminal's NTR messages (see mids.txt and ntr_log.py), e.g. the D response to a phone lookup
+    'ntr_message': r'Msg (?P<direction>Req|Resp)\s*:\s*\d+\s+\d+\s+(?P<txn>\d+)\s+(?P<type>[A-Z])\b(?P<body>.*)$',
+    # An activity of the app finished drawing
+    'activity_displayed': r'Displayed (?P<component>' + re.escape(APP_PACKAGE) + r'/\S+?):? ',
+    # A fragment (one terminal screen) became the resumed one
+    'screen_transition': r'FragmentManager: moveto RESUMED: (?P<fragment>\w+)',
+    'app_died': r'Process ' + re.escape(APP_PACKAGE) + r' \(pid \d+\) has died',
+}
+
+
+class LogEvent:
+    """One log line that matched a registered pattern."""
+
+    __slots__ = ('seq', 'name', 'line', 'groups', 'received')
+
+    def __init__(self, seq, name, line, groups, received):
+        self.seq = seq
+        self.name = name
+        self.line = line
+        self.groups = groups
+        self.received = received
+
+    def __repr__(self):
+        return f"LogEvent({self.name} #{self.seq} {self.groups})"
+
+
+class AdbLogcatSource:
+    """Streams `adb logcat` of one device, starting at the newest line."""
+
+    def __init__(self, udid=None):
+        self.udid = udid
+        self._process = None
+
+    def lines(self):
+        command = ['adb'] + (['-s', self.udid] if self.udid else []) + ['logcat', '-v', 'threadtime', '-T', '1']
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         text=True, encoding='utf-8', errors='replace', bufsize=1)
+        for line in self._process.stdout:
+            yield line.rstrip('\n')
+
+    def close(self):
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+
+
+class AppiumLogcatSource:
+    """
+    Reads the session's 'logcat' log through the Appium server, for when adb is not reachable from
+    this host. The requests go through driver.execute, so Instrumentation and ArtifactRecorder count
+    them like any other command. The pause between reads starts at interval seconds and grows up to
+    max_interval while no lines arrive; a read that returns lines brings it back to interval.
+    """
+
+    def __init__(self, driver, interval=0.1, max_interval=1.0):
+        self.driver = driver
+        self.interval = interval
+        self.max_interval = max_interval
+        self.stats = {'polls': 0, 'lines': 0}
+        self._closed = threading.Event()
+
+    def lines(self):
+        interval = self.interval
+        while not self._closed.is_set():
+            entries = self.driver.execute(Command.GET_LOG, {'type': 'logcat'})['value'] or []
+            self.stats['polls'] += 1
+            self.stats['lines'] += len(entries)
+            for entry in entries:
+                yield entry.get('message', '')
+            interval = self.interval if entries else min(interval * 1.5, self.max_interval)
+            self._closed.wait(interval)
+
+    def close(self):
+        self._closed.set()
+
+
+class LogcatStream:
+    """
+    Reads device log lines on a background thread and matches them against registered patterns,
+    compiled once. Matches become LogEvents that waiting threads are woken for the moment they
+    arrive. The most recent lines are kept for failure artifacts, since reading the device's
+    logcat through Appium drains it.
+    """
+
+    def __init__(self, source, patterns=None, line_capacity=LINE_CAPACITY, event_capacity=EVENT_CAPACITY):
+        self.source = source
+        self.patterns = {}
+        self.lines = deque(maxlen=line_capacity)
+        self.events = deque(maxlen=event_capacity)
+        self.stats = {'lines': 0, 'events': 0}
+        self.error = None
+        self._stopped = False
+        self._seq = 0
+        self._changed = threading.Condition()
+        self._thread = None
+        for name, pattern in (DEFAULT_PATTERNS if patterns is None else patterns).items():
+            self.register(name, pattern)
+
+    def register(self, name, pattern):
+        """Adds a named pattern; lines are searched, so it may match anywhere in the line."""
+        self.patterns[name] = re.compile(pattern)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._read, name='logcat-stream', daemon=True)
+        self._thread.start()
+        print(f"📜 Streaming logcat with {len(self.patterns)} patterns (from {CURRENT_FILE})")
+        return self
+
+    @property
+    def alive(self):
+        """False once the reader thread has ended; waits then poll on a timer instead (see DeviceActions.wait_for)."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stopped = True
+        self.source.close()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _read(self):
+        try:
+            for line in self.source.lines():
+                self._feed(line)
+        except Exception as e:
+            self.error = e
+        finally:
+            if not self._stopped:
+                reason = f"{self.error.__class__.__name__}: {self.error}" if self.error else "the log source ended"
+                print(f"⚠️ Logcat stream stopped ({reason}); waits poll on a timer from now on (from {CURRENT_FILE})")
+            with self._changed:
+                self._changed.notify_all()
+
+    def _feed(self, line):
+        received = time.time()
+        matched = [(name, match) for name, pattern in self.patterns.items()
+                   for match in (pattern.search(line),) if match]
+        with self._changed:
+            self.stats['lines'] += 1
+            self.lines.append((received, line))
+            for name, match in matched:
+                self._seq += 1
+                self.stats['events'] += 1
+                self.events.append(LogEvent(self._seq, name, line, match.groupdict(), received))
+            if matched:
+                self._changed.notify_all()
+
+    def mark(self):
+        """The sequence number of the newest event; wait(since=mark) only sees events after it."""
+        with self._changed:
+            return self._seq
+
+    def wait(self, names=None, since=None, predicate=None, timeout=10):
+        """
+        Blocks until an event after since (default: now) whose name is in names (default: any)
+        and that passes predicate arrives, and returns it; returns None on timeout. Once the stream
+        has stopped, only buffered events can match, so the rest of the timeout is slept out.
+        """
+        names = {names} if isinstance(names, str) else set(names) if names else None
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            since = self._seq if since is None else since
+            while True:
+                for event in self.events:
+                    if event.seq <= since:
+                        continue
+                    if (names is None or event.name in names) and (predicate is None or predicate(event)):
+                        return event
+                since = self._seq
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._changed.wait(remaining)
+
+    def recent_lines(self, since=None):
+        """The buffered (timestamp, line) pairs received at or after since (epoch seconds)."""
+        with self._changed:
+            return [(received, line) for received, line in self.lines if since is None or received >= since]
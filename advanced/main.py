@@ -1,182 +1,362 @@
-import time
 from appium.webdriver.common.appiumby import AppiumBy
-from appium_manager import AppiumManager
-from device_actions import DeviceActions
+from appium_manager import AppiumManager, SessionPool
+from artifacts import ArtifactRecorder
+from checkpoint import Checkpoint, FlowStep, ResumeError, resume_index
+from flow_engine import FlowEngine
+from instrumentation import Instrumentation
+from logcat_stream import AdbLogcatSource, AppiumLogcatSource, LogcatStream
+from ntr_log import NtrLogCursor
+from selenium.common.exceptions import TimeoutException
+from wait_conditions import ScreenCondition, activity_is, all_of, element_present
+from phone_allocator import PhoneAllocator, TestIdentity
+from retry import FlakeDB
+from trace_recorder import TraceRecorder, TraceReplayer, load_trace, trace_path
+import visual
 import os
+import sys
+import threading
+from contextlib import ExitStack, contextmanager
 
 CURRENT_FILE = os.path.basename(__file__)
-PHONE_NUMBER_FILE = "last_phone.txt"
-INITIAL_PHONE_NUMBER = 4066720000
+DEFAULT_DEVICE_NAME = 'CAA25040001'
+NTR_RESPONSE_LIMIT_MS = 5000
+HEADER_ID = "com.appcard.androidterminal:id/activity_main_header"
+PHONE_NUMBER_FIELD_ID = "com.appcard.androidterminal:id/view_welcome_phone_number_empty"
+TERMS_ID = "com.appcard.androidterminal:id/tv_terms"
+PRIVACY_ID = "com.appcard.androidterminal:id/tv_privacy_policy"
+EMAIL_XPATH = '//android.widget.EditText[@text="Enter E-mail Address"]'
+EMAIL_CONFIRM_ID = "com.appcard.androidterminal:id/view_email_confirm"
+FIRST_NAME_XPATH = '//android.widget.EditText[@text="First name"]'
+LAST_NAME_XPATH = '//android.widget.EditText[@text="Last name"]'
+NAME_CONFIRM_ID = "com.appcard.androidterminal:id/tvConfirm"
+# In-session resumes per run, and how long to wait for a recognizable screen before resuming
+RESUME_ATTEMPTS = 2
+RESUME_SCREEN_TIMEOUT = 5
+
+# The header is also checked against its reference image with --visual (NumPy and Pillow needed).
+# This and WELCOME_CHECKS mirror flows/enrollment.json for the async runner and the benchmarks.
+HEADER_REGION = visual.VisualRegion('header', visual.HEADER_IMAGE)
+VISUAL_CHECKS = {'Header Visual Validation': HEADER_REGION}
+
+# Steps 3-6: welcome screen checks, keyed by the name each is reported under
+WELCOME_CHECKS = {
+    'First screen validation (Esp text)': ('text_present', "Esp"),
+    'Header ID Validation': ('element_present', HEADER_ID),
+    'Phone Number Field Validation': ('element_text', PHONE_NUMBER_FIELD_ID, "Enter your mobile #"),
+    'Terms Link Validation': ('element_clickable', TERMS_ID),
+    'Privacy Link Validation': ('element_clickable', PRIVACY_ID),
+}
+
+_phone_allocator = None
+_phone_allocator_lock = threading.Lock()
+
+def get_phone_allocator():
+    """Returns the process-wide PhoneAllocator, creating it on first use."""
+    global _phone_allocator
+    with _phone_allocator_lock:
+        if _phone_allocator is None:
+            _phone_allocator = PhoneAllocator()
+        return _phone_allocator
 
 def get_and_update_phone_number():
     """
-    Reads the last phone number from a file, increments it by 1,
-    and saves the new number back to the file.
-    Returns the new phone number as a string.
+    Returns the next unused phone number as a string.
+    Numbers come from the shared PhoneAllocator, so parallel runs never get the same one.
     """
-    phone_number = 0
-    # Check if the file exists
-    if os.path.exists(PHONE_NUMBER_FILE):
-        with open(PHONE_NUMBER_FILE, 'r') as f:
+    return get_phone_allocator().allocate()
+
+def close_phone_allocator():
+    """Returns the unused part of this process's number block to the allocator."""
+    if _phone_allocator is not None:
+        _phone_allocator.close()
+
+def build_capabilities(device_name=DEFAULT_DEVICE_NAME, udid=None, system_port=None):
+    """Returns the UiAutomator2 capabilities for the appcard terminal app on one device."""
+    capabilities = {
+        'platformName': 'Android',
+        'automationName': 'UiAutomator2',
+        'deviceName': device_name,
+        'appPackage': 'com.appcard.androidterminal',
+        'appActivity': 'com.appcard.androidterminal.ui.MainActivity',
+        'appWaitActivity': 'com.appcard.androidterminal.ui.MainActivity',
+        'noReset': False,
+        'fullReset': False,
+        'uiautomator2ServerInstallTimeout': 60000
+    }
+    # Each device driven in parallel needs its own udid and UiAutomator2 server port
+    if udid:
+        capabilities['udid'] = udid
+    if system_port:
+        capabilities['systemPort'] = system_port
+    return capabilities
+
+def app_loaded(capabilities):
+    """The condition the App Load step waits for: the main activity showing its header."""
+    return all_of(activity_is(capabilities['appWaitActivity']), element_present((AppiumBy.ID, HEADER_ID)))
+
+def _flow_step(compiled_step):
+    """Wraps a step of flows/enrollment.json as a resumable FlowStep run with the identity's values."""
+    def run(device_actions, capabilities, identity):
+        compiled_step.run(device_actions, ENROLLMENT_FLOW.context(identity.as_dict()))
+
+    def done(device_actions, data):
+        return compiled_step.is_done(device_actions, ENROLLMENT_FLOW.context(TestIdentity(data['phone']).as_dict()))
+
+    return FlowStep(compiled_step.name, run, screens=compiled_step.screens,
+                    done=done if compiled_step.done is not None else None, results=compiled_step.results)
+
+# The enrollment flow (steps 3-11) is defined in flows/enrollment.json; each step also gives the screens
+# it starts on, for resuming (see checkpoint.py)
+ENROLLMENT_FLOW = FlowEngine().load('enrollment')
+ENROLLMENT_STEPS = [_flow_step(compiled_step) for compiled_step in ENROLLMENT_FLOW.steps]
+
+def run_enrollment_flow(device_actions, capabilities, action_results, phone_number_provider=get_and_update_phone_number,
+                        instrumentation=None, artifacts=None, checkpoint=None, resume_attempts=RESUME_ATTEMPTS,
+                        trace=None):
+    """
+    Runs the enrollment flow (steps 3-11) on a connected device and returns the identity enrolled.
+    Each completed step is recorded in action_results and in the checkpoint: without one, progress
+    is only kept in memory; a given checkpoint (see --resume) is saved for a later process and its
+    lock released when the flow ends. When a step fails, the current screen is classified and the
+    flow resumes in the same session from the last good step, up to resume_attempts times; otherwise the failure raises.
+    A checkpoint that already has completed steps (see --resume) is resumed the same way.
+    When instrumentation is given, every step is timed as one record; when artifacts (an
+    ArtifactRecorder) is given, a failing step saves a screenshot, page source and logcat; when
+    trace (a TraceRecorder) is given, the device commands of every step are recorded for replay.
+    """
+    @contextmanager
+    def step(name):
+        with ExitStack() as stack:
+            if instrumentation:
+                stack.enter_context(instrumentation.step(name))
+            if artifacts:
+                stack.enter_context(artifacts.step(name))
+            if trace:
+                stack.enter_context(trace.step(name))
+            yield
+
+    checkpoint = checkpoint or Checkpoint(SessionPool.device_key(capabilities), directory=None)
+    if 'phone' not in checkpoint.data:
+        checkpoint.data['phone'] = str(phone_number_provider())
+        checkpoint.session_id = device_actions.driver.session_id
+        checkpoint.save()
+    identity = TestIdentity(checkpoint.data['phone'])
+    if artifacts:
+        artifacts.note(phone=identity.phone)
+
+    try:
+        start = resume_enrollment(device_actions, checkpoint, action_results) if checkpoint.completed else 0
+        while True:
             try:
-                phone_number = int(f.read().strip())
-                print(f"Reading last phone number from file: {phone_number}")
-            except (ValueError, FileNotFoundError):
-                print("Error reading phone number from file. Using initial number.")
-                phone_number = INITIAL_PHONE_NUMBER
+                for flow_step in ENROLLMENT_STEPS[start:]:
+                    with step(flow_step.name):
+                        flow_step.run(device_actions, capabilities, identity)
+                    for result in flow_step.results:
+                        action_results[result] = '✅ Success'
+                    checkpoint.complete(flow_step.name)
+                break
+            except Exception as e:
+                if resume_attempts <= 0:
+                    raise
+                resume_attempts -= 1
+                print(f"⚠️ Step failed: {e} (from {CURRENT_FILE})")
+                try:
+                    start = resume_enrollment(device_actions, checkpoint, action_results)
+                except ResumeError as resume_error:
+                    print(f"🛑 {resume_error} (from {CURRENT_FILE})")
+                    raise e
+        checkpoint.clear()
+    finally:
+        # A failed run keeps its saved progress for --resume, without holding the lock
+        checkpoint.release()
+
+    print(f"🎉 Enrollment flow completed successfully. (from {CURRENT_FILE})")
+    return identity
+
+def replay_enrollment(device_actions, capabilities, trace, action_results,
+                      phone_number_provider=get_and_update_phone_number, instrumentation=None, artifacts=None):
+    """
+    Enrolls a new number by replaying a recorded enrollment (see trace_recorder.py and --record)
+    instead of locating every element again. When a checkpoint does not match, the regular steps
+    take over from that step, resuming from the screen the device is on. Returns the identity enrolled.
+    """
+    identity = TestIdentity(phone_number_provider())
+    if artifacts:
+        artifacts.note(phone=identity.phone)
+
+    def fallback(step, completed):
+        checkpoint = Checkpoint(SessionPool.device_key(capabilities), directory=None)
+        checkpoint.data['phone'] = identity.phone
+        checkpoint.completed = list(completed)
+        run_enrollment_flow(device_actions, capabilities, action_results, instrumentation=instrumentation,
+                            artifacts=artifacts, checkpoint=checkpoint)
+
+    with ExitStack() as stack:
+        if instrumentation:
+            stack.enter_context(instrumentation.step('Replay'))
+        if artifacts:
+            stack.enter_context(artifacts.step('Replay'))
+        TraceReplayer(device_actions).replay(trace, identity.as_dict(), action_results, fallback)
+    return identity
+
+def resume_enrollment(device_actions, checkpoint, action_results):
+    """Classifies the current screen and returns the index of the enrollment step to resume from."""
+    def recognized(driver):
+        return device_actions.current_screen() or False
+
+    try:
+        screen = device_actions.wait_for(ScreenCondition("a recognized screen", recognized), timeout=RESUME_SCREEN_TIMEOUT)
+    except TimeoutException:
+        screen = None
+    start = resume_index(ENROLLMENT_STEPS, checkpoint, screen, device_actions, end_screen='featured_clip')
+    name = ENROLLMENT_STEPS[start].name if start < len(ENROLLMENT_STEPS) else 'the end'
+    print(f"♻️ Resuming {checkpoint.data['phone']} at {name} from the {screen} screen (from {CURRENT_FILE})")
+    action_results[f"Resumed at {name}"] = '✅ Success'
+    return start
+
+def option_value(name, default=None):
+    """Returns the value following a command line option such as --ntr-log PATH."""
+    if name in sys.argv[:-1]:
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
+def print_summary(action_results, device_actions=None, error_message=None, instrumentation=None):
+    """Prints the per-step results and the step, wait and locator timings."""
+    print("\n--- Script Execution Summary ---")
+    for action, result in action_results.items():
+        print(f"{result} {action}")
+    if instrumentation:
+        print()
+        for name, wall_ms, commands in instrumentation.step_summary():
+            print(f"⏱️ {name}: {wall_ms:.0f} ms, {commands} Appium commands")
+    if device_actions:
+        wait_summary = device_actions.wait_summary()
+        print(f"\n⏱️ {wait_summary['waits']} waits took {wait_summary['waited']:.1f}s "
+              f"instead of {wait_summary['replaced_sleep']:.1f}s of fixed sleeps (saved {wait_summary['saved']:.1f}s)")
+        for call_site, stats in device_actions.locator_stats.items():
+            print(f"🔎 {call_site}: {stats['strategy']} ({stats['elapsed'] * 1000:.0f} ms)")
+        cache = device_actions.element_cache.stats
+        print(f"🧠 Element cache: {cache['hits']} hits, {cache['misses']} misses "
+              f"({device_actions.element_cache.hit_rate():.0%}), {cache['property_hits']} property reads saved, "
+              f"{cache['stale_recoveries']} stale recoveries")
+        if device_actions.visual_log:
+            visual_ms = sum(entry['elapsed_ms'] for entry in device_actions.visual_log)
+            print(f"🖼️ {len(device_actions.visual_log)} screenshots compared against reference images in {visual_ms:.0f} ms")
+        for warning in device_actions.visual_warnings:
+            print(f"⚠️ Visual mismatch (warning only, see --visual-strict): {warning}")
+        for field, entry in device_actions.text_input.summary().items():
+            print(f"⌨️ {field}: {entry['method']} ({entry['elapsed_ms']:.0f} ms)")
+        if device_actions.log_stream:
+            stream = device_actions.log_stream
+            woken = sum(entry.get('woken', 0) for entry in device_actions.wait_log)
+            print(f"📜 Logcat: {stream.stats['lines']} lines, {stream.stats['events']} events, "
+                  f"{woken} waits woken by log events")
+        retries = device_actions.retrier.summary()
+        print(f"🔁 {retries['retries']} retries over {retries['calls']} retryable calls: "
+              f"{retries['recovered']} recovered, {retries['failed']} failed")
+        transport = device_actions.transport_stats()
+        print(f"🌐 {transport['requests']} requests, {transport['bytes_sent'] / 1024:.1f} KB sent, "
+              f"{transport['bytes_received'] / 1024:.1f} KB received over {transport['connections']} connections "
+              f"({transport['reconnects']} reconnects)")
+    if error_message:
+        print(f"\n🛑 Execution finished with an error: {error_message}")
     else:
-        print("Phone number file not found. Using initial number.")
-        phone_number = INITIAL_PHONE_NUMBER
-    
-    # Increment the phone number
-    new_phone_number = phone_number + 1
-    
-    # Save the new phone number to the file
-    with open(PHONE_NUMBER_FILE, 'w') as f:
-        f.write(str(new_phone_number))
-        
-    return str(new_phone_number)
+        print("\n🎉 Execution completed successfully, without errors.")
 
 if __name__ == "__main__":
-    appium_manager = AppiumManager()
-    device_actions = DeviceActions()
+    # --reuse keeps the Appium server and the device session alive for the next run
+    reuse = '--reuse' in sys.argv
+    # --ntr-log PATH checks the terminal message log for the enrollment's D response
+    ntr_log_path = option_value('--ntr-log')
+    # --logcat adb|appium wakes waits on app log events, read over adb or through the Appium session
+    logcat_source = option_value('--logcat')
+    # --record saves the run's device commands as a trace; --replay enrolls a new number from it (--trace PATH)
+    record = '--record' in sys.argv
+    replay = '--replay' in sys.argv
+    trace_file = option_value('--trace', trace_path('enrollment'))
+    # --visual checks the header against header.png and warns on a mismatch; --visual-strict fails the run instead
+    visual_mode = 'strict' if '--visual-strict' in sys.argv else 'warn' if '--visual' in sys.argv else None
+    if visual_mode and not visual.available():
+        print(f"⚠️ --visual needs NumPy and Pillow (pip install numpy pillow); skipping visual checks (from {CURRENT_FILE})")
+        visual_mode = None
+    # --resume saves the run's progress to a checkpoint and continues the last failed --resume run on this
+    # device (with --reuse, in its session) from its checkpoint
+    resume = '--resume' in sys.argv
+    appium_manager = AppiumManager(keep_alive=reuse)
+    session_pool = SessionPool(appium_manager.url)
+    instrumentation = Instrumentation(device=DEFAULT_DEVICE_NAME)
+    artifacts = ArtifactRecorder(run_id=instrumentation.run_id)
+    artifacts.note(device=DEFAULT_DEVICE_NAME)
+    device_actions = None
+    checkpoint = None
     action_results = {}
     error_message = None
 
     print(f"🛠️ Starting automation process from {CURRENT_FILE}")
 
     try:
-        # Step 1: Start Appium Server
+        # Step 1: Start Appium Server (or attach to a running one)
         appium_manager.start_server()
 
         # Step 2: Define Capabilities and Connect
-        capabilities = {
-            'platformName': 'Android',
-            'automationName': 'UiAutomator2',
-            'deviceName': 'CAA25040001',
-            'appPackage': 'com.appcard.androidterminal',
-            'appActivity': 'com.appcard.androidterminal.ui.MainActivity',
-            'appWaitActivity': 'com.appcard.androidterminal.ui.MainActivity',
-            'noReset': False,
-            'fullReset': False,
-            'uiautomator2ServerInstallTimeout': 60000
-        }
-        device_actions.connect(capabilities)
+        capabilities = build_capabilities()
+        checkpoint = Checkpoint.load(SessionPool.device_key(capabilities)) if resume else None
+        if checkpoint and checkpoint.completed:
+            print(f"♻️ Resuming {checkpoint.data.get('phone')} after '{checkpoint.last_completed}' (from {CURRENT_FILE})")
+        with instrumentation.step('Connection & App Launch'), instrumentation.session_setup(session_pool.appium_url):
+            device_actions = session_pool.acquire(capabilities, reset=not (checkpoint and checkpoint.completed))
         action_results['Connection & App Launch'] = '✅ Success'
 
-        print(f"⏳ Waiting for 20 seconds for the app to load... (from {CURRENT_FILE})")
-        time.sleep(20)
-
-        # Step 3: Sanity Check - Verify 'Esp' text
-        if not device_actions.is_text_present("Esp"):
-            raise Exception("Validation Failed: 'Esp' text is not displayed.")
-        action_results['First screen validation (Esp text)'] = '✅ Success'
-
-        # Step 4: Validate the main header element by resource ID
-        print(f"\n✨ Step 4: Validating the main header element by resource ID...")
-        header_id = "com.appcard.androidterminal:id/activity_main_header"
-        device_actions.validate_element_by_id(header_id)
-        action_results['Header ID Validation'] = '✅ Success'
-        
-        # Step 5: Validate the phone number input field's ID and text
-        print(f"\n📝 Step 5: Validating the phone number input field...")
-        phone_number_field_id = "com.appcard.androidterminal:id/view_welcome_phone_number_empty"
-        expected_text = "Enter your mobile #"
-        device_actions.validate_element_id_and_text(phone_number_field_id, expected_text)
-        action_results['Phone Number Field Validation'] = '✅ Success'
-
-        # Step 6: Validate Terms and Privacy Policy links
-        print(f"\n🔗 Step 6: Validating 'Terms of Service' and 'Privacy Policy' links...")
-        
-        # Validate Terms of Service link
-        terms_id = "com.appcard.androidterminal:id/tv_terms"
-        device_actions.validate_element_and_clickable(terms_id)
-        action_results['Terms Link Validation'] = '✅ Success'
-        
-        # Validate Privacy Policy link
-        privacy_id = "com.appcard.androidterminal:id/tv_privacy_policy"
-        device_actions.validate_element_and_clickable(privacy_id)
-        action_results['Privacy Link Validation'] = '✅ Success'
-
-        # Step 7: Enter phone number from file
-        test_phone_number = get_and_update_phone_number()
-        print(f"\n📱 Step 7: Entering phone number: {test_phone_number}")
-        device_actions.enter_phone_number(test_phone_number)
-        action_results['Enter Phone Number'] = '✅ Success'
-
-        # Step 8: Click 'OK' button
-        device_actions.click_button_by_text('OK')
-        action_results['Click OK Button'] = '✅ Success'
-        
-        # Step 9: Wait and click 'Confirm' button
-        print(f"\n⏳ Step 9: Waiting for 'Confirm' button...")
-        device_actions.click_by_id_or_text(text="Confirm")
-        action_results['Click Confirm Button'] = '✅ Success'
-        
-        # Step 10: Wait, enter email, and click confirm
-        print(f"\n⏳ Step 10: Waiting for the email screen...")
-        
-        # Enter the generated email address
-        email_xpath = '//android.widget.EditText[@text="Enter E-mail Address"]'
-        generated_email = f"orena+{test_phone_number}@appcard.com"
-        device_actions.enter_text_by_xpath(email_xpath, generated_email)
-        action_results['Enter Email Address'] = '✅ Success'
-
-        # Wait 2 seconds
-        print(f"⏳ Waiting 2 seconds after entering email...")
-        time.sleep(2)
-        
-        # Click the confirm button for the email field
-        confirm_email_button_id = "com.appcard.androidterminal:id/view_email_confirm"
-        device_actions.click_by_id_or_text(resource_id=confirm_email_button_id)
-        action_results['Click Email Confirm Button'] = '✅ Success'
-        
-        # Wait 3 seconds
-        print(f"⏳ Waiting 3 seconds after clicking confirm...")
-        time.sleep(3)
-        
-        # Step 11: Enter name and click confirm
-        print(f"\n⏳ Step 11: Waiting for the name screen...")
-        
-        # Enter first name with dynamic phone number
-        first_name_xpath = '//android.widget.EditText[@text="First name"]'
-        first_name_text = f"ORENTHEKING{test_phone_number}"
-        device_actions.enter_text_by_xpath(first_name_xpath, first_name_text)
-        action_results['Enter First Name'] = '✅ Success'
-
-        # Enter last name with dynamic phone number
-        last_name_xpath = '//android.widget.EditText[@text="Last name"]'
-        last_name_text = f"LAST{test_phone_number}"
-        device_actions.enter_text_by_xpath(last_name_xpath, last_name_text)
-        action_results['Enter Last Name'] = '✅ Success'
-        
-        # Click the confirm button on the name screen
-        name_confirm_button_id = "com.appcard.androidterminal:id/tvConfirm"
-        device_actions.click_by_id_or_text(resource_id=name_confirm_button_id)
-        action_results['Click Name Confirm Button'] = '✅ Success'
-
-        # Wait 3 seconds after clicking confirm
-        print(f"⏳ Waiting 3 seconds after clicking name confirm...")
-        time.sleep(3)
-        
-        print(f"🎉 Script completed successfully. (from {CURRENT_FILE})")
+        instrumentation.instrument(device_actions)
+        artifacts.attach(device_actions)
+        device_actions.visual_mode = visual_mode
+        device_actions.retrier.flake_db = FlakeDB()
+        device_actions.retrier.run_id = instrumentation.run_id
+        if logcat_source:
+            source = AdbLogcatSource(capabilities.get('udid') or capabilities.get('deviceName')) \
+                if logcat_source == 'adb' else AppiumLogcatSource(device_actions.driver)
+            device_actions.attach_log_stream(LogcatStream(source).start())
+        ntr_log_cursor = NtrLogCursor(ntr_log_path) if ntr_log_path else None
+        if replay:
+            identity = replay_enrollment(device_actions, capabilities, load_trace(trace_file), action_results,
+                                         instrumentation=instrumentation, artifacts=artifacts)
+        else:
+            recorder = TraceRecorder(device_actions).attach() if record else None
+            identity = run_enrollment_flow(device_actions, capabilities, action_results, instrumentation=instrumentation,
+                                           artifacts=artifacts, checkpoint=checkpoint, trace=recorder)
+            if recorder:
+                recorder.save(identity.as_dict(), trace_file)
+
+        if ntr_log_cursor:
+            with instrumentation.step('Terminal D Response'):
+                exchange = ntr_log_cursor.wait_for_response(identity.phone, 'D', within_ms=NTR_RESPONSE_LIMIT_MS)
+            action_results['Terminal D Response'] = f"✅ Success ({exchange.latency_ms or 0:.0f} ms round trip)"
+        elif device_actions.log_stream:
+            # The D response was logged while the flow ran; search the buffered events as well
+            with instrumentation.step('Terminal D Response'):
+                device_actions.wait_for_log(
+                    'ntr_message', since=0, timeout=NTR_RESPONSE_LIMIT_MS / 1000,
+                    predicate=lambda event: event.groups['type'] == 'D' and identity.phone in event.groups['body'])
+            action_results['Terminal D Response'] = '✅ Success (from logcat)'
 
     except Exception as e:
         error_message = str(e)
         print(f"🛑 An error occurred: {error_message} (from {CURRENT_FILE})")
         action_results['Final Status'] = '❌ Failure'
     finally:
-        # Final cleanup
-        if 'device_actions' in locals() and device_actions.driver:
-            device_actions.quit()
-        if 'appium_manager' in locals():
-            appium_manager.stop_server()
-
-        # Print summary
-        print("\n--- Script Execution Summary ---")
-        for action, result in action_results.items():
-            print(f"{result} {action}")
-        if error_message:
-            print(f"\n🛑 Execution finished with an error: {error_message}")
-        else:
-            print("\n🎉 Execution completed successfully, without errors.")
+        # Final cleanup; failure captures were already fetched, only their writing may be pending
+        if checkpoint:
+            checkpoint.release()
+        if device_actions and device_actions.log_stream:
+            device_actions.log_stream.stop()
+        if device_actions and device_actions.driver:
+            session_pool.release(device_actions, keep=reuse)
+        appium_manager.stop_server()
+        close_phone_allocator()
+        artifacts.close()
+
+        # Print summary and save the timings for report.py and the retry counts for retry.py
+        print_summary(action_results, device_actions, error_message, instrumentation)
+        instrumentation.write()
+        if device_actions:
+            device_actions.retrier.flush()
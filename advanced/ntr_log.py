@@ -0,0 +1,275 @@
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+from stats import percentile
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+
+# 2025-08-28 11:38:19.931   INFO  c.s.e.m.util.MessagesHelper:49   Msg Resp : 54  1 7645 D 1   \ 40001504922? \ 0 \ ...
+MESSAGE_PATTERN = re.compile(
+    r'^(?P<timestamp>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3})\s+(?P<level>\w+)\s+(?P<source>\S+)\s+'
+    r'Msg (?P<direction>Req|Resp)\s*:\s*(?P<length>\d+)\s+(?P<terminal>\d+)\s+(?P<txn>\d+)\s+'
+    r'(?P<type>[A-Z])\b(?P<header>[^\\]*)\\(?P<body>.*)$'
+)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Request types answered by a response of a different type (e.g. an A lookup is answered by D).
+# Any other request is answered by a response of the same type and transaction id.
+RESPONSE_TYPES = {
+    'A': ('D',),
+}
+MAX_PENDING_AGE = 300.0  # seconds before an unanswered request is dropped
+INDEX_EVERY = 256  # one time index entry per this many messages
+
+
+class NtrMessage:
+    """One Msg Req / Msg Resp line from a MessagesHelper or DispMsgsHelper log."""
+
+    __slots__ = ('timestamp', 'direction', 'txn', 'msg_type', 'fields', 'source', 'offset')
+
+    def __init__(self, timestamp, direction, txn, msg_type, fields, source, offset=None):
+        self.timestamp = timestamp
+        self.direction = direction
+        self.txn = txn
+        self.msg_type = msg_type
+        self.fields = fields
+        self.source = source
+        self.offset = offset
+
+    @property
+    def is_request(self):
+        return self.direction == 'Req'
+
+    def mentions(self, value):
+        return any(value in field for field in self.fields)
+
+    def __repr__(self):
+        return f"NtrMessage({self.direction} {self.msg_type} txn={self.txn} fields={self.fields})"
+
+
+class Exchange:
+    """A request paired with its response; either side may be None if it never arrived."""
+
+    __slots__ = ('request', 'response')
+
+    def __init__(self, request, response):
+        self.request = request
+        self.response = response
+
+    @property
+    def latency_ms(self):
+        if self.request is None or self.response is None:
+            return None
+        return (self.response.timestamp - self.request.timestamp) * 1000
+
+    def mentions(self, value):
+        return any(message is not None and message.mentions(value) for message in (self.request, self.response))
+
+    def __repr__(self):
+        latency = f"{self.latency_ms:.0f} ms" if self.latency_ms is not None else "unpaired"
+        return f"Exchange({self.request!r} -> {self.response!r}, {latency})"
+
+
+def parse_line(line, offset=None):
+    """Parses one log line into an NtrMessage, or returns None for lines that are not messages."""
+    match = MESSAGE_PATTERN.match(line.rstrip('\r\n'))
+    if not match:
+        return None
+    fields = [field.strip() for field in match.group('body').split('\\')]
+    while fields and not fields[-1]:
+        fields.pop()
+    return NtrMessage(
+        datetime.strptime(match.group('timestamp'), TIMESTAMP_FORMAT).timestamp(),
+        match.group('direction'),
+        int(match.group('txn')),
+        match.group('type'),
+        fields,
+        match.group('source'),
+        offset,
+    )
+
+
+def read_messages(path, start_offset=0):
+    """Yields the messages in a log file one line at a time, with the byte offset of each line."""
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                return
+            message = parse_line(line.decode('utf-8', errors='replace'), offset)
+            if message:
+                yield message
+
+
+def follow(path, start_offset=None, poll_interval=0.2, stop_event=None):
+    """
+    Yields messages as they are appended to a log file, like `tail -f`.
+    Starts at the end of the file unless start_offset is given and reopens the file if it is truncated.
+    """
+    f = open(path, 'rb')
+    try:
+        f.seek(0, os.SEEK_END) if start_offset is None else f.seek(start_offset)
+        pending = b''
+        while stop_event is None or not stop_event.is_set():
+            offset = f.tell() - len(pending)
+            chunk = f.readline()
+            if not chunk:
+                if os.path.getsize(path) < f.tell():
+                    f.close()
+                    f = open(path, 'rb')
+                    pending = b''
+                time.sleep(poll_interval)
+                continue
+            pending += chunk
+            if not pending.endswith(b'\n'):
+                continue  # the writer is mid-line; wait for the rest
+            message = parse_line(pending.decode('utf-8', errors='replace'), offset)
+            pending = b''
+            if message:
+                yield message
+    finally:
+        f.close()
+
+
+def pair_messages(messages, max_pending_age=MAX_PENDING_AGE):
+    """
+    Pairs each response with the oldest unanswered request of the same transaction id
+    and a matching type. Memory stays bounded: requests older than max_pending_age are
+    yielded unanswered and dropped.
+    """
+    pending = {}
+    order = deque()
+    for message in messages:
+        while order and message.timestamp - order[0].timestamp > max_pending_age:
+            stale = order.popleft()
+            queue = pending.get(stale.txn)
+            if queue and stale in queue:
+                queue.remove(stale)
+                if not queue:
+                    del pending[stale.txn]
+                yield Exchange(stale, None)
+        if message.is_request:
+            pending.setdefault(message.txn, deque()).append(message)
+            order.append(message)
+            continue
+        queue = pending.get(message.txn, ())
+        request = next((candidate for candidate in queue
+                        if message.msg_type in RESPONSE_TYPES.get(candidate.msg_type, (candidate.msg_type,))), None)
+        if request is not None:
+            queue.remove(request)
+            if not queue:
+                del pending[message.txn]
+        yield Exchange(request, message)
+    for queue in pending.values():
+        for request in queue:
+            yield Exchange(request, None)
+
+
+class LogTimeIndex:
+    """
+    A compact index from time to byte offset: one (running max timestamp, offset) entry per
+    INDEX_EVERY messages, stored in two arrays. Lines are not strictly ordered in these logs,
+    so lookups step back by max_skew seconds.
+    """
+
+    def __init__(self, path, every=INDEX_EVERY, max_skew=60.0):
+        self.path = path
+        self.max_skew = max_skew
+        self.times = array('d')
+        self.offsets = array('q')
+        latest = float('-inf')
+        for count, message in enumerate(read_messages(path)):
+            latest = max(latest, message.timestamp)
+            if count % every == 0:
+                self.times.append(latest)
+                self.offsets.append(message.offset)
+
+    def offset_for(self, timestamp):
+        """Returns a byte offset at or before the first message that may be at timestamp or later."""
+        position = bisect_right(self.times, timestamp - self.max_skew) - 1
+        return self.offsets[position] if position >= 0 else 0
+
+    def messages_between(self, start, end):
+        """Yields the messages with start <= timestamp <= end."""
+        for message in read_messages(self.path, self.offset_for(start)):
+            if start <= message.timestamp <= end:
+                yield message
+            elif message.timestamp > end + self.max_skew:
+                return
+
+
+class NtrLogCursor:
+    """
+    Remembers where a log file ended when a flow started, so the flow can assert on the
+    terminal messages it caused without re-reading the history.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.start_offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def exchanges(self):
+        return pair_messages(read_messages(self.path, self.start_offset))
+
+    def wait_for_response(self, value, msg_type='D', within_ms=5000, timeout=30, poll_interval=0.1):
+        """
+        Waits until a response of msg_type whose request or response mentions value (e.g. the phone
+        number) is logged, and asserts it arrived within within_ms of its request.
+        Returns the Exchange. The log is followed from the cursor, so each line is read and paired once.
+        """
+        stop = threading.Event()
+        timer = threading.Timer(timeout, stop.set)
+        timer.start()
+        messages = follow(self.path, start_offset=self.start_offset, poll_interval=poll_interval, stop_event=stop)
+        try:
+            for exchange in pair_messages(messages):
+                response = exchange.response
+                if response is None or response.msg_type != msg_type or not exchange.mentions(value):
+                    continue
+                latency = exchange.latency_ms
+                print(f"📨 {msg_type} response for {value} on txn {response.txn}"
+                      f"{f' after {latency:.0f} ms' if latency is not None else ''} (from {CURRENT_FILE})")
+                if latency is not None and latency > within_ms:
+                    raise AssertionError(f"{msg_type} response for {value} took {latency:.0f} ms (limit {within_ms} ms)")
+                return exchange
+        finally:
+            timer.cancel()
+            messages.close()
+        raise TimeoutError(f"No {msg_type} response for {value} in {self.path} within {timeout}s")
+
+
+def latency_report(exchanges):
+    """Returns {request type -> response type: count, unpaired, p50 ms, p95 ms} for a stream of exchanges."""
+    summary = {}
+    for exchange in exchanges:
+        request, response = exchange.request, exchange.response
+        key = f"{request.msg_type if request else '?'} -> {response.msg_type if response else '?'}"
+        entry = summary.setdefault(key, {'count': 0, 'unpaired': 0, 'latencies': []})
+        entry['count'] += 1
+        if exchange.latency_ms is None:
+            entry['unpaired'] += 1
+        else:
+            entry['latencies'].append(exchange.latency_ms)
+    for entry in summary.values():
+        latencies = entry.pop('latencies')
+        entry['p50'] = percentile(latencies, 0.50)
+        entry['p95'] = percentile(latencies, 0.95)
+    return summary
+
+
+if __name__ == "__main__":
+    # Usage: python ntr_log.py <log file>
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "mids.txt")
+    print(f"\n--- Terminal Round Trips in {os.path.basename(path)} ---")
+    for key, entry in sorted(latency_report(pair_messages(read_messages(path))).items()):
+        p50 = f"{entry['p50']:.0f} ms" if entry['p50'] is not None else "-"
+        p95 = f"{entry['p95']:.0f} ms" if entry['p95'] is not None else "-"
+        print(f"{key:<8} n={entry['count']:<5} unpaired={entry['unpaired']:<5} p50={p50:<10} p95={p95}")
@@ -0,0 +1,113 @@
+import json
+import socket
+import sys
+import time
+import os
+
+# Only the standard library is imported here, so a command starts in milliseconds; the Appium
+# and Selenium imports, the Appium servers and the device sessions live in automation_daemon.py.
+CURRENT_FILE = os.path.basename(__file__)
+DAEMON_SOCKET = os.environ.get('NTR_DAEMON_SOCKET',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "automation.sock"))
+
+
+class DaemonNotRunning(Exception):
+    pass
+
+
+def option_value(name, default=None):
+    # The same --name VALUE parsing as main.py, which is not imported here because it loads Appium
+    if name in sys.argv[:-1]:
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
+
+def send(request, socket_path=DAEMON_SOCKET):
+    """Sends one request to the daemon and yields its reply events as they arrive."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        raise DaemonNotRunning(f"No automation daemon on {socket_path}; start one with: python automation_daemon.py")
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        for line in stream:
+            yield json.loads(line)
+
+
+def _job_specs(arguments):
+    """Job specs from a jobs file (see scheduler.jobs_from_spec) or from the --flow/--phones/... options."""
+    if arguments:
+        with open(arguments[0], 'r', encoding='utf-8') as f:
+            specs = json.load(f)
+    else:
+        specs = [{'flow': option_value('--flow', 'enrollment'), 'phones': option_value('--phones'),
+                  'range': option_value('--range'), 'count': option_value('--count'),
+                  'priority': option_value('--priority', 0), 'device': option_value('--device')}]
+    for spec in specs:
+        # The daemon runs in another directory; flow files are sent as absolute paths
+        flow = spec.get('flow', 'enrollment')
+        if os.path.exists(flow):
+            spec['flow'] = os.path.abspath(flow)
+    return specs
+
+
+def print_event(event):
+    kind = event.get('event')
+    job = event.get('job') or {}
+    if kind == 'queued':
+        print(f"🗓️ Queued #{job['id']} {job['flow']} {job['phone'] or '(allocated)'}")
+    elif kind == 'started':
+        print(f"📋 #{job['id']} started on {job['device']} after {job['queue_wait']:.1f}s in the queue")
+    elif kind == 'step':
+        print(f"   {event['result']} #{event['job_id']} {event['step']}")
+    elif kind == 'finished':
+        status = '❌ Failure' if job['error'] else '✅ Success'
+        print(f"{status} #{job['id']} {job['flow']} {job['phone'] or ''} on {job['device'] or '-'} "
+              f"in {job['elapsed'] or 0:.1f}s")
+        if job['error']:
+            print(f"   🛑 {job['error']}")
+    elif kind == 'done':
+        print(f"⏱️ {event['passed']} passed, {event['failed']} failed in {event['elapsed']:.1f}s")
+    elif kind == 'status':
+        print(f"🟢 Daemon {event['pid']} up for {event['uptime']:.0f}s: {event['queued']} queued, "
+              f"{event['running']} running")
+        for udid, device in event['devices'].items():
+            state = '🚧 quarantined' if device['quarantined'] else '🔗 connected' if device['connected'] else '⚪ idle'
+            print(f"   {state} {udid}: {device['jobs']} jobs ({device['passed']} passed, {device['failed']} failed)")
+    elif kind == 'error':
+        print(f"🛑 {event['message']}")
+    elif kind == 'bye':
+        print("👋 Daemon is shutting down once its running jobs finish")
+
+
+if __name__ == "__main__":
+    # Usage: python ntrctl.py run (JOBS.json | --flow NAME [--phones A,B | --range FIRST-LAST | --count N]
+    #                              [--priority N] [--device UDID]) [--no-wait]
+    #        python ntrctl.py status | shutdown
+    # NTR_DAEMON_SOCKET overrides the daemon's socket path
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    arguments = [argument for index, argument in enumerate(sys.argv[2:], start=2)
+                 if not argument.startswith('--') and not sys.argv[index - 1].startswith('--')]
+    request = {'command': command}
+    if command == 'run':
+        request.update(jobs=_job_specs(arguments), wait='--no-wait' not in sys.argv)
+    start = time.perf_counter()
+    failed = False
+    try:
+        for index, event in enumerate(send(request)):
+            if index == 0:
+                print(f"⚡ Daemon answered in {(time.perf_counter() - start) * 1000:.0f} ms (from {CURRENT_FILE})")
+            print_event(event)
+            failed = failed or event.get('event') == 'error' or bool(event.get('failed'))
+    except DaemonNotRunning as e:
+        print(f"🛑 {e} (from {CURRENT_FILE})")
+        sys.exit(2)
+    except KeyboardInterrupt:
+        # The jobs keep running on the daemon; only the stream is dropped
+        print(f"\n⏸️ Stopped following; queued jobs still run on the daemon (from {CURRENT_FILE})")
+        sys.exit(130)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from appium.webdriver.common.appiumby import AppiumBy
+from appium_manager import AppiumManager, SessionPool
+from artifacts import ArtifactRecorder
+from async_device_actions import AsyncDeviceActions, create_http_session
+from instrumentation import Instrumentation
+from main import (
+    EMAIL_CONFIRM_ID, EMAIL_XPATH, ENROLLMENT_STEPS, FIRST_NAME_XPATH, HEADER_ID, LAST_NAME_XPATH, NAME_CONFIRM_ID,
+    VISUAL_CHECKS, WELCOME_CHECKS, build_capabilities, close_phone_allocator, get_and_update_phone_number,
+    run_enrollment_flow,
+)
+from phone_allocator import TestIdentity
+from retry import FlakeDB
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+BASE_APPIUM_PORT = 4723
+BASE_SYSTEM_PORT = 8200
+
+
+def discover_devices(config_file=None):
+    """
+    Returns the devices to drive, each with its own Appium port and UiAutomator2 systemPort.
+    Reads them from a JSON config file (a list of {"udid", "port", "system_port"} entries)
+    when given, otherwise from the devices listed as ready by `adb devices`.
+    """
+    if config_file:
+        with open(config_file, 'r') as f:
+            configured = json.load(f)
+    else:
+        output = subprocess.run(['adb', 'devices'], capture_output=True, text=True, check=True).stdout
+        configured = []
+        for line in output.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) == 2 and parts[1] == 'device':
+                configured.append({'udid': parts[0]})
+
+    devices = []
+    for index, device in enumerate(configured):
+        devices.append({
+            'udid': device['udid'],
+            'port': device.get('port', BASE_APPIUM_PORT + index),
+            'system_port': device.get('system_port', BASE_SYSTEM_PORT + index),
+        })
+    return devices
+
+
+def run_on_device(device):
+    """Starts (or attaches to) the device's Appium server, runs the enrollment flow and tears down."""
+    udid = device['udid']
+    appium_manager = AppiumManager(port=device['port'])
+    session_pool = SessionPool(appium_manager.url)
+    instrumentation = Instrumentation(device=udid)
+    artifacts = ArtifactRecorder(run_id=f"{instrumentation.run_id}-{udid}")
+    artifacts.note(device=udid)
+    device_actions = None
+    action_results = {}
+    error_message = None
+    start = time.monotonic()
+    print(f"📟 [{udid}] Starting enrollment on port {device['port']} (from {CURRENT_FILE})")
+    try:
+        appium_manager.start_server()
+        capabilities = build_capabilities(device_name=udid, udid=udid, system_port=device['system_port'])
+        with instrumentation.step('Connection & App Launch'), instrumentation.session_setup(session_pool.appium_url):
+            device_actions = session_pool.acquire(capabilities)
+        action_results['Connection & App Launch'] = '✅ Success'
+        instrumentation.instrument(device_actions)
+        artifacts.attach(device_actions)
+        device_actions.retrier.flake_db = FlakeDB()
+        device_actions.retrier.run_id = instrumentation.run_id
+        run_enrollment_flow(device_actions, capabilities, action_results,
+                            phone_number_provider=get_and_update_phone_number, instrumentation=instrumentation,
+                            artifacts=artifacts)
+    except Exception as e:
+        error_message = str(e)
+        print(f"🛑 [{udid}] An error occurred: {error_message} (from {CURRENT_FILE})")
+        action_results['Final Status'] = '❌ Failure'
+    finally:
+        if device_actions and device_actions.driver:
+            session_pool.release(device_actions, keep=False)
+        appium_manager.stop_server()
+        instrumentation.write()
+        artifacts.close()
+        if device_actions:
+            device_actions.retrier.flush()
+    return {
+        'udid': udid,
+        'action_results': action_results,
+        'error': error_message,
+        'elapsed': time.monotonic() - start,
+    }
+
+
+def run_parallel(devices, max_workers=None):
+    """Runs the enrollment flow on every device concurrently and returns the per-device results."""
+    if not devices:
+        raise ValueError("No devices to run on.")
+    with ThreadPoolExecutor(max_workers=max_workers or len(devices)) as executor:
+        return list(executor.map(run_on_device, devices))
+
+
+async def _wait_for_app_async(device_actions, capabilities, identity):
+    expected_activity = capabilities['appWaitActivity'].split('/')[-1]
+
+    async def app_loaded(actions):
+        activity = await actions.current_activity() or ''
+        if not activity or not (expected_activity.endswith(activity) or activity.endswith(expected_activity)):
+            return False
+        return await actions.find_element(AppiumBy.ID, HEADER_ID)
+
+    await device_actions.wait_for(app_loaded, f"app loaded ({expected_activity})", timeout=30, replaces_sleep=20)
+
+
+async def _validate_welcome_screen_async(device_actions, capabilities, identity):
+    # The checks are sent concurrently instead of against one snapshot
+    await device_actions.validate_all(list(WELCOME_CHECKS.values()))
+    if device_actions.visual_mode:
+        await device_actions.validate_visual(list(VISUAL_CHECKS.values()))
+
+
+async def _enter_phone_number_async(device_actions, capabilities, identity):
+    await device_actions.enter_phone_number(identity.phone)
+
+
+async def _click_ok_async(device_actions, capabilities, identity):
+    await device_actions.click_button_by_text('OK')
+    screen = await device_actions.expect_screen(['confirm', 'featured_clip'], leaving=['welcome', 'keypad'])
+    if screen == 'featured_clip':
+        raise Exception(f"Phone number {identity.phone} is already enrolled (the terminal shows the featured clip)")
+
+
+async def _click_confirm_async(device_actions, capabilities, identity):
+    await device_actions.click_by_id_or_text(text="Confirm")
+
+
+async def _enter_email_async(device_actions, capabilities, identity):
+    await device_actions.enter_text_by_xpath(EMAIL_XPATH, identity.email)
+
+
+async def _confirm_email_async(device_actions, capabilities, identity):
+    async def confirm_clickable(actions):
+        return await actions.is_clickable(await actions.find_element(AppiumBy.ID, EMAIL_CONFIRM_ID))
+
+    await device_actions.wait_for(confirm_clickable, f"element clickable {EMAIL_CONFIRM_ID}", replaces_sleep=2)
+    await device_actions.click_by_id_or_text(resource_id=EMAIL_CONFIRM_ID)
+
+
+async def _enter_first_name_async(device_actions, capabilities, identity):
+    async def name_screen_shown(actions):
+        return await actions.find_element(AppiumBy.XPATH, FIRST_NAME_XPATH)
+
+    await device_actions.wait_for(name_screen_shown, f"element present {FIRST_NAME_XPATH}", replaces_sleep=3)
+    await device_actions.enter_text_by_xpath(FIRST_NAME_XPATH, identity.first_name)
+
+
+async def _enter_last_name_async(device_actions, capabilities, identity):
+    await device_actions.enter_text_by_xpath(LAST_NAME_XPATH, identity.last_name)
+
+
+async def _confirm_name_async(device_actions, capabilities, identity):
+    await device_actions.click_by_id_or_text(resource_id=NAME_CONFIRM_ID)
+
+    async def name_screen_closed(actions):
+        return not await actions.find_elements(AppiumBy.ID, NAME_CONFIRM_ID)
+
+    await device_actions.wait_for(name_screen_closed, "name screen closed", replaces_sleep=3)
+
+
+# AsyncDeviceActions versions of main.ENROLLMENT_STEPS, keyed by step name
+ASYNC_ENROLLMENT_STEPS = {
+    'App Load': _wait_for_app_async,
+    'Welcome Screen Validation': _validate_welcome_screen_async,
+    'Enter Phone Number': _enter_phone_number_async,
+    'Click OK Button': _click_ok_async,
+    'Click Confirm Button': _click_confirm_async,
+    'Enter Email Address': _enter_email_async,
+    'Click Email Confirm Button': _confirm_email_async,
+    'Enter First Name': _enter_first_name_async,
+    'Enter Last Name': _enter_last_name_async,
+    'Click Name Confirm Button': _confirm_name_async,
+}
+
+
+async def run_enrollment_flow_async(device_actions, capabilities, action_results,
+                                    phone_number_provider=get_and_update_phone_number):
+    """
+    Runs main.ENROLLMENT_STEPS on an AsyncDeviceActions, each step with its counterpart in
+    ASYNC_ENROLLMENT_STEPS, recording the same results. The welcome screen checks are sent
+    concurrently instead of one after another.
+    """
+    missing = [flow_step.name for flow_step in ENROLLMENT_STEPS if flow_step.name not in ASYNC_ENROLLMENT_STEPS]
+    if missing:
+        raise Exception(f"No async version of the enrollment steps: {', '.join(missing)}")
+    # The allocator does file I/O; keep it off the event loop
+    identity = TestIdentity(str(await asyncio.to_thread(phone_number_provider)))
+    for flow_step in ENROLLMENT_STEPS:
+        await ASYNC_ENROLLMENT_STEPS[flow_step.name](device_actions, capabilities, identity)
+        for result in flow_step.results:
+            action_results[result] = '✅ Success'
+    return identity
+
+
+async def run_on_device_async(device, http_session):
+    """run_on_device as a coroutine; every device shares the event loop and the HTTP connection pool."""
+    udid = device['udid']
+    appium_manager = AppiumManager(port=device['port'])
+    device_actions = AsyncDeviceActions(appium_manager.url, http_session=http_session)
+    action_results = {}
+    error_message = None
+    start = time.monotonic()
+    print(f"📟 [{udid}] Starting enrollment on port {device['port']} (from {CURRENT_FILE})")
+    try:
+        # Starting a server is a blocking subprocess launch
+        await asyncio.to_thread(appium_manager.start_server)
+        capabilities = build_capabilities(device_name=udid, udid=udid, system_port=device['system_port'])
+        await device_actions.connect(capabilities)
+        action_results['Connection & App Launch'] = '✅ Success'
+        await run_enrollment_flow_async(device_actions, capabilities, action_results)
+    except Exception as e:
+        error_message = str(e)
+        print(f"🛑 [{udid}] An error occurred: {error_message} (from {CURRENT_FILE})")
+        action_results['Final Status'] = '❌ Failure'
+    finally:
+        if device_actions.session_id:
+            await device_actions.quit()
+        await asyncio.to_thread(appium_manager.stop_server)
+    return {
+        'udid': udid,
+        'action_results': action_results,
+        'error': error_message,
+        'elapsed': time.monotonic() - start,
+    }
+
+
+async def run_parallel_async(devices):
+    """Runs the enrollment flow on every device from one event loop and returns the per-device results."""
+    if not devices:
+        raise ValueError("No devices to run on.")
+    async with create_http_session() as http_session:
+        return await asyncio.gather(*(run_on_device_async(device, http_session) for device in devices))
+
+
+def merge_results(results):
+    """Merges per-device action_results into one summary keyed by step name."""
+    summary = {}
+    for result in results:
+        for action, outcome in result['action_results'].items():
+            counts = summary.setdefault(action, {'passed': 0, 'failed': 0})
+            counts['passed' if outcome.startswith('✅') else 'failed'] += 1
+    return summary
+
+
+def print_parallel_summary(results, elapsed):
+    print("\n--- Parallel Execution Summary ---")
+    for result in results:
+        status = '❌ Failure' if result['error'] else '✅ Success'
+        print(f"{status} {result['udid']} ({result['elapsed']:.1f}s)")
+        if result['error']:
+            print(f"   🛑 {result['error']}")
+    print("\n--- Steps Across Devices ---")
+    for action, counts in merge_results(results).items():
+        print(f"{counts['passed']}✅ {counts['failed']}❌ {action}")
+    busy = sum(result['elapsed'] for result in results)
+    print(f"\n⏱️ {len(results)} devices in {elapsed:.1f}s wall time ({busy:.1f}s of device time)")
+
+
+if __name__ == "__main__":
+    # Usage: python parallel_runner.py [devices.json] [--async]
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+    use_async = '--async' in sys.argv
+    devices = discover_devices(arguments[0] if arguments else None)
+    print(f"🛠️ Running enrollment on {len(devices)} devices{' on one event loop' if use_async else ''} from {CURRENT_FILE}")
+    start = time.monotonic()
+    try:
+        results = asyncio.run(run_parallel_async(devices)) if use_async else run_parallel(devices)
+    finally:
+        close_phone_allocator()
+    print_parallel_summary(results, time.monotonic() - start)
+    if any(result['error'] for result in results):
+        sys.exit(1)
@@ -0,0 +1,256 @@
+import socket
+import sys
+import threading
+import uuid
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ALLOCATOR_DIR = os.path.join(BASE_DIR, "phone_blocks")
+LEGACY_PHONE_NUMBER_FILE = os.path.join(BASE_DIR, "last_phone.txt")
+INITIAL_PHONE_NUMBER = 4066720000
+BLOCK_SIZE = 20
+
+
+class TestIdentity:
+    """The test customer derived from an allocated phone number."""
+
+    def __init__(self, phone):
+        self.phone = str(phone)
+        self.email = f"orena+{self.phone}@appcard.com"
+        self.first_name = f"ORENTHEKING{self.phone}"
+        self.last_name = f"LAST{self.phone}"
+
+    def as_dict(self):
+        return {'phone': self.phone, 'email': self.email, 'first_name': self.first_name, 'last_name': self.last_name}
+
+    def __repr__(self):
+        return f"TestIdentity(phone='{self.phone}')"
+
+
+def pid_alive(pid):
+    """Returns True if a process with this pid is running on this host."""
+    if sys.platform == 'win32':
+        import ctypes
+        process_query_limited_information = 0x1000
+        handle = ctypes.windll.kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class PhoneAllocator:
+    """
+    Hands out unique phone numbers across threads and processes without a shared lock.
+
+    Numbers are reserved in blocks of block_size. A block is claimed once, atomically, by creating
+    block_<n>.claimed with O_EXCL; its owner then holds block_<n>.owner.<pid>.<token> and appends
+    every number it hands out to that file. Ownership only ever moves by os.rename, so when two
+    processes race for the same block exactly one rename succeeds:
+        owner.<pid>.<token>  ->  block_<n>.free   (closed with numbers left)
+        owner.<pid>.<token>  ->  block_<n>.done   (every number used)
+        block_<n>.free or an owner file whose pid is dead  ->  a new owner
+    Numbers already appended to an owner file are never handed out again, even after a crash.
+    On close, the files of the blocks below the first unfinished one are deleted; floor_<n> keeps
+    those blocks from being claimed again.
+    """
+
+    def __init__(self, directory=ALLOCATOR_DIR, block_size=BLOCK_SIZE, initial=None):
+        self.directory = directory
+        self.block_size = block_size
+        self.token = f"{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        self.host = socket.gethostname()
+        self._lock = threading.Lock()
+        self._block = None
+        self._remaining = []
+        self._owner_path = None
+        os.makedirs(self.directory, exist_ok=True)
+        self.base = self._load_base(initial)
+
+    def allocate(self):
+        """Returns the next unused phone number as a string."""
+        with self._lock:
+            if not self._remaining:
+                self._finish_block()
+                self._acquire_block()
+            phone = self._remaining.pop(0)
+            # One small O_APPEND write is atomic, so the record survives a crash right after it.
+            fd = os.open(self._owner_path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, f"{phone}\n".encode('ascii'))
+            finally:
+                os.close(fd)
+            return str(phone)
+
+    def allocate_identity(self):
+        """Returns a TestIdentity for the next unused phone number."""
+        return TestIdentity(self.allocate())
+
+    def close(self):
+        """Gives the unused rest of the current block back so another run can pick it up."""
+        with self._lock:
+            self._finish_block()
+            self._prune()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _load_base(self, initial):
+        base_path = os.path.join(self.directory, "base")
+        if os.path.exists(base_path):
+            return self._read_base(base_path)
+        if initial is None:
+            initial = self._legacy_last_number()
+        # Written whole under another name first, so no run ever reads a half written base
+        temp_path = f"{base_path}.{self.token}"
+        with open(temp_path, 'w') as f:
+            f.write(str(initial))
+        try:
+            # Unlike a rename, a link does not replace a base another run put in place meanwhile
+            os.link(temp_path, base_path)
+        except FileExistsError:
+            return self._read_base(base_path)
+        finally:
+            os.remove(temp_path)
+        print(f"📇 Phone allocator initialized at {initial} (from {CURRENT_FILE})")
+        return initial
+
+    @staticmethod
+    def _read_base(base_path):
+        with open(base_path, 'r') as f:
+            return int(f.read().strip())
+
+    @staticmethod
+    def _legacy_last_number():
+        """Continues from the old last_phone.txt counter so already used numbers are skipped."""
+        try:
+            with open(LEGACY_PHONE_NUMBER_FILE, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return INITIAL_PHONE_NUMBER
+
+    def _block_numbers(self, block):
+        first = self.base + block * self.block_size + 1
+        return list(range(first, first + self.block_size))
+
+    def _owner_name(self, block):
+        return f"block_{block:08d}.owner.{self.token}"
+
+    def _acquire_block(self):
+        if self._recover_block() or self._claim_new_block():
+            return
+        raise RuntimeError("Could not reserve a phone number block.")
+
+    def _recover_block(self):
+        """Takes over a block left free by a closed run or held by a crashed one."""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.startswith('block_'):
+                continue
+            block_name, _, state = name.partition('.')
+            if state == 'free':
+                pass
+            elif state.startswith('owner.'):
+                owner_pid = int(state.split('.')[1])
+                if owner_pid == os.getpid() or pid_alive(owner_pid):
+                    continue
+            else:
+                continue
+            block = int(block_name[len('block_'):])
+            owner_path = os.path.join(self.directory, self._owner_name(block))
+            try:
+                os.rename(os.path.join(self.directory, name), owner_path)
+            except (FileNotFoundError, FileExistsError, PermissionError):
+                continue  # another process won the race for this block
+            with open(owner_path, 'r') as f:
+                used = {int(line) for line in f.read().split() if line.isdigit()}
+            remaining = [phone for phone in self._block_numbers(block) if phone not in used]
+            self._set_block(block, owner_path, remaining)
+            if remaining:
+                print(f"♻️ Recovered {len(remaining)} unused numbers from block {block} (from {CURRENT_FILE})")
+                return True
+            self._finish_block()
+        return False
+
+    def _claim_new_block(self):
+        block = max(self._next_block_hint(), self._floor(os.listdir(self.directory)))
+        while True:
+            claim_path = os.path.join(self.directory, f"block_{block:08d}.claimed")
+            try:
+                fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                block += 1
+                continue
+            os.write(fd, f"{self.host} {self.token}\n".encode('ascii'))
+            os.close(fd)
+            owner_path = os.path.join(self.directory, self._owner_name(block))
+            open(owner_path, 'a').close()
+            self._set_block(block, owner_path, self._block_numbers(block))
+            self._write_next_block_hint(block + 1)
+            return True
+
+    def _set_block(self, block, owner_path, remaining):
+        self._block = block
+        self._owner_path = owner_path
+        self._remaining = remaining
+
+    def _finish_block(self):
+        if self._owner_path is None:
+            return
+        state = 'free' if self._remaining else 'done'
+        os.rename(self._owner_path, os.path.join(self.directory, f"block_{self._block:08d}.{state}"))
+        self._set_block(None, None, [])
+
+    @staticmethod
+    def _floor(names):
+        """The first block that may still be claimed; every block below it is done and its files deleted."""
+        return max((int(name[len('floor_'):]) for name in names
+                    if name.startswith('floor_') and name[len('floor_'):].isdigit()), default=0)
+
+    def _prune(self):
+        """Deletes the claim and done files of the finished blocks below the first unfinished one."""
+        names = set(os.listdir(self.directory))
+        floor = self._floor(names)
+        block = floor
+        while f"block_{block:08d}.done" in names:
+            block += 1
+        if block == floor:
+            return
+        # The new floor goes in place before any claim below it is deleted
+        open(os.path.join(self.directory, f"floor_{block:08d}"), 'a').close()
+        stale = [f"block_{old:08d}.{state}" for old in range(floor, block) for state in ('claimed', 'done')]
+        stale += [name for name in names if name.startswith('floor_') and self._floor([name]) < block]
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        print(f"🧹 Pruned the files of {block - floor} finished blocks (from {CURRENT_FILE})")
+
+    def _next_block_hint(self):
+        # Only a starting point for the O_EXCL scan; a stale hint costs a few extra attempts.
+        try:
+            with open(os.path.join(self.directory, "next_block"), 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return 0
+
+    def _write_next_block_hint(self, block):
+        hint_path = os.path.join(self.directory, "next_block")
+        temp_path = f"{hint_path}.{self.token}"
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(str(block))
+            os.replace(temp_path, hint_path)
+        except OSError:
+            pass
@@ -0,0 +1,85 @@
+import json
+import sys
+from instrumentation import REPORTS_DIR
+from stats import percentile
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+REGRESSION_THRESHOLD = 1.2  # recent p50 at least 20% slower than the baseline p50
+
+
+def load_records(path=None, kind='step'):
+    """Reads the timing records of one kind ('step' or 'call') from a runs.jsonl file."""
+    path = path or os.path.join(REPORTS_DIR, "runs.jsonl")
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('kind') == kind:
+                records.append(record)
+    return records
+
+
+def aggregate(records):
+    """Groups records by name and returns count, p50, p95, mean commands and failures for each."""
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record['name'], []).append(record)
+    summary = {}
+    for name, group in grouped.items():
+        walls = [record['wall_ms'] for record in group if record['succeeded']]
+        summary[name] = {
+            'count': len(group),
+            'p50': percentile(walls, 0.50),
+            'p95': percentile(walls, 0.95),
+            'commands': sum(record['commands'] for record in group) / len(group),
+            'failures': sum(1 for record in group if not record['succeeded']),
+        }
+    return summary
+
+
+def find_regressions(records, recent_runs=5):
+    """
+    Compares the p50 of each step over the most recent runs against all earlier runs.
+    Returns (name, baseline p50, recent p50) for steps that got slower than REGRESSION_THRESHOLD.
+    """
+    run_order = list(dict.fromkeys(record['run_id'] for record in records))
+    if len(run_order) <= recent_runs:
+        return []
+    recent_ids = set(run_order[-recent_runs:])
+    baseline = aggregate([record for record in records if record['run_id'] not in recent_ids])
+    recent = aggregate([record for record in records if record['run_id'] in recent_ids])
+    regressions = []
+    for name, stats in recent.items():
+        before = baseline.get(name, {}).get('p50')
+        if before and stats['p50'] and stats['p50'] >= before * REGRESSION_THRESHOLD:
+            regressions.append((name, before, stats['p50']))
+    return regressions
+
+
+def _format_ms(value):
+    return f"{value:.0f}" if value is not None else "-"
+
+
+def print_report(records, recent_runs=5):
+    runs = len({record['run_id'] for record in records})
+    print(f"\n--- Step Timing Report ({runs} runs) ---")
+    print(f"{'step':<40} {'n':>4} {'p50 ms':>8} {'p95 ms':>8} {'cmds':>6} {'fail':>5}")
+    for name, stats in aggregate(records).items():
+        print(f"{name[:40]:<40} {stats['count']:>4} {_format_ms(stats['p50']):>8} "
+              f"{_format_ms(stats['p95']):>8} {stats['commands']:>6.1f} {stats['failures']:>5}")
+    regressions = find_regressions(records, recent_runs)
+    if regressions:
+        print(f"\n⚠️ Slower in the last {recent_runs} runs:")
+        for name, before, after in regressions:
+            print(f"   {name}: p50 {before:.0f} ms -> {after:.0f} ms")
+
+
+if __name__ == "__main__":
+    # Usage: python report.py [runs.jsonl] [--calls]
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+    kind = 'call' if '--calls' in sys.argv else 'step'
+    print_report(load_records(arguments[0] if arguments else None, kind=kind))
@@ -0,0 +1,253 @@
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from selenium.common.exceptions import (
+    ElementClickInterceptedException, NoSuchElementException, StaleElementReferenceException,
+)
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+FLAKE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports", "flakes.sqlite")
+
+# Retries allowed per exception type within one call; anything not listed fails at once.
+# A TimeoutException means a wait already ran its whole timeout, so it is never retried.
+DEFAULT_BUDGETS = {
+    StaleElementReferenceException: 3,
+    NoSuchElementException: 2,
+    ElementClickInterceptedException: 2,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS step_stats (
+    step TEXT NOT NULL,
+    locator TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    first_try INTEGER NOT NULL DEFAULT 0,
+    recovered INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    last_seen TEXT,
+    PRIMARY KEY (step, locator)
+);
+CREATE TABLE IF NOT EXISTS retry_events (
+    timestamp TEXT NOT NULL,
+    run_id TEXT,
+    step TEXT NOT NULL,
+    locator TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    exception TEXT NOT NULL,
+    outcome TEXT NOT NULL
+);
+"""
+
+
+class NotRetryableError(Exception):
+    """Raised when a failed attempt already sent its side effect and cannot be repeated safely."""
+
+
+class RetryPolicy:
+    """
+    How often and how fast a failing step is retried. budgets maps exception types to the number
+    of retries they may use (the most specific matching type wins); the delay before retry n is
+    base_delay * 2**(n - 1), capped at max_delay and spread by +/- jitter so parallel devices do
+    not retry in lockstep.
+    """
+
+    def __init__(self, budgets=None, base_delay=0.25, max_delay=2.0, jitter=0.5):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def budget_for(self, error):
+        for error_type in type(error).__mro__:
+            if error_type in self.budgets:
+                return error_type, self.budgets[error_type]
+        return None, 0
+
+    def delay(self, retry):
+        delay = min(self.base_delay * 2 ** (retry - 1), self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class FlakeDB:
+    """
+    Per step and locator retry history in SQLite: how many calls passed on the first try, were
+    recovered by a retry, or failed after every retry. Each retry is also kept as an event.
+    """
+
+    def __init__(self, path=FLAKE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # Parallel processes share the file; wait for their writes instead of failing
+        return sqlite3.connect(self.path, timeout=30)
+
+    def write(self, stats, events):
+        """Adds the counts of one run (keyed by (step, locator)) and its retry events."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._connect() as connection:
+            connection.executemany(
+                """INSERT INTO step_stats (step, locator, calls, first_try, recovered, failed, retries, last_seen)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (step, locator) DO UPDATE SET
+                       calls = calls + excluded.calls, first_try = first_try + excluded.first_try,
+                       recovered = recovered + excluded.recovered, failed = failed + excluded.failed,
+                       retries = retries + excluded.retries, last_seen = excluded.last_seen""",
+                [(step, locator, counts['calls'], counts['first_try'], counts['recovered'], counts['failed'],
+                  counts['retries'], now) for (step, locator), counts in stats.items()])
+            connection.executemany(
+                "INSERT INTO retry_events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(event['timestamp'], event['run_id'], event['step'], event['locator'], event['attempt'],
+                  event['exception'], event['outcome']) for event in events])
+
+    def report(self):
+        """Returns one row per step and locator with its counts and classification, flakiest first."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT step, locator, calls, first_try, recovered, failed, retries FROM step_stats").fetchall()
+        report = []
+        for step, locator, calls, first_try, recovered, failed, retries in rows:
+            report.append({
+                'step': step,
+                'locator': locator,
+                'calls': calls,
+                'first_try': first_try,
+                'recovered': recovered,
+                'failed': failed,
+                'retries': retries,
+                'flake_rate': recovered / calls if calls else 0.0,
+                'classification': classify(first_try, recovered, failed),
+            })
+        return sorted(report, key=lambda row: (-row['flake_rate'], -row['failed'], row['step']))
+
+
+def classify(first_try, recovered, failed):
+    """
+    'broken' when retries mostly do not help, 'flaky' when they do, 'stable' when nothing was retried.
+    A step that fails even after retries more often than it recovers is a real failure, not a flake.
+    """
+    if failed and failed >= recovered:
+        return 'broken'
+    if recovered:
+        return 'flaky'
+    return 'stable'
+
+
+class Retrier:
+    """
+    Runs DeviceActions steps under a RetryPolicy and counts, per step and locator, how each call ended.
+    An attempt receives a progress dict and sets progress['dispatched'] just before it sends its
+    side effect (a click, typed text). A failure before that point is always safe to retry; after
+    it, the call is only retried if already_done() shows the effect did not happen, and succeeds
+    without retrying if it did. Without already_done a dispatched attempt is never repeated.
+    Counts are kept in memory and written to the FlakeDB (if any) by flush().
+    """
+
+    def __init__(self, policy=None, flake_db=None, run_id=None):
+        self.policy = policy or RetryPolicy()
+        self.flake_db = flake_db
+        self.run_id = run_id
+        self.stats = {}
+        self.events = []
+        self._lock = threading.Lock()
+
+    def call(self, step, locator, attempt, already_done=None):
+        used = {}
+        retries = 0
+        while True:
+            progress = {'dispatched': False}
+            try:
+                result = attempt(progress)
+            except Exception as e:
+                error_type, budget = self.policy.budget_for(e)
+                if error_type is None or used.get(error_type, 0) >= budget:
+                    self._count(step, locator, retries, failed=True, error=e)
+                    raise
+                if progress['dispatched']:
+                    if already_done is None:
+                        self._count(step, locator, retries, failed=True, error=e)
+                        raise NotRetryableError(f"{step} failed after its action was sent and cannot be "
+                                                f"checked, not retrying: {e}") from e
+                    if already_done():
+                        print(f"✅ {step}: the action took effect despite {e.__class__.__name__} "
+                              f"(from {CURRENT_FILE})")
+                        self._count(step, locator, retries, error=e, outcome='already_done')
+                        return None
+                used[error_type] = used.get(error_type, 0) + 1
+                retries += 1
+                delay = self.policy.delay(retries)
+                print(f"🔁 {step}: {e.__class__.__name__}, retry {retries} in {delay:.2f}s (from {CURRENT_FILE})")
+                self._event(step, locator, retries, e, 'retried')
+                time.sleep(delay)
+                continue
+            self._count(step, locator, retries)
+            return result
+
+    def _count(self, step, locator, retries, failed=False, error=None, outcome=None):
+        with self._lock:
+            counts = self.stats.setdefault((step, locator), {
+                'calls': 0, 'first_try': 0, 'recovered': 0, 'failed': 0, 'retries': 0,
+            })
+            counts['calls'] += 1
+            counts['retries'] += retries
+            if failed:
+                counts['failed'] += 1
+            elif retries or outcome:
+                counts['recovered'] += 1
+            else:
+                counts['first_try'] += 1
+        if retries or outcome:
+            self._event(step, locator, retries, error, outcome or ('failed' if failed else 'recovered'))
+
+    def _event(self, step, locator, attempt, error, outcome):
+        with self._lock:
+            self.events.append({
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'run_id': self.run_id,
+                'step': step,
+                'locator': locator,
+                'attempt': attempt,
+                'exception': error.__class__.__name__ if error is not None else '',
+                'outcome': outcome,
+            })
+
+    def summary(self):
+        """Returns the totals of this run: calls, retries, calls recovered by a retry and calls that failed."""
+        with self._lock:
+            counts = list(self.stats.values())
+        return {
+            'calls': sum(count['calls'] for count in counts),
+            'retries': sum(count['retries'] for count in counts),
+            'recovered': sum(count['recovered'] for count in counts),
+            'failed': sum(count['failed'] for count in counts),
+        }
+
+    def flush(self):
+        """Writes the counts and events gathered since the last flush to the FlakeDB."""
+        with self._lock:
+            stats, self.stats = self.stats, {}
+            events, self.events = self.events, []
+        if self.flake_db is not None and stats:
+            self.flake_db.write(stats, events)
+
+
+def print_flake_report(report):
+    print("\n--- Flake Report ---")
+    icons = {'stable': '✅', 'flaky': '⚠️', 'broken': '❌'}
+    for row in report:
+        print(f"{icons[row['classification']]} {row['classification']:<7} {row['step']} [{row['locator']}]: "
+              f"{row['calls']} calls, {row['first_try']} first try, {row['recovered']} recovered, "
+              f"{row['failed']} failed ({row['flake_rate']:.0%} flaky)")
+
+
+if __name__ == "__main__":
+    # Usage: python retry.py [flakes.sqlite]
+    flake_db = FlakeDB(sys.argv[1] if len(sys.argv) > 1 else FLAKE_DB)
+    print_flake_report(flake_db.report())
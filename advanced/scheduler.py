@@ -0,0 +1,519 @@
+import heapq
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from appium_manager import AppiumManager, SessionPool
+from artifacts import ArtifactRecorder
+from batch_enroll import WelcomeNavigator, parse_phone_numbers
+from flow_engine import FlowEngine
+from instrumentation import REPORTS_DIR, Instrumentation
+from main import (
+    build_capabilities, close_phone_allocator, get_and_update_phone_number, option_value, run_enrollment_flow,
+)
+from parallel_runner import discover_devices
+from phone_allocator import TestIdentity
+from retry import FlakeDB
+from selenium.common.exceptions import WebDriverException
+from stats import percentile
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+# Device failures in a row after which a device is taken out of the rotation
+QUARANTINE_AFTER = 3
+# Seconds a quarantined device waits before it is set up again to see whether it recovered
+PROBE_INTERVAL = 300
+# Times a job is put back in the queue when its device could not even be set up
+MAX_REQUEUES = 2
+# Returned by Scheduler._next_job when a quarantined device is due for a probe
+_PROBE = object()
+
+
+class Job:
+    """
+    One flow run: flow is 'enrollment' or a flow file (see flow_engine.py), phone the number to
+    use (None: the next one from the PhoneAllocator, enrollment only). Higher priorities run first;
+    a job with a device only runs on that device and is never stolen by another.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, flow, phone=None, priority=0, device=None):
+        self.id = next(Job._ids)
+        self.flow = flow
+        self.phone = phone
+        self.priority = priority
+        self.device = device
+        self.submitted = None
+        self.started = None
+        self.finished = None
+        self.ran_on = None
+        self.stolen = False
+        self.requeues = 0
+        # Devices that could not be set up for this job; it is put back on another one
+        self.avoid = set()
+        self.action_results = {}
+        self.error = None
+        # Called as listener(job, 'started' | 'finished') from a scheduler thread, without its lock held
+        self.listener = None
+
+    @property
+    def name(self):
+        return f"#{self.id} {self.flow} {self.phone or '(allocated)'}"
+
+    @property
+    def queue_wait(self):
+        return self.started - self.submitted if self.started is not None else None
+
+    def __repr__(self):
+        return f"Job({self.name}, priority {self.priority})"
+
+
+def jobs_from_spec(spec):
+    """
+    Expands one job spec into jobs, one per phone number:
+        {"flow": "enrollment", "range": "4130000000-4130000009", "priority": 5}
+    with the numbers from "phones" (a list or comma separated), "range" or "count" as in
+    batch_enroll.py, and an optional "device" to pin the jobs to.
+    """
+    flow = spec.get('flow', 'enrollment')
+    phones = spec.get('phones')
+    if isinstance(phones, list):
+        phones = ','.join(str(phone) for phone in phones)
+    if spec.get('count') and not phones and not spec.get('range'):
+        if flow != 'enrollment':
+            raise ValueError(f"Flow '{flow}' needs existing phone numbers: give 'phones' or 'range'")
+        # Allocated when each job starts, so queued jobs do not hold numbers
+        numbers = [None] * int(spec['count'])
+    else:
+        numbers = parse_phone_numbers(phones, spec.get('range'))
+    return [Job(flow, phone, int(spec.get('priority', 0)), spec.get('device')) for phone in numbers]
+
+
+def load_jobs(path):
+    """Reads a JSON list of job specs (see jobs_from_spec)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        specs = json.load(f)
+    return [job for spec in specs for job in jobs_from_spec(spec)]
+
+
+_flow_engine = FlowEngine()
+_flow_engine_lock = threading.Lock()
+
+
+def run_enrollment_job(device_actions, capabilities, job, action_results, instrumentation=None, artifacts=None):
+    identity = run_enrollment_flow(device_actions, capabilities, action_results,
+                                   phone_number_provider=lambda: job.phone or get_and_update_phone_number(),
+                                   instrumentation=instrumentation, artifacts=artifacts)
+    job.phone = identity.phone
+
+
+def run_flow_file_job(device_actions, capabilities, job, action_results, instrumentation=None, artifacts=None):
+    with _flow_engine_lock:
+        flow = _flow_engine.load(job.flow)
+    _flow_engine.run(flow, device_actions, TestIdentity(job.phone).as_dict(), action_results, instrumentation)
+
+
+def is_device_failure(error, device_actions):
+    """
+    Whether a failed job says something about its device: the driver failed (WebDriverException,
+    which includes timeouts waiting for a screen) or the session no longer answers. A flow that
+    stops on its data, such as an already enrolled or invalid number, does not.
+    """
+    if isinstance(error, WebDriverException):
+        return True
+    return device_actions is not None and not device_actions.is_session_alive()
+
+
+# Flows with their own runner (enrollment resumes failed steps, see main.py); any other flow
+# name is loaded with the FlowEngine
+FLOW_RUNNERS = {
+    'enrollment': run_enrollment_job,
+}
+
+
+class DeviceLease:
+    """
+    One device of the bench while the scheduler holds it: its Appium server and session, set up
+    on the first job and kept for the following ones, and its usage counts.
+    """
+
+    def __init__(self, device, session_pool=None):
+        self.device = device
+        self.udid = device['udid']
+        self.capabilities = build_capabilities(device_name=self.udid, udid=self.udid,
+                                               system_port=device.get('system_port'))
+        self.appium_manager = AppiumManager(port=device['port'])
+        self.session_pool = session_pool or SessionPool(self.appium_manager.url)
+        self.device_actions = None
+        self.navigator = None
+        self.instrumentation = Instrumentation(flow='scheduler', device=self.udid)
+        self.artifacts = ArtifactRecorder(run_id=f"{self.instrumentation.run_id}-{self.udid}")
+        self.artifacts.note(device=self.udid)
+        self.quarantined = False
+        self.failures_in_a_row = 0
+        self.probe_at = None
+        self.stats = {'jobs': 0, 'passed': 0, 'failed': 0, 'stolen': 0, 'busy': 0.0, 'setup': 0.0}
+
+    def prepare(self, flake_db=None):
+        """Connects on first use; later jobs start from the welcome screen of the same session."""
+        start = time.monotonic()
+        try:
+            if self.device_actions is None or not self.device_actions.is_session_alive():
+                self.appium_manager.start_server()
+                self.device_actions = self.session_pool.acquire(self.capabilities)
+                self.instrumentation.instrument(self.device_actions)
+                self.artifacts.attach(self.device_actions)
+                self.device_actions.retrier.flake_db = flake_db
+                self.device_actions.retrier.run_id = self.instrumentation.run_id
+                self.navigator = WelcomeNavigator(self.device_actions, self.capabilities)
+            else:
+                self.navigator.return_to_welcome()
+        finally:
+            self.stats['setup'] += time.monotonic() - start
+
+    def release(self):
+        if self.device_actions and self.device_actions.driver:
+            self.session_pool.release(self.device_actions, keep=False)
+        self.appium_manager.stop_server()
+        self.artifacts.close()
+        self.instrumentation.write()
+        if self.device_actions:
+            self.device_actions.retrier.flush()
+
+
+class Scheduler:
+    """
+    Runs queued flow jobs on a bench of devices, one worker thread per device.
+
+    Every device has its own priority queue; submitted jobs go to the shortest one. A worker runs
+    its own queue's highest priority job and, when its queue is empty, steals the highest priority
+    job from the other queues, so no terminal idles while another has a backlog. A device that
+    fails quarantine_after times in a row (it could not be set up, the driver failed or the session
+    was lost; a flow failing on its data, such as an already enrolled number, does not count) is
+    quarantined: it takes no more jobs and its queue is handed to the other devices. Every
+    probe_interval seconds it is set up again, and once that works it takes jobs again.
+    Per-device busy time and per-job queue wait are kept for report().
+    """
+
+    def __init__(self, devices, quarantine_after=QUARANTINE_AFTER, runners=None, probe_interval=PROBE_INTERVAL):
+        if not devices:
+            raise ValueError("No devices to schedule on.")
+        self.leases = {device['udid']: DeviceLease(device) for device in devices}
+        self.quarantine_after = quarantine_after
+        self.probe_interval = probe_interval
+        self.runners = dict(FLOW_RUNNERS if runners is None else runners)
+        self.jobs = []
+        self.flake_db = FlakeDB()
+        self.started = None
+        self.finished = None
+        self._queues = {udid: [] for udid in self.leases}
+        self._order = itertools.count()
+        self._running = 0
+        self._closed = False
+        self._changed = threading.Condition()
+        self._threads = []
+        # Listener calls queued under the lock and made after it is released, in order
+        self._events = deque()
+        self._delivering = threading.Lock()
+
+    def submit(self, job):
+        """Queues a job; may be called while the scheduler runs."""
+        with self._changed:
+            if self._closed:
+                raise Exception("The scheduler no longer accepts jobs")
+            if job.device is not None and job.device not in self.leases:
+                raise ValueError(f"Job {job.name} is pinned to unknown device {job.device}")
+            job.submitted = time.monotonic()
+            self.jobs.append(job)
+            self._enqueue(job)
+            self._changed.notify_all()
+        self._deliver()
+        return job
+
+    def _enqueue(self, job):
+        available = [udid for udid, lease in self.leases.items() if not lease.quarantined]
+        preferred = [udid for udid in available if udid not in job.avoid] or available
+        if job.device is not None:
+            target = job.device
+        elif preferred:
+            target = min(preferred, key=lambda udid: len(self._queues[udid]))
+        else:
+            target = None
+        if target is None or self.leases[target].quarantined:
+            self._finish(job, None, "No healthy device left to run it on")
+            return
+        heapq.heappush(self._queues[target], (-job.priority, next(self._order), job))
+
+    def _take(self, udid):
+        """Pops the next job for a device, stealing when its own queue is empty. Called with the lock held."""
+        own = self._queues[udid]
+        if own:
+            return heapq.heappop(own)[2]
+        best = None
+        for victim, queue in self._queues.items():
+            if victim == udid:
+                continue
+            for entry in queue:
+                if entry[2].device is None and udid not in entry[2].avoid and (best is None or entry[:2] < best[1][:2]):
+                    best = (victim, entry)
+        if best is None:
+            return None
+        victim, entry = best
+        queue = self._queues[victim]
+        queue.remove(entry)
+        heapq.heapify(queue)
+        entry[2].stolen = True
+        print(f"🤝 [{udid}] Stole {entry[2].name} from {victim} (from {CURRENT_FILE})")
+        return entry[2]
+
+    def _next_job(self, lease):
+        """The next job for a device, _PROBE when a quarantined device is due for a probe, or None to stop."""
+        with self._changed:
+            while True:
+                # A running job may still be put back (its device failed to set up) or more may be submitted
+                if self._closed and not self._running and not any(self._queues.values()):
+                    return None
+                if lease.quarantined:
+                    remaining = lease.probe_at - time.monotonic()
+                    if remaining <= 0:
+                        return _PROBE
+                    self._changed.wait(timeout=remaining)
+                    continue
+                job = self._take(lease.udid)
+                if job is not None:
+                    self._running += 1
+                    return job
+                self._changed.wait()
+
+    def _work(self, lease):
+        try:
+            while True:
+                job = self._next_job(lease)
+                if job is None:
+                    break
+                if job is _PROBE:
+                    self._probe(lease)
+                else:
+                    self._run(lease, job)
+        finally:
+            lease.release()
+            with self._changed:
+                self._changed.notify_all()
+
+    def _run(self, lease, job):
+        print(f"\n📋 [{lease.udid}] Starting {job.name} (from {CURRENT_FILE})")
+        try:
+            lease.prepare(self.flake_db)
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+            print(f"⚠️ [{lease.udid}] Could not prepare the device: {error} (from {CURRENT_FILE})")
+            with self._changed:
+                self._running -= 1
+                self._count_failure(lease)
+                if job.requeues < MAX_REQUEUES:
+                    job.requeues += 1
+                    job.avoid.add(lease.udid)
+                    self._enqueue(job)
+                else:
+                    self._finish(job, lease, f"Device setup failed: {error}")
+                self._changed.notify_all()
+            self._deliver()
+            return
+        with self._changed:
+            job.started = time.monotonic()
+            job.ran_on = lease.udid
+            self._notify(job, 'started')
+        self._deliver()
+        runner = self.runners.get(job.flow, run_flow_file_job)
+        error = None
+        device_failed = False
+        try:
+            runner(lease.device_actions, lease.capabilities, job, job.action_results,
+                   instrumentation=lease.instrumentation, artifacts=lease.artifacts)
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            device_failed = is_device_failure(e, lease.device_actions)
+            print(f"🛑 [{lease.udid}] {job.name} failed{' (device)' if device_failed else ''}: {error} "
+                  f"(from {CURRENT_FILE})")
+        with self._changed:
+            self._running -= 1
+            lease.stats['busy'] += time.monotonic() - job.started
+            lease.stats['jobs'] += 1
+            lease.stats['stolen'] += job.stolen
+            if error:
+                lease.stats['failed'] += 1
+                if device_failed:
+                    self._count_failure(lease)
+            else:
+                lease.stats['passed'] += 1
+                lease.failures_in_a_row = 0
+            self._finish(job, lease, error)
+            self._changed.notify_all()
+        self._deliver()
+
+    def _count_failure(self, lease):
+        lease.failures_in_a_row += 1
+        if lease.failures_in_a_row >= self.quarantine_after and not lease.quarantined:
+            lease.quarantined = True
+            lease.probe_at = time.monotonic() + self.probe_interval
+            queued = [entry[2] for entry in self._queues[lease.udid]]
+            self._queues[lease.udid] = []
+            print(f"🚧 [{lease.udid}] Quarantined after {lease.failures_in_a_row} failures in a row; "
+                  f"handing {len(queued)} queued jobs to the other devices (from {CURRENT_FILE})")
+            for job in queued:
+                self._enqueue(job)
+
+    def _probe(self, lease):
+        """Sets a quarantined device up again; if that works it takes jobs again, otherwise it waits another probe_interval."""
+        print(f"🩺 [{lease.udid}] Checking whether the quarantined device recovered (from {CURRENT_FILE})")
+        try:
+            lease.prepare(self.flake_db)
+        except Exception as e:
+            print(f"🚧 [{lease.udid}] Still failing: {e.__class__.__name__}: {e} (from {CURRENT_FILE})")
+            with self._changed:
+                lease.probe_at = time.monotonic() + self.probe_interval
+            return
+        print(f"✅ [{lease.udid}] Recovered; taking jobs again (from {CURRENT_FILE})")
+        with self._changed:
+            lease.quarantined = False
+            lease.failures_in_a_row = 0
+            self._changed.notify_all()
+
+    def _finish(self, job, lease, error):
+        job.finished = time.monotonic()
+        job.error = error
+        if error and not job.action_results:
+            job.action_results['Final Status'] = '❌ Failure'
+        self._notify(job, 'finished')
+
+    def _notify(self, job, event):
+        """Queues a listener call; called with the lock held, every caller then calls _deliver() after releasing it."""
+        if job.listener is not None:
+            self._events.append((job, event))
+
+    def _deliver(self):
+        """Makes the queued listener calls, in the order they were queued, without the scheduler's lock held."""
+        with self._delivering:
+            while self._events:
+                job, event = self._events.popleft()
+                try:
+                    job.listener(job, event)
+                except Exception as e:
+                    print(f"⚠️ Listener of {job.name} failed on '{event}': {e} (from {CURRENT_FILE})")
+
+    def start(self):
+        self.started = time.monotonic()
+        for lease in self.leases.values():
+            thread = threading.Thread(target=self._work, args=(lease,), name=f"device-{lease.udid}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"🗓️ Scheduling on {len(self.leases)} devices (from {CURRENT_FILE})")
+        return self
+
+    def close(self):
+        """Accepts no more jobs; the workers stop once the queued ones are done."""
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        self.finished = time.monotonic()
+
+    def run(self, jobs):
+        """Runs a list of jobs to completion and returns report()."""
+        for job in jobs:
+            self.submit(job)
+        self.start()
+        self.close()
+        self.join()
+        return self.report()
+
+    def report(self):
+        """Per-device utilization and results, per-job outcome and queue wait."""
+        elapsed = ((self.finished or time.monotonic()) - self.started) if self.started else 0.0
+        with self._changed:
+            jobs = list(self.jobs)
+            devices = {udid: dict(lease.stats, quarantined=lease.quarantined,
+                                  utilization=lease.stats['busy'] / elapsed if elapsed else 0.0)
+                       for udid, lease in self.leases.items()}
+        waits = [job.queue_wait for job in jobs if job.queue_wait is not None]
+        return {
+            'elapsed': elapsed,
+            'devices': devices,
+            'jobs': [{
+                'id': job.id,
+                'flow': job.flow,
+                'phone': job.phone,
+                'priority': job.priority,
+                'device': job.ran_on,
+                'stolen': job.stolen,
+                'queue_wait': job.queue_wait,
+                'elapsed': job.finished - job.started if job.started is not None and job.finished else None,
+                'error': job.error,
+                'done': job.finished is not None,
+            } for job in jobs],
+            'queue_wait': {
+                'p50': percentile(waits, 0.5),
+                'p95': percentile(waits, 0.95),
+                'max': max(waits) if waits else None,
+            },
+        }
+
+
+def write_schedule_report(report, output_dir=REPORTS_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"schedule-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def print_schedule_summary(report):
+    print("\n--- Scheduler Summary ---")
+    for job in report['jobs']:
+        status = '❌ Failure' if job['error'] else '✅ Success' if job['done'] else '⏸️ Not run'
+        wait = f", waited {job['queue_wait']:.1f}s" if job['queue_wait'] is not None else ''
+        print(f"{status} #{job['id']} {job['flow']} {job['phone'] or ''} on {job['device'] or '-'}{wait}"
+              f"{' (stolen)' if job['stolen'] else ''}")
+        if job['error']:
+            print(f"   🛑 {job['error']}")
+    print("\n--- Devices ---")
+    for udid, device in report['devices'].items():
+        status = '🚧 quarantined' if device['quarantined'] else '✅'
+        print(f"{status} {udid}: {device['jobs']} jobs ({device['passed']} passed, {device['failed']} failed, "
+              f"{device['stolen']} stolen), {device['utilization']:.0%} busy, {device['setup']:.1f}s setup")
+    waits = report['queue_wait']
+    if waits['p50'] is not None:
+        print(f"\n⏳ Queue wait: p50 {waits['p50']:.1f}s, p95 {waits['p95']:.1f}s, max {waits['max']:.1f}s")
+    print(f"⏱️ {len(report['jobs'])} jobs on {len(report['devices'])} devices in {report['elapsed']:.1f}s")
+
+
+if __name__ == "__main__":
+    # Usage: python scheduler.py (JOBS.json | --flow NAME (--phones A,B | --range FIRST-LAST | --count N) [--priority N])
+    #                            [--devices devices.json] [--quarantine-after N] [--probe-interval SECONDS]
+    arguments = [argument for index, argument in enumerate(sys.argv[1:], start=1)
+                 if not argument.startswith('--') and not sys.argv[index - 1].startswith('--')]
+    if arguments:
+        jobs = load_jobs(arguments[0])
+    else:
+        jobs = jobs_from_spec({'flow': option_value('--flow', 'enrollment'), 'phones': option_value('--phones'),
+                               'range': option_value('--range'), 'count': option_value('--count'),
+                               'priority': option_value('--priority', 0)})
+    devices = discover_devices(option_value('--devices'))
+    scheduler = Scheduler(devices, quarantine_after=int(option_value('--quarantine-after', QUARANTINE_AFTER)),
+                          probe_interval=float(option_value('--probe-interval', PROBE_INTERVAL)))
+    print(f"🛠️ Scheduling {len(jobs)} jobs on {len(devices)} devices from {CURRENT_FILE}")
+    try:
+        report = scheduler.run(jobs)
+    finally:
+        close_phone_allocator()
+    print_schedule_summary(report)
+    print(f"📊 Schedule report written to {write_schedule_report(report)}")
+    if any(job['error'] or not job['done'] for job in report['jobs']):
+        sys.exit(1)
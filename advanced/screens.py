@@ -0,0 +1,85 @@
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+APP_ID = "com.appcard.androidterminal:id/"
+MAIN_ACTIVITY = ".ui.MainActivity"
+OUTSIDE_APP = 'outside_app'
+
+
+class UnexpectedScreenError(Exception):
+    """Raised as soon as the terminal shows a known screen other than the one the flow expects."""
+
+    def __init__(self, expected, actual):
+        super().__init__(f"Expected the {' or '.join(expected)} screen but the terminal is on the {actual} screen")
+        self.expected = expected
+        self.actual = actual
+
+
+class Screen:
+    """
+    One terminal screen and its fingerprint: resource ids and exact texts that must all be present,
+    and resource ids that must be absent. A screen matches a snapshot when its whole fingerprint does.
+    """
+
+    def __init__(self, name, ids=(), texts=(), absent_ids=(), activity=MAIN_ACTIVITY):
+        self.name = name
+        self.ids = tuple(ids)
+        self.texts = tuple(texts)
+        self.absent_ids = tuple(absent_ids)
+        self.activity = activity
+
+    @property
+    def specificity(self):
+        return len(self.ids) + len(self.texts) + len(self.absent_ids)
+
+    def matches(self, snapshot):
+        return (all(snapshot.has_id(resource_id) for resource_id in self.ids)
+                and all(snapshot.find_by_text(text) for text in self.texts)
+                and not any(snapshot.has_id(resource_id) for resource_id in self.absent_ids))
+
+    def __repr__(self):
+        return f"Screen({self.name})"
+
+
+class ScreenRegistry:
+    """Classifies the current screen from one hierarchy snapshot, or from the activity alone when that is enough."""
+
+    def __init__(self, screens):
+        # Most specific fingerprint first, so a screen that refines another one wins
+        self.screens = sorted(screens, key=lambda screen: -screen.specificity)
+        self.by_name = {screen.name: screen for screen in screens}
+
+    def classify(self, snapshot):
+        """Returns the name of the screen the snapshot shows, or None if no fingerprint matches."""
+        for screen in self.screens:
+            if screen.matches(snapshot):
+                return screen.name
+        return None
+
+    def classify_activity(self, activity):
+        """
+        Returns a screen name from the foreground activity alone: OUTSIDE_APP when no registered
+        screen lives in that activity, the screen's name when only one does, and None when a
+        hierarchy snapshot is needed to tell the screens apart.
+        """
+        activity = (activity or '').split('/')[-1]
+        names = [screen.name for screen in self.screens
+                 if activity and (screen.activity.endswith(activity) or activity.endswith(screen.activity))]
+        if not names:
+            return OUTSIDE_APP
+        return names[0] if len(names) == 1 else None
+
+
+_KEYPAD_TEXTS = ('OK', '0', '1', '9')
+
+APPCARD_SCREENS = ScreenRegistry([
+    Screen('welcome', ids=[APP_ID + 'activity_main_header', APP_ID + 'view_welcome_phone_number_empty',
+                           APP_ID + 'tv_terms', APP_ID + 'tv_privacy_policy']),
+    # The keypad with a number being typed: the empty-number prompt is gone
+    Screen('keypad', ids=[APP_ID + 'activity_main_header'], texts=_KEYPAD_TEXTS,
+           absent_ids=[APP_ID + 'view_welcome_phone_number_empty']),
+    Screen('confirm', texts=['Confirm'], absent_ids=[APP_ID + 'view_email_confirm', APP_ID + 'tvConfirm']),
+    Screen('email', ids=[APP_ID + 'view_email_confirm']),
+    Screen('name', ids=[APP_ID + 'tvConfirm']),
+    Screen('featured_clip', ids=[APP_ID + 'view_featured_clip']),
+])
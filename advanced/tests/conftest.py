@@ -0,0 +1,29 @@
+import sys
+import pytest
+import os
+
+# The scripts import each other by module name, as when run from advanced/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from device_actions import DeviceActions  # noqa: E402
+from fake_appium_server import FakeAppiumServer  # noqa: E402
+from main import build_capabilities  # noqa: E402
+
+
+@pytest.fixture
+def fake_server():
+    with FakeAppiumServer() as server:
+        yield server
+
+
+@pytest.fixture
+def capabilities():
+    return build_capabilities()
+
+
+@pytest.fixture
+def device_actions(fake_server, capabilities):
+    device_actions = DeviceActions(fake_server.url)
+    device_actions.connect(capabilities)
+    yield device_actions
+    device_actions.quit()
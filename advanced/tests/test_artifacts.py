@@ -0,0 +1,85 @@
+import gzip
+import json
+import pytest
+from artifacts import ArtifactRecorder
+import os
+
+
+def read_gzip(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+
+def recorder_for(device_actions, tmp_path, **kwargs):
+    recorder = ArtifactRecorder(run_id='run-1', output_dir=str(tmp_path), **kwargs)
+    recorder.attach(device_actions)
+    recorder.note(phone='4130800001', device='emulator-5554')
+    return recorder
+
+
+def test_a_failing_step_saves_the_screen_the_log_and_the_commands(fake_server, device_actions, tmp_path):
+    recorder = recorder_for(device_actions, tmp_path)
+    device = fake_server.device
+    with pytest.raises(Exception, match='no Confirm'):
+        with recorder.step('Click Confirm Button'):
+            device_actions.is_text_present('Esp')
+            with device.lock:
+                device.phone = '4130800001'
+                device._show('confirm', delay=0)
+            raise Exception('no Confirm on screen')
+    assert recorder.close() == [str(tmp_path / 'run-1' / '01-click-confirm-button')]
+    directory = recorder.captures[0]
+    assert sorted(os.listdir(directory)) == ['context.json.gz', 'logcat.txt.gz', 'page_source.xml.gz', 'screenshot.png']
+    with open(os.path.join(directory, 'screenshot.png'), 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+    assert 'Is 4130800001 correct?' in read_gzip(os.path.join(directory, 'page_source.xml.gz'))
+    # The logcat since the first buffered command: the screen change, not the app's start
+    logcat = read_gzip(os.path.join(directory, 'logcat.txt.gz'))
+    assert 'moveto RESUMED' in logcat and 'ActivityTaskManager' not in logcat
+    context = json.loads(read_gzip(os.path.join(directory, 'context.json.gz')))
+    assert context['step'] == 'Click Confirm Button' and context['screen'] == 'confirm'
+    assert context['error'] == 'Exception: no Confirm on screen' and 'raise Exception' in context['traceback']
+    assert context['state'] == {'phone': '4130800001', 'device': 'emulator-5554', 'step': 'Click Confirm Button'}
+    assert context['capture_failures'] == {}
+    assert [command['command'] for command in context['commands']] == ['findElement', 'isElementDisplayed']
+    assert context['commands'][0]['params']['value'] == 'new UiSelector().textContains("Esp")'
+    assert recorder.state['step'] is None
+
+
+def test_a_passing_step_writes_nothing(fake_server, device_actions, tmp_path):
+    recorder = recorder_for(device_actions, tmp_path)
+    with recorder.step('Welcome Screen Validation'):
+        device_actions.is_text_present('Esp')
+    assert recorder.close() == []
+    assert os.listdir(tmp_path) == []
+    assert [entry[1] for entry in recorder.commands] == ['findElement', 'isElementDisplayed']
+
+
+def test_a_failure_in_nested_steps_is_captured_once(device_actions, tmp_path):
+    recorder = recorder_for(device_actions, tmp_path)
+    with pytest.raises(ValueError):
+        with recorder.step('Enrollment'):
+            with recorder.step('Enter Email Address'):
+                raise ValueError('bad email')
+    assert [os.path.basename(directory) for directory in recorder.close()] == ['01-enter-email-address']
+
+
+def test_only_the_last_commands_are_kept(fake_server, device_actions, tmp_path):
+    recorder = recorder_for(device_actions, tmp_path, capacity=3)
+    for _ in range(5):
+        device_actions.driver.get_window_rect()
+    device_actions.driver.page_source
+    recorder.capture('Manual')
+    context = json.loads(read_gzip(os.path.join(recorder.close()[0], 'context.json.gz')))
+    assert [command['command'] for command in context['commands']] == ['getWindowRect', 'getWindowRect', 'getPageSource']
+
+
+def test_a_capture_that_fails_is_noted_and_the_others_are_written(fake_server, device_actions, tmp_path):
+    recorder = recorder_for(device_actions, tmp_path)
+    fake_server.fail_next('screenshot', error='unknown error')
+    recorder.capture('Click OK Button', Exception('stuck'))
+    directory = recorder.close()[0]
+    assert 'screenshot.png' not in os.listdir(directory)
+    context = json.loads(read_gzip(os.path.join(directory, 'context.json.gz')))
+    assert context['capture_failures']['screenshot'].startswith('WebDriverException')
+    assert context['screen'] == 'welcome'
@@ -0,0 +1,74 @@
+import itertools
+import pytest
+import batch_enroll
+from batch_enroll import WelcomeNavigator, parse_phone_numbers
+
+
+def test_listed_and_ranged_numbers_are_taken_as_given():
+    assert parse_phone_numbers(phones=' 4130600001, 4130600002,,') == ['4130600001', '4130600002']
+    assert parse_phone_numbers(number_range='4130600009-4130600011') == ['4130600009', '4130600010', '4130600011']
+    assert parse_phone_numbers(number_range='4130600005-4130600005') == ['4130600005']
+    with pytest.raises(ValueError, match='Empty phone number range'):
+        parse_phone_numbers(number_range='4130600011-4130600009')
+    with pytest.raises(ValueError, match='--phones, --range or --count'):
+        parse_phone_numbers()
+
+
+def test_counted_numbers_are_allocated_as_they_are_used(monkeypatch):
+    allocated = []
+    phones = itertools.count(4130600101)
+
+    def allocate():
+        allocated.append(str(next(phones)))
+        return allocated[-1]
+
+    monkeypatch.setattr(batch_enroll, 'get_and_update_phone_number', allocate)
+    numbers = parse_phone_numbers(count='3')
+    assert allocated == []
+    assert next(numbers) == '4130600101' and allocated == ['4130600101']
+    assert list(numbers) == ['4130600102', '4130600103']
+
+
+def test_nothing_is_done_on_the_welcome_screen(fake_server, device_actions, capabilities):
+    navigator = WelcomeNavigator(device_actions, capabilities)
+    fake_server.reset_stats()
+    assert navigator.return_to_welcome() == 'none'
+    assert fake_server.command_counts['back'] == 0
+    assert navigator.stats == {'none': 1}
+
+
+def test_back_presses_walk_back_to_welcome(fake_server, device_actions, capabilities):
+    fake_server.device.reset('name', first_name='Oren')
+    device_actions.invalidate_snapshot()
+    navigator = WelcomeNavigator(device_actions, capabilities)
+    fake_server.reset_stats()
+    assert navigator.return_to_welcome() == 'back'
+    # name -> email -> confirm -> welcome, without relaunching the app
+    assert fake_server.command_counts['back'] == 3
+    assert fake_server.device.screen == 'welcome' and fake_server.device.fields == {}
+    assert navigator.learned == {'name': 'back'}
+
+
+def test_a_rung_that_fails_is_skipped_the_next_time(fake_server, device_actions, capabilities, monkeypatch):
+    # Two presses are not enough to leave the name screen
+    monkeypatch.setattr(batch_enroll, 'MAX_BACK_PRESSES', 2)
+    navigator = WelcomeNavigator(device_actions, capabilities)
+    for _ in range(2):
+        fake_server.device.reset('name')
+        device_actions.invalidate_snapshot()
+        fake_server.reset_stats()
+        assert navigator.return_to_welcome() == 'restart'
+        assert fake_server.device.screen == 'welcome'
+    assert fake_server.command_counts['back'] == 0
+    assert navigator.learned == {'name': 'restart'}
+    assert navigator.stats == {'restart': 2}
+
+
+def test_the_app_is_brought_back_to_the_front(fake_server, device_actions, capabilities):
+    fake_server.device.terminate()
+    device_actions.invalidate_snapshot()
+    navigator = WelcomeNavigator(device_actions, capabilities)
+    fake_server.reset_stats()
+    assert navigator.return_to_welcome() == 'activate'
+    assert fake_server.command_counts['back'] == 0
+    assert fake_server.device.running and fake_server.device.screen == 'welcome'
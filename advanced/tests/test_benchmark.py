@@ -0,0 +1,12 @@
+from benchmark import METHOD_CASES, benchmark_flow, benchmark_methods
+
+
+def test_every_method_case_runs_on_the_fake_server(fake_server):
+    results = benchmark_methods(fake_server, runs=1)
+    assert list(results) == [name for name, _, _ in METHOD_CASES]
+    assert all(stats['commands'] > 0 for stats in results.values())
+
+
+def test_flow_benchmark_measures_the_main_flow(fake_server):
+    results = benchmark_flow(fake_server, runs=1)
+    assert results['Total']['commands'] == sum(stats['commands'] for name, stats in results.items() if name != 'Total')
@@ -0,0 +1,148 @@
+import subprocess
+import sys
+import threading
+import pytest
+from checkpoint import Checkpoint, CheckpointLocked, FlowStep, ResumeError, resume_index
+from main import run_enrollment_flow
+import checkpoint as checkpoint_module
+import os
+
+
+def test_a_second_run_on_the_same_key_is_refused(tmp_path):
+    first = Checkpoint.load('emulator-5554', directory=tmp_path)
+    first.data['phone'] = '4130600001'
+    first.complete('App Load')
+    with pytest.raises(CheckpointLocked):
+        Checkpoint.load('emulator-5554', directory=tmp_path)
+    first.release()
+    second = Checkpoint.load('emulator-5554', directory=tmp_path)
+    assert second.data['phone'] == '4130600001' and second.completed == ['App Load']
+    second.release()
+
+
+def test_concurrent_runs_on_the_same_key_get_one_lock(tmp_path):
+    barrier = threading.Barrier(8)
+    outcomes = []
+
+    def run(index):
+        barrier.wait()
+        try:
+            checkpoint = Checkpoint.load('emulator-5554', directory=tmp_path)
+        except CheckpointLocked:
+            outcomes.append('locked')
+            barrier.wait()
+            return
+        checkpoint.data['phone'] = f"41306{index:05d}"
+        checkpoint.complete('App Load')
+        outcomes.append(checkpoint.data['phone'])
+        # Held until every thread has tried
+        barrier.wait()
+        checkpoint.release()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    winners = [outcome for outcome in outcomes if outcome != 'locked']
+    assert len(winners) == 1
+    assert Checkpoint.load('emulator-5554', directory=tmp_path).data['phone'] == winners[0]
+
+
+def test_the_lock_of_a_dead_process_is_taken_over(tmp_path):
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    checkpoint = Checkpoint('emulator-5554', directory=tmp_path)
+    with open(checkpoint.lock_path, 'w') as f:
+        f.write(f"{dead.pid} 0000")
+    checkpoint.lock()
+    with open(checkpoint.lock_path) as f:
+        assert f.read().split()[0] == str(os.getpid())
+    checkpoint.clear()
+    assert os.listdir(tmp_path) == []
+
+
+def test_concurrent_takeovers_of_a_dead_lock_have_one_winner(tmp_path):
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    with open(Checkpoint('emulator-5554', directory=tmp_path).lock_path, 'w') as f:
+        f.write(f"{dead.pid} 0000")
+    barrier = threading.Barrier(8)
+    winners = []
+
+    def take_over():
+        checkpoint = Checkpoint('emulator-5554', directory=tmp_path)
+        barrier.wait()
+        try:
+            winners.append(checkpoint.lock())
+        except CheckpointLocked:
+            pass
+
+    threads = [threading.Thread(target=take_over) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(winners) == 1
+    with open(winners[0].lock_path) as f:
+        assert f.read() == winners[0]._owner
+
+
+def test_a_lock_another_run_took_over_first_is_left_to_it(tmp_path, monkeypatch):
+    checkpoint = Checkpoint('emulator-5554', directory=tmp_path)
+    with open(checkpoint.lock_path, 'w') as f:
+        f.write("999999 dead")
+    other_run = f"{os.getpid()} other"
+
+    def other_run_takes_over_meanwhile(pid):
+        # Between this run reading the dead lock and moving it, another run replaces it with its own
+        if pid == 999999:
+            os.remove(checkpoint.lock_path)
+            with open(checkpoint.lock_path, 'w') as f:
+                f.write(other_run)
+            return False
+        return True
+
+    monkeypatch.setattr(checkpoint_module, 'pid_alive', other_run_takes_over_meanwhile)
+    with pytest.raises(CheckpointLocked):
+        checkpoint.lock()
+    with open(checkpoint.lock_path) as f:
+        assert f.read() == other_run
+    assert os.listdir(tmp_path) == [os.path.basename(checkpoint.lock_path)]
+
+
+def test_memory_only_checkpoints_write_nothing():
+    checkpoint = Checkpoint('emulator-5554', directory=None)
+    checkpoint.data['phone'] = '4130600002'
+    checkpoint.complete('App Load')
+    checkpoint.clear()
+    assert checkpoint.path is None and checkpoint.completed == []
+
+
+def test_the_flow_saves_nothing_without_a_checkpoint(fake_server, device_actions, capabilities, monkeypatch):
+    saved = []
+    monkeypatch.setattr(checkpoint_module.Checkpoint, 'save',
+                        lambda self: saved.append(self.path) if self.path else None)
+    run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: '4130600003')
+    assert fake_server.device.screen == 'featured' and saved == []
+
+
+def test_a_given_checkpoint_is_saved_and_released(fake_server, device_actions, capabilities, tmp_path):
+    checkpoint = Checkpoint.load('emulator-5554', directory=tmp_path)
+    fake_server.fail_next('click', error='no such element')
+    run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: '4130600004',
+                        checkpoint=checkpoint)
+    assert fake_server.device.fields['email'] == 'orena+4130600004@appcard.com'
+    # Finished: the progress is forgotten and the next run can take the key
+    assert os.listdir(tmp_path) == []
+
+
+def test_resume_index_skips_a_step_whose_effect_landed():
+    steps = [FlowStep('Enter', None, screens=['welcome']), FlowStep('OK', None, screens=['keypad']),
+             FlowStep('Confirm', None, screens=['confirm'])]
+    checkpoint = Checkpoint('emulator-5554', directory=None)
+    checkpoint.completed = ['Enter']
+    assert resume_index(steps, checkpoint, 'keypad', None) == 1
+    assert resume_index(steps, checkpoint, 'confirm', None) == 2
+    with pytest.raises(ResumeError):
+        resume_index(steps, checkpoint, 'welcome', None)
@@ -0,0 +1,54 @@
+from appium.webdriver.common.appiumby import AppiumBy
+from device_actions import locators_for
+from main import EMAIL_CONFIRM_ID
+from screens import APP_ID
+from wait_conditions import element_clickable
+
+EMAIL_FIELD_ID = APP_ID + 'et_email'
+
+
+def app_changes(device, screen=None, **fields):
+    """The app updates the screen by itself, without DeviceActions taking part."""
+    with device.lock:
+        device.fields.update(fields)
+        if screen:
+            device._show(screen, delay=0)
+        else:
+            device._build()
+
+
+def test_a_wait_hands_its_element_to_the_next_action(fake_server, device_actions):
+    fake_server.device.reset('email', email='orena+4130@appcard.com')
+    device_actions.wait_for(element_clickable((AppiumBy.ID, EMAIL_CONFIRM_ID)))
+    fake_server.reset_stats()
+    device_actions.click_by_id_or_text(resource_id=EMAIL_CONFIRM_ID)
+    assert fake_server.device.screen == 'name'
+    # Neither looked up again nor asked whether it is clickable
+    assert sum(count for command, count in fake_server.command_counts.items() if command.startswith('find_element')) == 0
+    assert fake_server.command_counts['element_enabled'] == 0
+    assert device_actions.element_cache.stats['hits'] == 1
+
+
+def test_validations_read_what_the_screen_shows_now(fake_server, device_actions):
+    fake_server.device.reset('email')
+    assert device_actions.locate(locators_for(AppiumBy.ID, EMAIL_FIELD_ID), 'email field').text == 'Enter E-mail Address'
+    app_changes(fake_server.device, email='orena+4130@appcard.com')
+    device_actions.wait_for_element_and_click(AppiumBy.ID, EMAIL_FIELD_ID, expected_text='orena+4130@appcard.com')
+
+
+def test_every_wait_poll_drops_what_was_cached_before_it(fake_server, device_actions):
+    fake_server.device.reset('email')
+    candidates = locators_for(AppiumBy.ID, EMAIL_CONFIRM_ID)
+    assert not device_actions.locate(candidates, 'email confirm').is_enabled()
+    app_changes(fake_server.device, email='orena+4130@appcard.com')
+    device_actions.expect_screen('email')
+    assert device_actions.element_cache.get(candidates) is None
+    assert device_actions.locate(candidates, 'email confirm', clickable=True).is_enabled()
+
+
+def test_a_stale_handle_is_looked_up_again_for_a_read(fake_server, device_actions):
+    fake_server.device.reset('email')
+    field = device_actions.locate(locators_for(AppiumBy.ID, EMAIL_FIELD_ID), 'email field')
+    app_changes(fake_server.device, screen='email', email='orena+4130@appcard.com')
+    assert field.text == 'orena+4130@appcard.com'
+    assert device_actions.element_cache.stats['stale_recoveries'] == 1
@@ -0,0 +1,115 @@
+import json
+import os
+import pytest
+from checkpoint import Checkpoint
+from device_actions import DeviceActions
+from fake_appium_server import FakeAppiumServer
+from flow_engine import FlowEngine, FlowError
+import phone_allocator
+from main import (
+    EMAIL_CONFIRM_ID, EMAIL_XPATH, ENROLLMENT_FLOW, FIRST_NAME_XPATH, HEADER_REGION, LAST_NAME_XPATH, NAME_CONFIRM_ID,
+    WELCOME_CHECKS, run_enrollment_flow,
+)
+
+
+def flow(*steps, inputs=('phone',)):
+    return {'name': 'test', 'inputs': list(inputs), 'steps': list(steps)}
+
+
+def test_a_flow_file_is_compiled_once_until_it_changes(tmp_path):
+    path = tmp_path / 'ok.json'
+    path.write_text(json.dumps(flow({'name': 'OK', 'action': 'click_button_by_text', 'args': {'text': 'OK'}})))
+    engine = FlowEngine()
+    compiled = engine.load(str(path))
+    assert engine.load(str(path)) is compiled
+    os.utime(path, (0, 0))
+    assert engine.load(str(path)) is not compiled
+    assert FlowEngine.resolve_path('enrollment').endswith(os.path.join('flows', 'enrollment.json'))
+
+
+@pytest.mark.parametrize('step, error', [
+    ({'action': 'no_such_action'}, "unknown action 'no_such_action'"),
+    ({'action': '_find_first'}, "unknown action '_find_first'"),
+    ({'action': 'click_button_by_text', 'args': {'label': 'OK'}}, 'invalid args for click_button_by_text'),
+    ({'action': 'enter_phone_number', 'args': {'phone_number': '{pin}'}}, "undefined placeholders \\['pin'\\]"),
+    ({'action': 'wait_for', 'args': {'condition': {'element_shown': ['id', 'x']}}}, "Unknown condition 'element_shown'"),
+    ({'action': 'is_text_present', 'args': {'text': 'OK'}, 'when': 'sunny'}, "unknown switch 'sunny'"),
+    ({'action': 'expect_screen', 'args': {'expected': 'confirm'}, 'on': {'featured_clip': {'goto': 'OK'}}},
+     "must only give a 'fail' message"),
+    ({'action': 'expect_screen', 'args': {'expected': 'confirm'}, 'on': {'featured_clip': {'fail': '{pin}'}}},
+     "undefined placeholders"),
+    ({'actions': []}, 'has no actions'),
+])
+def test_invalid_steps_are_rejected_when_the_flow_is_loaded(step, error):
+    with pytest.raises(FlowError, match=error):
+        FlowEngine().compile(flow(dict(step, name='Bad')))
+
+
+def test_a_run_needs_every_declared_input(device_actions):
+    compiled = FlowEngine().compile(flow({'action': 'is_text_present', 'args': {'text': 'Esp'}}))
+    with pytest.raises(FlowError, match='missing inputs: phone'):
+        FlowEngine().run(compiled, device_actions, {})
+
+
+def test_switched_off_actions_are_skipped(fake_server, device_actions):
+    compiled = FlowEngine().compile(flow({'name': 'Header', 'actions': [
+        {'action': 'is_text_present', 'args': {'text': 'Esp'}, 'expect': True},
+        {'action': 'validate_visual', 'args': {'regions': [{'name': 'header', 'reference': 'header.png'}]},
+         'when': 'visual'},
+    ]}))
+    fake_server.reset_stats()
+    action_results = {}
+    FlowEngine().run(compiled, device_actions, {'phone': '4130'}, action_results)
+    assert action_results == {'Header': '✅ Success'}
+    assert fake_server.command_counts['screenshot'] == 0
+
+
+def test_an_enrolled_number_ends_the_flow_on_the_featured_clip_branch(capabilities):
+    with FakeAppiumServer(known_phones=['4130800001']) as server:
+        device_actions = DeviceActions(server.url)
+        device_actions.connect(capabilities)
+        action_results = {}
+        try:
+            with pytest.raises(Exception, match='4130800001 is already enrolled'):
+                FlowEngine().run(ENROLLMENT_FLOW, device_actions, phone_allocator.TestIdentity('4130800001').as_dict(), action_results)
+        finally:
+            device_actions.quit()
+    assert action_results['Click OK Button'] == '❌ Failure'
+    assert 'Click Confirm Button' not in action_results
+
+
+def test_main_runs_the_enrollment_flow_file(fake_server, device_actions, capabilities):
+    action_results = {}
+    identity = run_enrollment_flow(device_actions, capabilities, action_results,
+                                   phone_number_provider=lambda: '4130800002')
+    assert list(action_results) == [result for step in ENROLLMENT_FLOW.steps for result in step.results]
+    assert fake_server.device.screen == 'featured'
+    assert fake_server.device.fields['last_name'] == identity.last_name
+
+
+def test_main_resumes_after_a_step_whose_done_check_holds(fake_server, device_actions, capabilities):
+    # The number was typed but the run stopped before its step was checkpointed
+    fake_server.device.reset('welcome', phone='4130800003')
+    device_actions.invalidate_snapshot()
+    checkpoint = Checkpoint('test-device', directory=None)
+    checkpoint.data['phone'] = '4130800003'
+    checkpoint.completed = ['App Load', 'Welcome Screen Validation']
+    action_results = {}
+    run_enrollment_flow(device_actions, capabilities, action_results, checkpoint=checkpoint)
+    assert 'Resumed at Click OK Button' in action_results
+    assert fake_server.device.phone == '4130800003'
+    assert fake_server.device.screen == 'featured'
+
+
+def test_main_constants_match_the_flow_file():
+    steps = {step.name: step for step in ENROLLMENT_FLOW.steps}
+    welcome = steps['Welcome Screen Validation']
+    checks, regions = (action.args[arg] for action, arg in zip(welcome.actions, ('checks', 'regions')))
+    assert dict(zip(welcome.results, map(tuple, checks))) == WELCOME_CHECKS
+    assert [(region.name, region.reference_path) for region in regions] == \
+        [(HEADER_REGION.name, HEADER_REGION.reference_path)]
+    args = [action.args for step in ENROLLMENT_FLOW.steps for action in step.actions]
+    xpaths = {arg['xpath'] for arg in args if 'xpath' in arg}
+    assert xpaths == {EMAIL_XPATH, FIRST_NAME_XPATH, LAST_NAME_XPATH}
+    resource_ids = {arg['resource_id'] for arg in args if 'resource_id' in arg}
+    assert resource_ids == {EMAIL_CONFIRM_ID, NAME_CONFIRM_ID}
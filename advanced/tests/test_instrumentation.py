@@ -0,0 +1,83 @@
+import csv
+import threading
+from appium_manager import SessionPool
+from instrumentation import CSV_FIELDS, Instrumentation
+from main import run_enrollment_flow
+from trace_recorder import TraceRecorder
+
+
+def test_csv_rows_carry_flow_and_device(tmp_path):
+    instrumentation = Instrumentation(output_dir=str(tmp_path), flow='batch', device='CAA1')
+    with instrumentation.step('Step'):
+        pass
+    instrumentation.write()
+    with open(tmp_path / 'runs.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['flow'] == 'batch'
+    assert rows[0]['device'] == 'CAA1'
+
+
+def test_csv_with_old_columns_is_moved_aside(tmp_path):
+    (tmp_path / 'runs.csv').write_text('run_id,timestamp,kind\nold,2026-01-01,step\n', encoding='utf-8')
+    instrumentation = Instrumentation(output_dir=str(tmp_path))
+    with instrumentation.step('Step'):
+        pass
+    instrumentation.write()
+    with open(tmp_path / 'runs.csv', newline='', encoding='utf-8') as f:
+        assert next(csv.reader(f)) == CSV_FIELDS
+    assert len(list(tmp_path.glob('runs-*.csv'))) == 1
+
+
+def test_connection_step_counts_session_setup(fake_server, capabilities, tmp_path):
+    session_pool = SessionPool(fake_server.url, session_file=str(tmp_path / 'sessions.json'))
+    instrumentation = Instrumentation(output_dir=str(tmp_path))
+    with instrumentation.step('Connection & App Launch'), instrumentation.session_setup(session_pool.appium_url):
+        device_actions = session_pool.acquire(capabilities)
+    try:
+        assert instrumentation.step_summary()[0][2] == fake_server.command_counts['new_session'] == 1
+    finally:
+        device_actions.quit()
+
+
+def test_commands_of_other_hooks_are_not_counted(fake_server, device_actions, capabilities, tmp_path):
+    instrumentation = Instrumentation(output_dir=str(tmp_path))
+    instrumentation.instrument(device_actions)
+    counts = []
+    for recorder in (None, TraceRecorder(device_actions).attach()):
+        fake_server.device.reset()
+        fake_server.reset_stats()
+        counted_before = instrumentation.command_count
+        run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: '4130600001',
+                            instrumentation=instrumentation, trace=recorder)
+        counts.append((instrumentation.command_count - counted_before, fake_server.total_commands()))
+    (plain, plain_sent), (recorded, recorded_sent) = counts
+    assert recorded_sent > plain_sent
+    assert recorded == plain == plain_sent
+
+
+def test_concurrent_calls_are_recorded_per_thread(device_actions, tmp_path):
+    instrumentation = Instrumentation(output_dir=str(tmp_path))
+    instrumentation.instrument(device_actions)
+    barrier = threading.Barrier(2)
+
+    def check():
+        barrier.wait()
+        device_actions.is_session_alive()
+
+    threads = [threading.Thread(target=check) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    calls = [record for record in instrumentation.records if record['kind'] == 'call']
+    assert [record['name'] for record in calls] == ['is_session_alive', 'is_session_alive']
+    assert [record['commands'] for record in calls] == [1, 1]
+
+
+def test_extra_polls_counts_the_polls_after_each_wait_s_first(device_actions, tmp_path):
+    instrumentation = Instrumentation(output_dir=str(tmp_path))
+    instrumentation.instrument(device_actions)
+    assert not device_actions.is_text_present('Not on this screen', timeout=0.5)
+    (record,) = instrumentation.records
+    assert record['extra_polls'] == device_actions.wait_log[-1]['polls'] - 1 > 0
+    assert 'retries' not in record
@@ -0,0 +1,33 @@
+def test_batched_entry_reuses_the_layout_on_the_same_screen(fake_server, device_actions):
+    device_actions.enter_phone_number('4130')
+    assert device_actions._keypad['screen'] == 'welcome'
+    fake_server.device.reset('welcome')
+    device_actions.invalidate_snapshot()
+    fake_server.reset_stats()
+    device_actions.enter_phone_number('4130')
+    assert fake_server.device.phone == '4130'
+    # One dump to classify the screen, one to read the number back; no key lookups
+    assert fake_server.command_counts['page_source'] == 2
+    assert fake_server.command_counts['click'] == 0
+
+
+def test_the_layout_is_read_again_on_another_screen(fake_server, device_actions):
+    device_actions.enter_phone_number('41')
+    # Half a number typed is the keypad screen; its layout is not taken from the welcome screen
+    fake_server.device.move_keypad(1100)
+    device_actions.invalidate_snapshot()
+    device_actions.enter_phone_number('30')
+    assert device_actions._keypad['screen'] == 'keypad'
+    assert fake_server.device.phone == '4130'
+    assert fake_server.command_counts['click'] == 0
+
+
+def test_taps_that_missed_fall_back_to_key_by_key_entry(fake_server, device_actions):
+    device_actions.enter_phone_number('41')
+    fake_server.device.reset('welcome')
+    device_actions.invalidate_snapshot()
+    # Same screen, moved keypad: the cached centers now hit the keys one row up
+    fake_server.device.move_keypad(1100)
+    device_actions.enter_phone_number('4130900001')
+    assert fake_server.device.phone == '4130900001'
+    assert fake_server.command_counts['click'] > 10
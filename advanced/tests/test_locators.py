@@ -0,0 +1,40 @@
+import pytest
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common.exceptions import TimeoutException
+from device_actions import locators_for, text_locators
+
+OK_XPATH = '//android.widget.Button[@text="OK"]'
+
+
+def test_text_locators_match_the_same_views_as_their_xpath():
+    assert text_locators('OK', 'android.widget.Button') == [
+        ('uiautomator', AppiumBy.ANDROID_UIAUTOMATOR, 'new UiSelector().className("android.widget.Button").text("OK")'),
+        ('xpath', AppiumBy.XPATH, OK_XPATH),
+    ]
+    assert text_locators('Say "hi"', contains=True) == [
+        ('uiautomator', AppiumBy.ANDROID_UIAUTOMATOR, 'new UiSelector().textContains("Say \\"hi\\"")'),
+        ('xpath', AppiumBy.XPATH, '//*[contains(@text, "Say "hi"")]'),
+    ]
+
+
+def test_locators_for_rewrites_simple_xpaths_and_keeps_the_original_last():
+    assert locators_for(AppiumBy.XPATH, OK_XPATH) == text_locators('OK', 'android.widget.Button')
+    assert locators_for(AppiumBy.XPATH, "//*[@resource-id='app:id/ok']") == [
+        ('id', AppiumBy.ID, 'app:id/ok'), ('xpath', AppiumBy.XPATH, "//*[@resource-id='app:id/ok']")]
+    assert locators_for(AppiumBy.XPATH, "//*[@content-desc='ok']") == [('xpath', AppiumBy.XPATH, "//*[@content-desc='ok']")]
+    assert locators_for(AppiumBy.ID, 'app:id/ok') == [(AppiumBy.ID, AppiumBy.ID, 'app:id/ok')]
+
+
+def test_waiting_for_a_missing_element_never_dumps_the_hierarchy(fake_server, device_actions):
+    fake_server.reset_stats()
+    with pytest.raises(TimeoutException):
+        device_actions.locate(text_locators('Confirm', 'android.widget.Button'), 'confirm', timeout=0.3)
+    assert fake_server.command_counts['find_element:uiautomator'] > 1
+    assert fake_server.command_counts['find_element:xpath'] == 0
+
+
+def test_xpath_is_the_fallback_for_a_rejected_strategy(fake_server, device_actions):
+    fake_server.fail_next('find_element:uiautomator', error='invalid selector')
+    element = device_actions.locate(locators_for(AppiumBy.XPATH, OK_XPATH), 'ok', timeout=1)
+    assert element.text == 'OK'
+    assert device_actions.locator_stats['ok']['strategy'] == 'xpath'
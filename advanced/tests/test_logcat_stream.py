@@ -0,0 +1,72 @@
+import time
+import pytest
+from selenium.common.exceptions import TimeoutException
+from instrumentation import Instrumentation
+from logcat_stream import AppiumLogcatSource, LogcatStream
+
+NTR_D_RESPONSE = "I/NTR: Msg Resp : 1 2 3 D 4130500001 OK"
+
+
+class BrokenSource:
+    """Yields some lines, then fails the way a dropped adb connection does."""
+
+    def __init__(self, lines=()):
+        self._lines = list(lines)
+
+    def lines(self):
+        yield from self._lines
+        raise OSError("device offline")
+
+    def close(self):
+        pass
+
+
+def dead_stream(lines=()):
+    stream = LogcatStream(BrokenSource(lines)).start()
+    stream._thread.join(timeout=2)
+    assert not stream.alive
+    return stream
+
+
+def test_a_dead_stream_still_returns_buffered_events():
+    stream = dead_stream([NTR_D_RESPONSE])
+    event = stream.wait('ntr_message', since=0, timeout=1)
+    assert event.groups['type'] == 'D'
+    assert isinstance(stream.error, OSError)
+
+
+def test_a_dead_stream_sleeps_out_the_timeout():
+    stream = dead_stream()
+    start = time.monotonic()
+    assert stream.wait('ntr_message', timeout=0.3) is None
+    assert time.monotonic() - start >= 0.3
+
+
+def test_wait_for_polls_on_a_timer_once_the_stream_dies(device_actions, capfd):
+    device_actions.attach_log_stream(dead_stream())
+    polls = []
+    with pytest.raises(TimeoutException):
+        device_actions.wait_for(lambda driver: polls.append(1), timeout=1.5)
+    # Backing off from 50 ms to 1 s; not a spin on the dead stream
+    assert len(polls) < 15
+    assert capfd.readouterr().out.count("Logcat stream stopped") == 1
+
+
+def test_appium_reads_are_counted_and_back_off_while_the_log_is_quiet(fake_server, device_actions, tmp_path):
+    instrumentation = Instrumentation(output_dir=str(tmp_path))
+    instrumentation.instrument(device_actions)
+    device_actions.is_text_present('Esp')
+    fake_server.device.drain_logcat()
+    source = AppiumLogcatSource(device_actions.driver, interval=0.05, max_interval=0.4)
+    commands_before = instrumentation.command_count
+    stream = LogcatStream(source).start()
+    try:
+        time.sleep(1.5)
+        # Without backing off a 50 ms interval would read 30 times
+        assert 4 <= source.stats['polls'] < 12
+        fake_server.device.log(NTR_D_RESPONSE)
+        assert stream.wait('ntr_message', since=0, timeout=1).groups['type'] == 'D'
+    finally:
+        stream.stop()
+    reads = fake_server.command_counts['get_log']
+    assert instrumentation.command_count - commands_before == reads == source.stats['polls']
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+import ntr_log
+from ntr_log import LogTimeIndex, NtrLogCursor, latency_report, pair_messages, parse_line, read_messages
+
+LINE = ("{time}   INFO  c.s.e.m.util.MessagesHelper:49   Msg {direction} : 54  1 {txn} {type} 1   "
+        "\\ {value} \\ 0 \\ Oren1 QA King \\  \\")
+
+
+def line(time, direction, txn, msg_type, value='40001504922'):
+    return LINE.format(time=time, direction=direction, txn=txn, type=msg_type, value=value)
+
+
+def write_log(path, lines, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        f.writelines(text + '\n' for text in lines)
+
+
+def test_parse_line_reads_a_message_and_skips_other_lines():
+    message = parse_line(line('2025-08-28 11:38:19.931', 'Resp', 7645, 'D'), offset=12)
+    assert (message.direction, message.txn, message.msg_type, message.offset) == ('Resp', 7645, 'D', 12)
+    assert message.fields == ['40001504922', '0', 'Oren1 QA King']
+    assert not message.is_request and message.mentions('4000150')
+    assert parse_line("2025-08-28 11:38:19.931   INFO  c.s.e.m.Main:12   Started") is None
+
+
+def test_read_messages_resumes_from_a_line_offset(tmp_path):
+    path = tmp_path / 'mids.txt'
+    write_log(path, [line('2025-08-28 11:38:18.775', 'Req', 1, 'A'), "not a message",
+                     line('2025-08-28 11:38:19.931', 'Resp', 1, 'D')])
+    messages = list(read_messages(path))
+    assert [message.msg_type for message in messages] == ['A', 'D']
+    assert [message.msg_type for message in read_messages(path, messages[1].offset)] == ['D']
+
+
+def test_pair_messages_matches_lookups_and_reports_unanswered_requests():
+    messages = [parse_line(text) for text in (
+        line('2025-08-28 11:38:18.775', 'Req', 1, 'A'),
+        line('2025-08-28 11:38:18.800', 'Req', 2, 'I'),
+        line('2025-08-28 11:38:19.931', 'Resp', 1, 'D'),
+        line('2025-08-28 11:45:00.000', 'Req', 3, 'I'),
+    )]
+    exchanges = list(pair_messages(messages, max_pending_age=300))
+    answered, stale, open_request = exchanges
+    assert answered.request.txn == 1 and answered.latency_ms == pytest.approx(1156)
+    # The txn 2 request is dropped unanswered once a message more than max_pending_age later arrives
+    assert stale.request.txn == 2 and stale.response is None
+    assert open_request.request.txn == 3 and open_request.latency_ms is None
+    report = latency_report(exchanges)
+    assert report['A -> D']['count'] == 1 and report['A -> D']['p50'] == pytest.approx(1156)
+    assert report['I -> ?'] == {'count': 2, 'unpaired': 2, 'p50': None, 'p95': None}
+
+
+def test_log_time_index_finds_messages_in_a_window(tmp_path):
+    path = tmp_path / 'mids.txt'
+    write_log(path, [line(f'2025-08-28 11:{minute:02d}:00.000', 'Req', minute, 'I') for minute in range(60)])
+    index = LogTimeIndex(path, every=8, max_skew=60.0)
+    assert len(index.times) == 8
+    start, end = parse_line(line('2025-08-28 11:30:00.000', 'Req', 0, 'I')).timestamp, \
+        parse_line(line('2025-08-28 11:33:00.000', 'Req', 0, 'I')).timestamp
+    assert [message.txn for message in index.messages_between(start, end)] == [30, 31, 32, 33]
+    assert index.offset_for(start) > 0
+
+
+def test_a_cursor_only_sees_messages_logged_after_it_started(tmp_path):
+    path = tmp_path / 'mids.txt'
+    write_log(path, [line('2025-08-28 11:38:18.775', 'Req', 1, 'A'), line('2025-08-28 11:38:19.931', 'Resp', 1, 'D')])
+    cursor = NtrLogCursor(path)
+    with pytest.raises(TimeoutError):
+        cursor.wait_for_response('40001504922', timeout=0.2)
+
+    def terminal_answers():
+        time.sleep(0.2)
+        write_log(path, [line('2025-08-28 11:40:00.000', 'Req', 9, 'A', '4130500001'),
+                         line('2025-08-28 11:40:00.250', 'Resp', 9, 'D', '4130500001')], mode='a')
+
+    writer = threading.Thread(target=terminal_answers)
+    writer.start()
+    exchange = cursor.wait_for_response('4130500001', timeout=5)
+    writer.join()
+    assert exchange.response.txn == 9 and exchange.latency_ms == pytest.approx(250)
+
+
+def test_a_slow_response_fails_the_latency_assertion(tmp_path):
+    path = tmp_path / 'mids.txt'
+    cursor = NtrLogCursor(path)
+    write_log(path, [line('2025-08-28 11:40:00.000', 'Req', 9, 'A'), line('2025-08-28 11:40:07.000', 'Resp', 9, 'D')])
+    with pytest.raises(AssertionError, match='7000 ms'):
+        cursor.wait_for_response('40001504922', within_ms=5000, timeout=1)
+
+
+def test_waiting_reads_each_line_once(tmp_path, monkeypatch):
+    path = tmp_path / 'mids.txt'
+    cursor = NtrLogCursor(path)
+    write_log(path, [line('2025-08-28 11:40:00.000', 'Req', 9, 'A')])
+    offsets = []
+
+    def counting_parse_line(text, offset=None):
+        offsets.append(offset)
+        return parse_line(text, offset)
+
+    monkeypatch.setattr(ntr_log, 'parse_line', counting_parse_line)
+    with pytest.raises(TimeoutError):
+        cursor.wait_for_response('40001504922', timeout=0.5, poll_interval=0.02)
+    # About 25 polls, one read of the line
+    assert offsets == [0]
@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import itertools
+import json
+import subprocess
+import pytest
+import parallel_runner
+from async_device_actions import AsyncDeviceActions
+from fake_appium_server import FakeAppiumServer
+from instrumentation import Instrumentation
+from main import ENROLLMENT_STEPS, run_enrollment_flow
+from parallel_runner import ASYNC_ENROLLMENT_STEPS, discover_devices, run_enrollment_flow_async, run_parallel
+from retry import FlakeDB
+
+ADB_DEVICES = """List of devices attached
+emulator-5554\tdevice
+R58M21XYZ\tunauthorized
+emulator-5556\tdevice
+0123456789ABCDEF\toffline
+
+"""
+
+
+def run_async_flow(server, capabilities, phone):
+    async def run():
+        device_actions = AsyncDeviceActions(server.url)
+        await device_actions.connect(capabilities)
+        action_results = {}
+        try:
+            identity = await run_enrollment_flow_async(device_actions, capabilities, action_results,
+                                                       phone_number_provider=lambda: phone)
+        finally:
+            await device_actions.quit()
+        return identity, action_results
+
+    return asyncio.run(run())
+
+
+def test_every_enrollment_step_has_an_async_version():
+    assert list(ASYNC_ENROLLMENT_STEPS) == [flow_step.name for flow_step in ENROLLMENT_STEPS]
+
+
+def test_async_flow_reports_the_same_steps_as_the_sync_flow(fake_server, device_actions, capabilities):
+    sync_results = {}
+    run_enrollment_flow(device_actions, capabilities, sync_results, phone_number_provider=lambda: '4130700001')
+    fake_server.device.reset()
+    identity, async_results = run_async_flow(fake_server, capabilities, '4130700002')
+    assert list(async_results) == list(sync_results)
+    assert fake_server.device.screen == 'featured'
+    assert fake_server.device.fields['email'] == identity.email
+
+
+def test_async_flow_stops_at_ok_for_an_enrolled_number(capabilities):
+    with FakeAppiumServer(known_phones=['4130700003']) as server:
+        with pytest.raises(Exception, match='already enrolled'):
+            run_async_flow(server, capabilities, '4130700003')
+        # Only the OK button was clicked; the flow did not wait for a Confirm button
+        assert server.command_counts['click'] == 1
+
+
+def test_ready_adb_devices_get_consecutive_ports(monkeypatch):
+    def adb(command, **kwargs):
+        assert command == ['adb', 'devices']
+        return subprocess.CompletedProcess(command, 0, stdout=ADB_DEVICES)
+
+    monkeypatch.setattr(parallel_runner.subprocess, 'run', adb)
+    assert discover_devices() == [
+        {'udid': 'emulator-5554', 'port': 4723, 'system_port': 8200},
+        {'udid': 'emulator-5556', 'port': 4724, 'system_port': 8201},
+    ]
+
+
+def test_configured_ports_are_kept_and_missing_ones_follow_the_position(tmp_path):
+    config = tmp_path / 'devices.json'
+    config.write_text(json.dumps([{'udid': 'CAA25040001', 'port': 4800, 'system_port': 8300},
+                                  {'udid': 'CAA25040002'}]))
+    assert discover_devices(str(config)) == [
+        {'udid': 'CAA25040001', 'port': 4800, 'system_port': 8300},
+        {'udid': 'CAA25040002', 'port': 4724, 'system_port': 8201},
+    ]
+
+
+def test_each_device_runs_on_its_own_server_and_system_port(tmp_path, monkeypatch):
+    phones = itertools.count(4130700101)
+    monkeypatch.setattr(parallel_runner, 'get_and_update_phone_number', lambda: str(next(phones)))
+    monkeypatch.setattr(parallel_runner, 'Instrumentation', functools.partial(Instrumentation, output_dir=str(tmp_path)))
+    monkeypatch.setattr(parallel_runner, 'FlakeDB', lambda: FlakeDB(str(tmp_path / 'flakes.sqlite')))
+    with FakeAppiumServer() as first, FakeAppiumServer() as second:
+        sessions = {}
+        for server in (first, second):
+            def new_session(body, server=server, original=server.new_session):
+                sessions[server.port] = body['capabilities']['alwaysMatch']
+                return original(body)
+
+            monkeypatch.setattr(server, 'new_session', new_session)
+        config = tmp_path / 'devices.json'
+        config.write_text(json.dumps([{'udid': 'emulator-5554', 'port': first.port, 'system_port': 8200},
+                                      {'udid': 'emulator-5556', 'port': second.port, 'system_port': 8201}]))
+        results = run_parallel(discover_devices(str(config)))
+        assert [result['error'] for result in results] == [None, None]
+        assert first.device.screen == second.device.screen == 'featured'
+    assert {port: (capabilities['appium:udid'], capabilities['appium:systemPort'])
+            for port, capabilities in sessions.items()} == {first.port: ('emulator-5554', 8200),
+                                                            second.port: ('emulator-5556', 8201)}
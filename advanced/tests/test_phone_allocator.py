@@ -0,0 +1,80 @@
+import subprocess
+import sys
+import threading
+from phone_allocator import PhoneAllocator
+import os
+
+ADVANCED_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def allocate_in_process(directory, count, close=True):
+    """Allocates count numbers in a separate process and returns them; without close it exits like a crash."""
+    script = (f"import os, sys; sys.path.insert(0, {ADVANCED_DIR!r}); from phone_allocator import PhoneAllocator\n"
+              f"allocator = PhoneAllocator({str(directory)!r}, block_size=5, initial=4130100000)\n"
+              f"print(' '.join(allocator.allocate() for _ in range({count})), flush=True)\n"
+              f"{'allocator.close()' if close else 'os._exit(0)'}\n")
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    # The numbers' line; the allocator prints its own notes around it
+    return next(line for line in output.splitlines() if line[:1].isdigit()).split()
+
+
+def test_numbers_follow_the_initial_number(tmp_path):
+    with PhoneAllocator(str(tmp_path), block_size=5, initial=4130100000) as allocator:
+        assert [allocator.allocate() for _ in range(7)] == [str(4130100001 + index) for index in range(7)]
+
+
+def test_threads_never_share_a_number(tmp_path):
+    allocator = PhoneAllocator(str(tmp_path), block_size=5, initial=4130100000)
+    numbers = []
+
+    def allocate():
+        for _ in range(25):
+            numbers.append(allocator.allocate())
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    allocator.close()
+    assert len(numbers) == len(set(numbers)) == 200
+
+
+def test_processes_never_share_a_number(tmp_path):
+    PhoneAllocator(str(tmp_path), block_size=5, initial=4130100000).close()
+    numbers = [number for _ in range(4) for number in allocate_in_process(tmp_path, 7)]
+    assert len(numbers) == len(set(numbers)) == 28
+
+
+def test_closed_and_crashed_blocks_are_picked_up_without_reuse(tmp_path):
+    used = allocate_in_process(tmp_path, 2) + allocate_in_process(tmp_path, 2, close=False)
+    with PhoneAllocator(str(tmp_path), block_size=5, initial=4130100000) as allocator:
+        recovered = [allocator.allocate() for _ in range(6)]
+    assert not set(used) & set(recovered)
+    # What the closed and the crashed run left unused comes back before a new block is claimed
+    assert sorted(recovered) == sorted(str(4130100001 + index) for index in range(10) if str(4130100001 + index) not in used)
+
+
+def test_finished_blocks_are_pruned_and_never_claimed_again(tmp_path):
+    with PhoneAllocator(str(tmp_path), block_size=2, initial=4130100000) as allocator:
+        used = [allocator.allocate() for _ in range(5)]
+    assert sorted(os.listdir(tmp_path)) == ['base', 'block_00000002.claimed', 'block_00000002.free',
+                                            'floor_00000002', 'next_block']
+    # Even with a hint left behind by an older run, the pruned blocks stay used
+    (tmp_path / 'next_block').write_text('0')
+    with PhoneAllocator(str(tmp_path), block_size=2, initial=4130100000) as allocator:
+        more = [allocator.allocate() for _ in range(3)]
+    assert more == ['4130100006', '4130100007', '4130100008']
+    assert not set(used) & set(more)
+
+
+def test_racing_runs_agree_on_the_base(tmp_path):
+    bases = []
+    threads = [threading.Thread(target=lambda initial=initial: bases.append(
+        PhoneAllocator(str(tmp_path), initial=initial).base)) for initial in range(4130100000, 4130100080, 10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(bases)) == 1 and len(bases) == 8
+    assert os.listdir(tmp_path) == ['base']
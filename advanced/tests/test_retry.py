@@ -0,0 +1,100 @@
+import time
+import pytest
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from retry import FlakeDB, NotRetryableError, Retrier, RetryPolicy, classify
+
+NO_WAIT = RetryPolicy(base_delay=0, jitter=0)
+
+
+def failing(*errors, result='done'):
+    """An attempt that raises errors in turn, then returns result."""
+    remaining = list(errors)
+
+    def attempt(progress):
+        if remaining:
+            error = remaining.pop(0)
+            progress['dispatched'] = getattr(error, 'dispatched', False)
+            raise error
+        return result
+    return attempt
+
+
+def dispatched(error):
+    error.dispatched = True
+    return error
+
+
+def test_a_transient_failure_is_retried_and_counted_as_recovered():
+    retrier = Retrier(NO_WAIT)
+    assert retrier.call('tap', 'id:ok', failing(StaleElementReferenceException())) == 'done'
+    assert retrier.stats[('tap', 'id:ok')] == {'calls': 1, 'first_try': 0, 'recovered': 1, 'failed': 0, 'retries': 1}
+
+
+def test_the_budget_is_per_exception_type():
+    retrier = Retrier(NO_WAIT)
+    with pytest.raises(NoSuchElementException):
+        retrier.call('find', 'id:ok', failing(*[NoSuchElementException() for _ in range(3)]))
+    assert retrier.summary() == {'calls': 1, 'retries': 2, 'recovered': 0, 'failed': 1}
+
+
+def test_an_unlisted_exception_is_not_retried():
+    retrier = Retrier(NO_WAIT)
+    with pytest.raises(ValueError):
+        retrier.call('find', 'id:ok', failing(ValueError("bad locator")))
+    assert retrier.summary()['retries'] == 0
+
+
+def test_a_dispatched_action_is_only_repeated_when_it_did_not_land():
+    retrier = Retrier(NO_WAIT)
+    with pytest.raises(NotRetryableError):
+        retrier.call('click', 'id:ok', failing(dispatched(StaleElementReferenceException())))
+    assert retrier.call('click', 'id:ok', failing(dispatched(StaleElementReferenceException())),
+                        already_done=lambda: True) is None
+    assert retrier.call('click', 'id:ok', failing(dispatched(StaleElementReferenceException())),
+                        already_done=lambda: False) == 'done'
+    assert [event['outcome'] for event in retrier.events] == ['already_done', 'retried', 'recovered']
+
+
+def test_flush_accumulates_in_the_flake_db(tmp_path):
+    flake_db = FlakeDB(str(tmp_path / "flakes.sqlite"))
+    for _ in range(2):
+        retrier = Retrier(NO_WAIT, flake_db=flake_db, run_id='run')
+        retrier.call('tap', 'id:ok', failing(StaleElementReferenceException()))
+        retrier.call('tap', 'id:ok', failing())
+        retrier.flush()
+    (row,) = flake_db.report()
+    assert (row['calls'], row['recovered'], row['flake_rate'], row['classification']) == (4, 2, 0.5, 'flaky')
+
+
+def test_classify():
+    assert classify(10, 0, 0) == 'stable'
+    assert classify(8, 2, 1) == 'flaky'
+    assert classify(0, 1, 3) == 'broken'
+
+
+def test_device_actions_retry_an_intercepted_click(fake_server, device_actions):
+    fake_server.device.reset('confirm', phone='4130200001')
+    fake_server.fail_next('click', error='element click intercepted')
+    device_actions.click_by_id_or_text(text="Confirm")
+    assert fake_server.device.screen == 'email'
+    assert device_actions.retrier.summary()['recovered'] == 1
+
+
+def test_a_wait_that_ran_out_is_not_retried(fake_server, device_actions):
+    fake_server.device.reset('confirm', phone='4130200001')
+    fake_server.reset_stats()
+    start = time.monotonic()
+    with pytest.raises(NoSuchElementException):
+        device_actions.click_by_id_or_text(text="Clip it!", timeout=1)
+    assert time.monotonic() - start < 2
+    assert device_actions.retrier.summary() == {'calls': 1, 'retries': 0, 'recovered': 0, 'failed': 1}
+
+
+def test_a_click_that_landed_is_not_sent_again_on_the_next_screen(fake_server, device_actions):
+    # The email screen has a Confirm button too; it must not be clicked by the retry
+    fake_server.device.reset('confirm', phone='4130200001', email='user@example.com')
+    fake_server.fail_next('click', after=True)
+    device_actions.click_by_id_or_text(text="Confirm")
+    assert fake_server.device.screen == 'email'
+    assert fake_server.command_counts['click'] == 1
+    assert [event['outcome'] for event in device_actions.retrier.events] == ['already_done']
@@ -0,0 +1,197 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from selenium.common.exceptions import WebDriverException
+import automation_daemon
+from automation_daemon import AutomationDaemon
+from scheduler import MAX_REQUEUES, DeviceLease, Job, Scheduler, is_device_failure
+
+DEVICES = [{'udid': 'emulator-5554', 'port': 4723, 'system_port': 8200},
+           {'udid': 'emulator-5556', 'port': 4725, 'system_port': 8201}]
+
+
+def passing_runner(device_actions, capabilities, job, action_results, instrumentation=None, artifacts=None):
+    action_results['Ran'] = '✅ Success'
+
+
+def failing_runner(device_actions, capabilities, job, action_results, instrumentation=None, artifacts=None):
+    raise Exception("flow failed")
+
+
+def device_failing_runner(device_actions, capabilities, job, action_results, instrumentation=None, artifacts=None):
+    raise WebDriverException("instrumentation process is not running")
+
+
+@pytest.fixture(autouse=True)
+def offline_leases(monkeypatch):
+    # No Appium servers: devices are "set up" instantly and release writes no reports
+    monkeypatch.setattr(DeviceLease, 'prepare', lambda self, flake_db=None: None)
+    monkeypatch.setattr(DeviceLease, 'release', lambda self: None)
+
+
+def make_scheduler(**kwargs):
+    return Scheduler(DEVICES, runners={'pass': passing_runner, 'fail': failing_runner, 'device': device_failing_runner},
+                     **kwargs)
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def record_events(jobs, events):
+    for job in jobs:
+        job.listener = lambda job, event: events.append((job.id, event))
+
+
+def test_listeners_run_without_the_scheduler_lock():
+    scheduler = make_scheduler()
+    blocked = []
+
+    def listener(job, event):
+        # Another thread must be able to take the lock while a listener runs
+        reader = threading.Thread(target=scheduler.report)
+        reader.start()
+        reader.join(timeout=2)
+        blocked.append(reader.is_alive())
+
+    jobs = [Job('pass') for _ in range(4)]
+    for job in jobs:
+        job.listener = listener
+    scheduler.run(jobs)
+    assert blocked == [False] * 8
+
+
+def test_every_job_gets_started_and_finished_in_order():
+    scheduler = make_scheduler()
+    events = []
+    jobs = [Job('pass'), Job('fail'), Job('pass', device='emulator-5556')]
+    record_events(jobs, events)
+    report = scheduler.run(jobs)
+    for job in jobs:
+        assert [event for job_id, event in events if job_id == job.id] == ['started', 'finished']
+    assert [job['error'] for job in report['jobs']] == [None, 'flow failed', None]
+
+
+def test_jobs_finished_without_running_are_reported(monkeypatch):
+    def prepare(self, flake_db=None):
+        raise Exception("device offline")
+
+    monkeypatch.setattr(DeviceLease, 'prepare', prepare)
+    scheduler = make_scheduler(quarantine_after=MAX_REQUEUES + 2)
+    events = []
+    jobs = [Job('pass'), Job('pass')]
+    record_events(jobs, events)
+    scheduler.run(jobs)
+    # Put back on the other device after each setup failure, then given up or left without a healthy device
+    assert sorted(events) == [(job.id, 'finished') for job in jobs]
+    assert all(job.error for job in jobs)
+
+
+def test_quarantine_finishes_the_queued_jobs():
+    scheduler = make_scheduler(quarantine_after=1)
+    events = []
+    jobs = [Job('device', device='emulator-5554'), Job('device', device='emulator-5556'),
+            Job('pass', device='emulator-5554'), Job('pass', device='emulator-5556')]
+    record_events(jobs, events)
+    scheduler.run(jobs)
+    assert sorted(job_id for job_id, event in events if event == 'finished') == [job.id for job in jobs]
+    assert "No healthy device" in jobs[2].error
+
+
+@pytest.mark.parametrize('error, session_alive, device_failed', [
+    (WebDriverException("socket hang up"), True, True),
+    (Exception("Phone number 4130800001 is already enrolled"), True, False),
+    (Exception("Phone number 4130800001 is already enrolled"), False, True),
+])
+def test_only_driver_errors_and_lost_sessions_are_device_failures(error, session_alive, device_failed):
+    device_actions = SimpleNamespace(is_session_alive=lambda: session_alive)
+    assert is_device_failure(error, device_actions) == device_failed
+
+
+def test_failures_of_the_flow_s_data_do_not_quarantine_a_device():
+    scheduler = make_scheduler(quarantine_after=2)
+    jobs = [Job('fail', device='emulator-5554') for _ in range(3)] + [Job('pass', device='emulator-5554')]
+    report = scheduler.run(jobs)
+    assert [job['error'] for job in report['jobs']] == ['flow failed'] * 3 + [None]
+    assert not report['devices']['emulator-5554']['quarantined']
+
+
+def test_device_failures_in_a_row_quarantine_a_device():
+    scheduler = make_scheduler(quarantine_after=2)
+    jobs = [Job('device', device='emulator-5554'), Job('fail', device='emulator-5554'),
+            Job('device', device='emulator-5554'), Job('pass', device='emulator-5554')]
+    report = scheduler.run(jobs)
+    # The data failure between the two device failures neither counts nor resets the count
+    assert [job['device'] for job in report['jobs']] == ['emulator-5554'] * 3 + [None]
+    assert "No healthy device" in jobs[-1].error
+    assert report['devices']['emulator-5554']['quarantined']
+
+
+def test_a_quarantined_device_takes_jobs_again_once_a_probe_sets_it_up(monkeypatch):
+    broken = []
+    probes = []
+
+    def prepare(self, flake_db=None):
+        if broken:
+            probes.append(self.udid)
+            raise Exception("adb: device offline")
+
+    monkeypatch.setattr(DeviceLease, 'prepare', prepare)
+    scheduler = make_scheduler(quarantine_after=1, probe_interval=0.05).start()
+    lease = scheduler.leases['emulator-5554']
+    try:
+        scheduler.submit(Job('device', device='emulator-5554'))
+        wait_until(lambda: lease.quarantined)
+        broken.append(True)
+        wait_until(lambda: len(probes) >= 2)
+        assert lease.quarantined
+        broken.clear()
+        wait_until(lambda: not lease.quarantined)
+        job = scheduler.submit(Job('pass', device='emulator-5554'))
+    finally:
+        scheduler.close()
+        scheduler.join()
+    assert job.error is None and job.ran_on == 'emulator-5554'
+    assert lease.failures_in_a_row == 0
+
+
+def test_an_idle_device_steals_unpinned_jobs_from_a_busy_one():
+    ran = []
+
+    def counting_runner(device_actions, capabilities, job, action_results, instrumentation=None, artifacts=None):
+        ran.append(job.id)
+
+    def slow_runner(device_actions, capabilities, job, action_results, instrumentation=None, artifacts=None):
+        # Holds its device until the three other jobs ran elsewhere
+        wait_until(lambda: len(ran) == 3)
+
+    scheduler = Scheduler(DEVICES, runners={'slow': slow_runner, 'count': counting_runner})
+    jobs = [Job('slow'), Job('count'), Job('count'), Job('count')]
+    report = scheduler.run(jobs)
+    # Queued round robin: the slow job and the third job on the first device, the others on the second
+    assert [job['device'] for job in report['jobs']] == ['emulator-5554'] + ['emulator-5556'] * 3
+    assert [job['stolen'] for job in report['jobs']] == [False, False, True, False]
+    assert report['devices']['emulator-5556']['stolen'] == 1
+
+
+def test_daemon_stream_ends_when_a_finished_event_is_lost(monkeypatch):
+    monkeypatch.setattr(automation_daemon, 'EVENT_POLL_INTERVAL', 0.05)
+    original_notify = Scheduler._notify
+    monkeypatch.setattr(Scheduler, '_notify',
+                        lambda self, job, event: event == 'finished' or original_notify(self, job, event))
+    daemon = AutomationDaemon(DEVICES)
+    daemon.scheduler.runners = {'pass': passing_runner}
+    daemon.scheduler.start()
+    sent = []
+    try:
+        daemon.handle({'command': 'run', 'jobs': [{'flow': 'pass', 'phones': '4130300001,4130300002'}]}, sent.append)
+    finally:
+        daemon.scheduler.close()
+        daemon.scheduler.join()
+    kinds = [event['event'] for event in sent]
+    assert kinds.count('finished') == 2 and kinds[-1] == 'done'
+    assert sent[-1]['passed'] == 2
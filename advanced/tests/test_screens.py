@@ -0,0 +1,42 @@
+import pytest
+from fake_appium_server import FakeDevice, LAUNCHER_ACTIVITY, MAIN_ACTIVITY
+from screens import APPCARD_SCREENS, OUTSIDE_APP, UnexpectedScreenError
+from ui_snapshot import UiSnapshot
+
+FAKE_SCREENS = [
+    (('welcome', {}), 'welcome'),
+    (('welcome', {'phone': '4130000001'}), 'keypad'),
+    (('confirm', {'phone': '4130000001'}), 'confirm'),
+    (('email', {}), 'email'),
+    (('email', {'email': 'a@b.c'}), 'email'),
+    (('name', {}), 'name'),
+    (('featured', {}), 'featured_clip'),
+    (('loading', {}), None),
+]
+
+
+@pytest.mark.parametrize('state, expected', FAKE_SCREENS)
+def test_every_screen_is_told_apart(state, expected):
+    device = FakeDevice()
+    screen, fields = state
+    device.reset(screen, **fields)
+    assert APPCARD_SCREENS.classify(UiSnapshot(device.page_source())) == expected
+
+
+def test_the_activity_alone_only_tells_inside_from_outside():
+    assert APPCARD_SCREENS.classify_activity(LAUNCHER_ACTIVITY) == OUTSIDE_APP
+    assert APPCARD_SCREENS.classify_activity(f"com.appcard.androidterminal/{MAIN_ACTIVITY}") is None
+
+
+def test_current_screen_takes_one_query(fake_server, device_actions):
+    fake_server.device.reset('confirm', phone='4130000001')
+    fake_server.reset_stats()
+    assert device_actions.current_screen() == 'confirm'
+    assert fake_server.total_commands() == 1
+
+
+def test_expect_screen_fails_fast_on_a_known_other_screen(fake_server, device_actions):
+    fake_server.device.reset('featured')
+    with pytest.raises(UnexpectedScreenError) as error:
+        device_actions.expect_screen('confirm', timeout=5)
+    assert error.value.actual == 'featured_clip'
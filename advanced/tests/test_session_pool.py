@@ -0,0 +1,73 @@
+import json
+import os
+from appium_manager import SESSION_FILE, SessionPool
+
+
+def saved_sessions(path, fake_server):
+    with open(path, 'r') as f:
+        return json.load(f)[fake_server.url]
+
+
+def test_a_new_session_outlives_the_idle_time_between_runs(fake_server, capabilities, tmp_path):
+    session_pool = SessionPool(fake_server.url, session_file=str(tmp_path / 'state' / 'sessions.json'),
+                               new_command_timeout=900)
+    device_actions = session_pool.acquire(capabilities)
+    try:
+        assert device_actions.driver.capabilities['appium:newCommandTimeout'] == 900
+        assert saved_sessions(tmp_path / 'state' / 'sessions.json', fake_server) == \
+            {capabilities['deviceName']: device_actions.driver.session_id}
+    finally:
+        device_actions.quit()
+    # The caller's own timeout wins
+    device_actions = session_pool.acquire(dict(capabilities, newCommandTimeout=30))
+    try:
+        assert device_actions.driver.capabilities['appium:newCommandTimeout'] == 30
+    finally:
+        device_actions.quit()
+
+
+def test_the_next_run_attaches_to_the_saved_session(fake_server, capabilities, tmp_path):
+    session_file = str(tmp_path / 'sessions.json')
+    first = SessionPool(fake_server.url, session_file=session_file).acquire(capabilities)
+    fake_server.device.reset('email', phone='4130900001')
+    # Another process: only the session file is shared
+    second = SessionPool(fake_server.url, session_file=session_file).acquire(capabilities)
+    try:
+        assert second is not first and second.driver.session_id == first.driver.session_id
+        assert fake_server.command_counts['new_session'] == 1
+        # The app is reset to its welcome screen, not left where the last run stopped
+        assert fake_server.device.screen == 'welcome'
+    finally:
+        second.quit()
+
+
+def test_a_gone_session_is_replaced(fake_server, capabilities, tmp_path):
+    session_file = str(tmp_path / 'sessions.json')
+    first = SessionPool(fake_server.url, session_file=session_file).acquire(capabilities)
+    first.quit()
+    second = SessionPool(fake_server.url, session_file=session_file).acquire(capabilities)
+    try:
+        assert second.driver.session_id != first.driver.session_id
+        assert fake_server.command_counts['new_session'] == 2
+        assert saved_sessions(session_file, fake_server) == {capabilities['deviceName']: second.driver.session_id}
+    finally:
+        second.quit()
+
+
+def test_release_keeps_or_forgets_the_session(fake_server, capabilities, tmp_path):
+    session_file = str(tmp_path / 'sessions.json')
+    session_pool = SessionPool(fake_server.url, session_file=session_file)
+    device_actions = session_pool.acquire(capabilities)
+    session_pool.release(device_actions)
+    assert session_pool.acquire(capabilities, reset=False) is device_actions
+    session_pool.release(device_actions, keep=False)
+    assert not device_actions.is_session_alive()
+    assert saved_sessions(session_file, fake_server) == {}
+    assert session_pool.acquire(capabilities) is not device_actions
+    session_pool.close_all()
+    assert not os.path.exists(session_file)
+
+
+def test_the_session_file_is_kept_out_of_the_source_tree():
+    source_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert not os.path.abspath(SESSION_FILE).startswith(source_dir + os.sep)
@@ -0,0 +1,34 @@
+import shlex
+import pytest
+from device_actions import DeviceActions
+from fake_appium_server import FakeAppiumServer
+from text_input import TextInputEngine, adb_input_text
+
+
+@pytest.mark.parametrize('text', ["a b", "100% sure", "$HOME; rm -rf /", "it's \"quoted\"", "a&b|c>d", "*?~#!"])
+def test_adb_input_text_survives_the_device_shell(text):
+    # The device shell removes the quoting; `input text` then turns %s into spaces
+    (argument,) = shlex.split(adb_input_text(text))
+    assert argument.replace('%s', ' ') == text
+
+
+def test_adb_input_text_refuses_a_literal_percent_s():
+    with pytest.raises(ValueError):
+        adb_input_text("50%sale")
+
+
+@pytest.mark.parametrize('text', ["o'brien & co", "50%s off"])
+def test_adb_method_types_the_text_exactly(capabilities, text):
+    with FakeAppiumServer(relaxed_security=True) as server:
+        device_actions = DeviceActions(server.url, text_input=TextInputEngine(methods=('adb', 'type')))
+        device_actions.connect(capabilities)
+        try:
+            server.device.reset('email', phone='4130800001')
+            xpath = "//*[@content-desc='field:email']"
+            device_actions.enter_text_by_xpath(xpath, text)
+            assert server.device.fields['email'] == text
+            # Text the adb method cannot type falls through to the next method
+            expected = 'adb' if '%s' not in text else 'type'
+            assert device_actions.text_input.preferred[xpath] == expected
+        finally:
+            device_actions.quit()
@@ -0,0 +1,72 @@
+import json
+import pytest
+from selenium.webdriver.remote.command import Command
+from main import replay_enrollment, run_enrollment_flow
+from trace_recorder import ReplayMismatch, TraceRecorder, TraceReplayer, _render, _templated_action, load_trace
+
+
+@pytest.fixture
+def recorded(fake_server, device_actions, capabilities, tmp_path):
+    """Records a plain enrollment run; returns the saved trace and the commands the run took."""
+    recorder = TraceRecorder(device_actions).attach()
+    identity = run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: '4130900001',
+                                   trace=recorder)
+    path = recorder.save(identity.as_dict(), str(tmp_path / "enrollment.json"))
+    fake_server.device.reset()
+    fake_server.reset_stats()
+    device_actions.invalidate_snapshot()
+    device_actions.invalidate_keypad()
+    return load_trace(path)
+
+
+def test_the_trace_is_templated_and_anchored(recorded):
+    # The run's data is stored as placeholders, so a replay can enter a new identity
+    assert '4130900001' not in json.dumps(recorded)
+    templated = {action['step']: action.get('digits') or action['params'].get('args', [{}])[0].get('text')
+                 for action in recorded['actions']}
+    assert templated['Enter Phone Number'] == {'$value': 'phone', 'encoding': 'plain'}
+    assert templated['Enter Email Address']['$value'] == 'email'
+    assert recorded['end_screen'] == 'featured_clip'
+    assert all(action['anchor'] or action['kind'] == 'command' for action in recorded['actions'] if action['checkpoint'])
+
+
+def test_only_typed_text_is_templated(fake_server, device_actions, capabilities, tmp_path):
+    recorder = TraceRecorder(device_actions).attach()
+    identity = run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: '4130900005',
+                                   trace=recorder)
+    # Values that also occur as screen names and element ids stay as recorded there
+    values = dict(identity.as_dict(), screen='welcome', element='1.1')
+    trace = load_trace(recorder.save(values, str(tmp_path / "enrollment.json")))
+    unpayloaded = [{key: value for key, value in action.items() if key not in ('params', 'digits')}
+                   for action in trace['actions']]
+    assert '$value' not in json.dumps(unpayloaded)
+    assert trace['actions'][0]['screen'] == 'welcome'
+    send_keys = {'kind': 'element', 'command': Command.SEND_KEYS_TO_ELEMENT,
+                 'params': {'id': '1.1', 'text': 'ORENTHEKING4130900005', 'value': list('ORENTHEKING4130900005')}}
+    templated = _templated_action(send_keys, values)
+    assert templated['params'] == {'id': '1.1', 'text': {'$value': 'first_name', 'encoding': 'plain'},
+                                   'value': {'$value': 'first_name', 'encoding': 'chars'}}
+    assert _render(templated['params'], {'first_name': 'ANA'}) == {'id': '1.1', 'text': 'ANA', 'value': ['A', 'N', 'A']}
+
+
+def test_a_replay_enrolls_new_data(fake_server, device_actions, capabilities, recorded):
+    results = {}
+    replay_enrollment(device_actions, capabilities, recorded, results, phone_number_provider=lambda: '4130900002')
+    assert fake_server.device.screen == 'featured'
+    assert fake_server.device.fields['email'] == 'orena+4130900002@appcard.com'
+    assert fake_server.command_counts['page_source'] <= 1
+    replayed = {action['step'] for action in recorded['actions']}
+    assert {step for step, result in results.items() if result.endswith('(replayed)')} == replayed
+
+
+def test_a_checkpoint_mismatch_falls_back_or_raises(fake_server, device_actions, capabilities, recorded):
+    # The terminal is already past the welcome screen the trace starts on
+    fake_server.device.reset('confirm', phone='4130900003')
+    with pytest.raises(ReplayMismatch):
+        TraceReplayer(device_actions, checkpoint_timeout=0.3).replay(recorded, {'phone': '4130900003'})
+    fake_server.device.reset()
+    recorded['actions'][0]['anchor']['center'] = [1, 1]
+    results = {}
+    replay_enrollment(device_actions, capabilities, recorded, results, phone_number_provider=lambda: '4130900004')
+    assert fake_server.device.fields['email'] == 'orena+4130900004@appcard.com'
+    assert not any(result.endswith('(replayed)') for result in results.values())
@@ -0,0 +1,44 @@
+import pytest
+from selenium.common.exceptions import StaleElementReferenceException
+from device_actions import DeviceActions
+from transport import TransportConfig, close_pools, shared_pool, transport_stats
+
+
+@pytest.fixture
+def pooled_actions(fake_server, capabilities):
+    device_actions = DeviceActions(fake_server.url, transport=TransportConfig(pool_size=2))
+    device_actions.connect(capabilities)
+    yield device_actions
+    device_actions.quit()
+    close_pools(fake_server.url)
+
+
+def test_a_click_error_is_raised_by_the_call_that_clicked(fake_server, pooled_actions):
+    fake_server.device.reset('welcome', phone='4130800001')
+    fake_server.fail_next('click')
+    with pytest.raises(StaleElementReferenceException):
+        pooled_actions.click_button_by_text('OK')
+    # The next, unrelated command is not hit by the earlier failure
+    assert pooled_actions.is_session_alive()
+
+
+def test_sessions_share_the_pooled_connections(fake_server, capabilities, pooled_actions):
+    connections = fake_server.connections
+    other = DeviceActions(fake_server.url, transport=TransportConfig(pool_size=2))
+    other.connect(capabilities)
+    other.quit()
+    pooled_actions.is_session_alive()
+    stats = pooled_actions.transport_stats()
+    assert fake_server.connections - connections <= 1
+    assert stats['requests'] > 0 and stats['reconnects'] == 0
+
+
+def test_pools_are_kept_per_pool_settings(fake_server):
+    small, _ = shared_pool(fake_server.url, TransportConfig(pool_size=1))
+    large, _ = shared_pool(fake_server.url, TransportConfig(pool_size=8))
+    assert small is not large
+    assert shared_pool(fake_server.url, TransportConfig(pool_size=8))[0] is large
+    assert transport_stats(fake_server.url)['requests'] == 0
+    close_pools(fake_server.url)
+    assert shared_pool(fake_server.url, TransportConfig(pool_size=8))[0] is not large
+    close_pools(fake_server.url)
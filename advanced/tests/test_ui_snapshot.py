@@ -0,0 +1,52 @@
+import pytest
+from fake_appium_server import FakeDevice
+from main import HEADER_ID, TERMS_ID, WELCOME_CHECKS
+from ui_snapshot import UiSnapshot, bounds_center, parse_bounds
+
+
+@pytest.fixture
+def welcome():
+    return UiSnapshot(FakeDevice().page_source())
+
+
+def test_bounds():
+    assert parse_bounds('[0,-10][100,50]') == (0, -10, 100, 50)
+    assert parse_bounds('') is None
+    assert bounds_center('[0,0][100,50]') == (50, 25)
+
+
+def test_lookups_by_id_text_and_class(welcome):
+    assert welcome.has_id(HEADER_ID) and welcome.text_of(TERMS_ID) == 'Terms'
+    assert welcome.find_by_text('OK', 'android.widget.Button').clickable
+    assert welcome.find_by_text('OK', 'android.widget.TextView') is None
+    assert welcome.find_by_text('Espa', contains=True).text == 'Español'
+
+
+def test_evaluate(welcome):
+    assert welcome.evaluate(('element_text', TERMS_ID, 'Terms'))[0]
+    passed, detail = welcome.evaluate(('element_text', TERMS_ID, 'Privacy'))
+    assert not passed and "found 'Terms'" in detail
+    assert welcome.evaluate(('element_clickable', TERMS_ID))[0]
+    assert not welcome.evaluate(('element_present', 'missing'))[0]
+    with pytest.raises(ValueError):
+        welcome.evaluate(('element_color', TERMS_ID))
+
+
+def test_the_welcome_checks_take_one_page_source(fake_server, device_actions):
+    fake_server.reset_stats()
+    device_actions.validate_screen(list(WELCOME_CHECKS.values()))
+    assert fake_server.total_commands() == fake_server.command_counts['page_source'] == 1
+
+
+def test_a_failing_check_is_reported_with_its_detail(fake_server, device_actions):
+    fake_server.device.reset('email')
+    with pytest.raises(Exception, match="element 'com.appcard.androidterminal:id/tv_terms'"):
+        device_actions.validate_screen([('element_present', TERMS_ID)], timeout=0.3)
+
+
+def test_per_digit_entry_drops_the_snapshot(device_actions):
+    device_actions.keypad_mode = 'per_digit'
+    assert device_actions.current_screen(refresh=False) == 'welcome'
+    device_actions.enter_phone_number('41')
+    assert device_actions.snapshot().find_by_text('41') is not None
+    assert device_actions.current_screen(refresh=False) == 'keypad'
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+from fake_appium_server import HEADER_ZOOM  # noqa: E402
+from main import HEADER_REGION, run_enrollment_flow  # noqa: E402
+from visual import VisualRegion, check_regions  # noqa: E402
+
+
+@pytest.fixture
+def unrelated_reference(tmp_path):
+    path = tmp_path / "unrelated.png"
+    Image.effect_noise((400, 100), 80).save(path)
+    return VisualRegion('unrelated', str(path))
+
+
+def test_the_header_is_found_at_its_offset_and_scale(fake_server, device_actions):
+    fake_server.device.reset('welcome')
+    (result,) = device_actions.validate_visual([HEADER_REGION])
+    assert result['zoom'] == pytest.approx(HEADER_ZOOM, abs=0.03)
+    left, top, right, bottom = result['box']
+    # Centered in the 1080x200 header view, not at the screen's corner
+    assert abs((left + right) / 2 - 540) < 10 and abs((top + bottom) / 2 - 100) < 10
+    assert fake_server.command_counts['screenshot'] == 1
+
+
+def test_several_regions_share_one_screenshot(fake_server, device_actions, unrelated_reference):
+    fake_server.device.reset('welcome')
+    results, _ = check_regions(device_actions.driver.get_screenshot_as_png(), [HEADER_REGION, unrelated_reference])
+    assert [result['passed'] for result in results] == [True, False]
+
+
+def test_a_mismatch_fails_only_when_strict(fake_server, device_actions, unrelated_reference):
+    fake_server.device.reset('welcome')
+    with pytest.raises(Exception, match='Visual validation failed'):
+        device_actions.validate_visual([unrelated_reference], timeout=0.5)
+    results = device_actions.validate_visual([unrelated_reference], timeout=0.5, strict=False)
+    assert not results[0]['passed']
+    assert len(device_actions.visual_warnings) == 1
+
+
+def test_the_flow_runs_visual_checks_only_when_asked(fake_server, device_actions, capabilities):
+    run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: '4130400001')
+    assert fake_server.command_counts['screenshot'] == 0
+    fake_server.device.reset()
+    fake_server.reset_stats()
+    device_actions.visual_mode = 'warn'
+    run_enrollment_flow(device_actions, capabilities, {}, phone_number_provider=lambda: '4130400002')
+    assert fake_server.command_counts['screenshot'] == 1
@@ -0,0 +1,61 @@
+import threading
+import time
+import pytest
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common.exceptions import TimeoutException
+from main import EMAIL_XPATH, HEADER_ID, TERMS_ID
+from wait_conditions import activity_is, all_of, element_absent, element_clickable, element_present
+
+MISSING_ID = "com.appcard.androidterminal:id/no_such_view"
+
+
+def test_each_condition_type_holds_on_the_welcome_screen(device_actions):
+    assert device_actions.wait_for(activity_is('com.appcard.androidterminal.ui.MainActivity'), timeout=1)
+    header = device_actions.wait_for(element_present((AppiumBy.ID, HEADER_ID)), timeout=1)
+    assert header.get_attribute('resource-id') == HEADER_ID
+    terms = device_actions.wait_for(element_clickable((AppiumBy.ID, TERMS_ID)), timeout=1)
+    assert terms.get_attribute('resource-id') == TERMS_ID
+    assert device_actions.wait_for(element_absent((AppiumBy.ID, MISSING_ID)), timeout=1) is True
+    both = all_of(activity_is('.ui.MainActivity'), element_present((AppiumBy.ID, TERMS_ID)))
+    assert device_actions.wait_for(both, timeout=1).get_attribute('resource-id') == TERMS_ID
+    # Each held on its first poll
+    assert [entry['polls'] for entry in device_actions.wait_log] == [1] * 5
+
+
+def test_a_wait_ends_on_the_poll_after_the_screen_changes(fake_server, device_actions):
+    device = fake_server.device
+
+    def terminal_moves_on():
+        time.sleep(0.3)
+        with device.lock:
+            device._show('email', delay=0)
+
+    mover = threading.Thread(target=terminal_moves_on)
+    mover.start()
+    field = device_actions.wait_for(element_present((AppiumBy.XPATH, EMAIL_XPATH)), timeout=5, replaces_sleep=2)
+    mover.join()
+    assert field.get_attribute('text') == 'Enter E-mail Address'
+    entry = device_actions.wait_log[-1]
+    # Polls at 0, 0.05, 0.125, 0.24, 0.4 s: the change is seen within one backed-off interval
+    assert entry['succeeded'] and 0.3 <= entry['elapsed'] < 0.6 and entry['polls'] >= 3
+    assert device_actions.wait_summary()['saved'] > 1.4
+
+
+def test_polls_back_off_until_the_timeout(device_actions):
+    polls = []
+    with pytest.raises(TimeoutException):
+        device_actions.wait_for(lambda driver: polls.append(time.monotonic()), timeout=1.5)
+    gaps = [later - earlier for earlier, later in zip(polls, polls[1:])]
+    # 50 ms growing by half each time: 8 polls in 1.5 s, not the 30 of a fixed interval
+    assert len(polls) == device_actions.wait_log[-1]['polls'] <= 10
+    assert gaps[-2] > 3 * gaps[0]
+    assert polls[-1] - polls[0] == pytest.approx(1.5, abs=0.15)
+
+
+def test_a_timeout_names_the_condition_and_the_screen(fake_server, device_actions):
+    fake_server.device.reset('confirm')
+    device_actions.invalidate_snapshot()
+    with pytest.raises(TimeoutException, match=r"waiting for element present .*no_such_view "
+                                               r"\(the terminal is on the confirm screen\)"):
+        device_actions.wait_for(element_present((AppiumBy.ID, MISSING_ID)), timeout=0.3)
+    assert device_actions.wait_log[-1]['succeeded'] is False
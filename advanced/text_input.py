@@ -0,0 +1,109 @@
+import shlex
+import time
+from selenium.common.exceptions import WebDriverException
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+KEYCODE_PASTE = 279
+
+# Cheapest first. 'replace' sets the field's text in one call without the IME; 'type' and
+# 'clipboard' go through the focused field; 'adb' needs the Appium server started with
+# --relaxed-security; 'send_keys' is the WebDriver default, which UiAutomator2 may inject
+# through the IME one character at a time.
+DEFAULT_METHODS = ('replace', 'type', 'clipboard', 'adb', 'send_keys')
+
+
+def adb_input_text(text):
+    """
+    Quotes text as the argument of `adb shell input text`, which the device shell parses first.
+    `input text` turns %s into a space and has no other escape, so spaces are sent as %s and text
+    that itself contains '%s' cannot be typed this way (ValueError; the engine tries the next method).
+    """
+    if '%s' in text:
+        raise ValueError(f"adb input text cannot type a literal '%s': {text!r}")
+    return shlex.quote(text.replace(' ', '%s'))
+
+
+class TextInputEngine:
+    """
+    Enters text into fields with the fastest method that works for each one. Methods are tried in
+    order; the first one whose result reads back correctly is remembered for the field and used
+    first next time. A method the server rejects outright (e.g. adb without relaxed security) is
+    not tried again. Every entry records the field, method, latency and whether it verified.
+    """
+
+    def __init__(self, methods=DEFAULT_METHODS):
+        self.methods = tuple(methods)
+        self.preferred = {}
+        self.unavailable = set()
+        self.log = []
+
+    def enter(self, driver, element, text, field):
+        """Types text into a located element and returns the method that worked."""
+        preferred = self.preferred.get(field)
+        order = [preferred] if preferred in self.methods else []
+        order += [method for method in self.methods if method != preferred]
+        errors = []
+        for tried, method in enumerate(order):
+            if method in self.unavailable:
+                continue
+            if tried and errors:
+                # A failed method may have left part of the text behind
+                element.clear()
+            start = time.perf_counter()
+            try:
+                getattr(self, f"_{method}")(driver, element, text)
+                actual = element.get_attribute('text')
+            except (WebDriverException, ValueError) as e:
+                self._record(field, method, start, False, error=e)
+                if _is_unsupported(e):
+                    self.unavailable.add(method)
+                errors.append(f"{method}: {e.__class__.__name__}")
+                continue
+            verified = actual == text
+            self._record(field, method, start, verified)
+            if verified:
+                self.preferred[field] = method
+                return method
+            errors.append(f"{method}: read back {actual!r}")
+        raise Exception(f"Could not enter text into {field} ({'; '.join(errors)})")
+
+    def _record(self, field, method, start, verified, error=None):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.log.append({'field': field, 'method': method, 'elapsed_ms': elapsed_ms, 'verified': verified,
+                         'error': f"{error.__class__.__name__}: {error}" if error else None})
+        status = "✅" if verified else "⚠️"
+        print(f"{status} Text entry into {field} via {method}: {elapsed_ms:.0f} ms (from {CURRENT_FILE})")
+
+    def summary(self):
+        """Returns, per field, the method in use and the latency of its last verified entry."""
+        summary = {}
+        for entry in self.log:
+            if entry['verified']:
+                summary[entry['field']] = {'method': entry['method'], 'elapsed_ms': entry['elapsed_ms']}
+        return summary
+
+    def _replace(self, driver, element, text):
+        driver.execute_script('mobile: replaceElementValue', {'elementId': element.id, 'text': text})
+
+    def _type(self, driver, element, text):
+        element.click()
+        driver.execute_script('mobile: type', {'text': text})
+
+    def _clipboard(self, driver, element, text):
+        driver.set_clipboard_text(text)
+        element.click()
+        driver.execute_script('mobile: pressKey', {'keycode': KEYCODE_PASTE})
+
+    def _adb(self, driver, element, text):
+        element.click()
+        driver.execute_script('mobile: shell', {'command': 'input', 'args': ['text', adb_input_text(text)]})
+
+    def _send_keys(self, driver, element, text):
+        element.send_keys(text)
+
+
+def _is_unsupported(error):
+    message = str(error).lower()
+    return any(marker in message for marker in ('not supported', 'unsupported', 'unknown command', 'insecure feature',
+                                                'not been enabled', 'unknown mobile command'))
@@ -0,0 +1,455 @@
+import base64
+import copy
+import json
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from appium.webdriver.mobilecommand import MobileCommand
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.webelement import WebElement
+from device_actions import INITIAL_POLL_INTERVAL, KEY_GAP_SECONDS, KEY_PRESS_SECONDS, MAX_POLL_INTERVAL, POLL_BACKOFF, \
+    locators_for
+from text_input import adb_input_text
+from ui_snapshot import UiSnapshot
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+TRACES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
+ELEMENT_KEYS = ('element-6066-11e4-a52e-4f735466cecf', 'ELEMENT')
+# How far (in pixels) an anchor may have moved before its recorded coordinates are no longer trusted
+ANCHOR_TOLERANCE = 8
+CHECKPOINT_TIMEOUT = 10
+# Fastest first; an element found several ways is anchored by its fastest locator
+LOCATOR_SPEED = {'id': 0, 'accessibility id': 1, '-android uiautomator': 2, 'class name': 3, 'xpath': 4}
+
+# Commands that change the device; everything else (lookups, reads, waits) is left out of a trace
+ELEMENT_COMMANDS = {Command.CLICK_ELEMENT, Command.SEND_KEYS_TO_ELEMENT, Command.CLEAR_ELEMENT}
+SCRIPT_COMMANDS = {Command.W3C_EXECUTE_SCRIPT}
+DEVICE_COMMANDS = {Command.W3C_ACTIONS, Command.GO_BACK, MobileCommand.SET_CLIPBOARD, MobileCommand.ACTIVATE_APP,
+                   MobileCommand.TERMINATE_APP}
+FIND_COMMANDS = {Command.FIND_ELEMENT, Command.FIND_ELEMENTS}
+MUTATING_SCRIPTS = {'mobile: replaceElementValue', 'mobile: type', 'mobile: pressKey', 'mobile: shell',
+                    'mobile: clearApp'}
+# Scripts whose 'text' argument is typed into the app
+TEXT_SCRIPTS = {'mobile: replaceElementValue', 'mobile: type'}
+
+
+class ReplayMismatch(Exception):
+    """Raised when a checkpoint does not match the recorded screen and there is no fallback."""
+
+
+def trace_path(flow):
+    return os.path.join(TRACES_DIR, f"{flow}.json")
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class TraceRecorder:
+    """
+    Records the commands a DeviceActions flow sends to the device, resolved to what a replay needs:
+    taps as screen coordinates, keypad entry as the digits and key centers, text as the text with
+    the element located by the fast locator that found it, and the time each command took. Lookups,
+    reads and waits are not recorded. Each command is tagged with the flow step it belongs to and
+    the screen it ran on; the first command on every new screen gets a checkpoint anchor.
+
+    Classifying the screen costs one page_source per recorded command, so recording is slower than
+    a plain run; the replay is what is fast (see TraceReplayer).
+    """
+
+    def __init__(self, device_actions, flow='enrollment'):
+        self.device_actions = device_actions
+        self.flow = flow
+        self.actions = []
+        self.steps = []
+        self.step_name = None
+        self._locators = {}
+        self._started = None
+        self._driver = None
+
+    def attach(self):
+        self._started = time.monotonic()
+        self._hook_driver()
+        return self
+
+    def _hook_driver(self):
+        driver = self.device_actions.driver
+        if driver is None or driver is self._driver:
+            return
+        execute = driver.execute
+
+        def recorded_execute(driver_command, params=None):
+            if self.step_name is None or not self._is_mutating(driver_command, params):
+                response = execute(driver_command, params)
+                if driver_command in FIND_COMMANDS and self.step_name is not None:
+                    self._remember_locator(params, response)
+                return response
+            screen = self._classify(execute)
+            anchor = self._anchor(execute, driver_command, params)
+            start = time.perf_counter()
+            response = execute(driver_command, params)
+            self._add(driver_command, params, screen, anchor, (time.perf_counter() - start) * 1000)
+            return response
+
+        driver.execute = recorded_execute
+        self._driver = driver
+
+    @contextmanager
+    def step(self, name):
+        self._hook_driver()
+        if name not in self.steps:
+            self.steps.append(name)
+        previous, self.step_name = self.step_name, name
+        try:
+            yield
+        finally:
+            self.step_name = previous
+
+    @staticmethod
+    def _is_mutating(driver_command, params):
+        if driver_command in ELEMENT_COMMANDS or driver_command in DEVICE_COMMANDS:
+            return True
+        return driver_command in SCRIPT_COMMANDS and (params or {}).get('script') in MUTATING_SCRIPTS
+
+    def _remember_locator(self, params, response):
+        value = response.get('value') if isinstance(response, dict) else None
+        elements = value if isinstance(value, list) else [value]
+        for element in elements:
+            element_id = _element_id(element)
+            known = self._locators.get(element_id)
+            if element_id and (known is None or _speed(params['using']) < _speed(known[0])):
+                self._locators[element_id] = (params['using'], params['value'])
+
+    def _classify(self, execute):
+        page_source = execute(Command.GET_PAGE_SOURCE, {})['value']
+        return self.device_actions.screens.classify(UiSnapshot(page_source))
+
+    def _anchor(self, execute, driver_command, params):
+        """The element a command acts on (or the first keypad key it taps): its locator and center."""
+        element_id = _command_element(driver_command, params)
+        if element_id is not None:
+            if element_id not in self._locators:
+                return None
+            # Rewrite simple XPath into the uiautomator/id lookup it is equivalent to, so replay avoids hierarchy dumps
+            _, using, value = locators_for(*self._locators[element_id])[0]
+            rect = execute(Command.GET_ELEMENT_RECT, {'id': element_id})['value']
+            return {'using': using, 'value': value, 'element': element_id,
+                    'center': [rect['x'] + rect['width'] // 2, rect['y'] + rect['height'] // 2]}
+        digits = self._keypad_digits(params) if driver_command == Command.W3C_ACTIONS else None
+        if digits:
+            keys = self.device_actions._keypad['keys']
+            return {'using': '-android uiautomator',
+                    'value': f'new UiSelector().className("android.widget.Button").text("{digits[0]}")',
+                    'center': list(keys[digits[0]])}
+        return None
+
+    def _keypad_digits(self, params):
+        """The digits a W3C action sequence types on the cached keypad, or None if it is not keypad entry."""
+        keypad = self.device_actions._keypad
+        if not keypad:
+            return None
+        by_center = {tuple(center): digit for digit, center in keypad['keys'].items()}
+        taps = _taps(params)
+        digits = [by_center.get(tuple(tap)) for tap in taps]
+        return ''.join(digits) if taps and all(digits) else None
+
+    def _add(self, driver_command, params, screen, anchor, elapsed_ms):
+        previous = self.actions[-1]['screen'] if self.actions else object()
+        action = {
+            'step': self.step_name,
+            'screen': screen,
+            'checkpoint': screen != previous,
+            'command': driver_command,
+            'params': copy.deepcopy(params),
+            'anchor': anchor,
+            'elapsed_ms': round(elapsed_ms, 1),
+        }
+        if driver_command == Command.CLICK_ELEMENT and anchor:
+            action['kind'] = 'tap'
+        elif driver_command == Command.W3C_ACTIONS and anchor:
+            digits = self._keypad_digits(params)
+            action.update(kind='keypad', digits=digits, keys=dict(self.device_actions._keypad['keys']))
+        elif _command_element(driver_command, params) is not None:
+            action['kind'] = 'element'
+        else:
+            action['kind'] = 'command'
+        self.actions.append(action)
+
+    def save(self, values=None, path=None):
+        """
+        Writes the trace with the run's data (e.g. the identity's phone, email and names) replaced
+        by {placeholders} where it was typed (text payloads and keypad digits), so a replay can
+        seed different data. Returns the path.
+        """
+        values = {name: str(value) for name, value in (values or {}).items()}
+        actions = [_templated_action(action, values) for action in self.actions]
+        for action in actions:
+            if action['anchor']:
+                action['anchor'].pop('element', None)
+        end_screen = self.device_actions.current_screen()
+        trace = {
+            'flow': self.flow,
+            'recorded': datetime.now(timezone.utc).isoformat(),
+            'values': sorted(values),
+            'steps': self.steps,
+            'actions': actions,
+            'end_screen': end_screen,
+            'elapsed': round(time.monotonic() - self._started, 3) if self._started else None,
+        }
+        path = path or trace_path(self.flow)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f, indent=2, ensure_ascii=False)
+        print(f"🎞️ Recorded {len(actions)} commands over {len(self.steps)} steps to {path} (from {CURRENT_FILE})")
+        return path
+
+
+class TraceReplayer:
+    """
+    Replays a recorded trace at full speed: taps go to the recorded coordinates and text to the
+    recorded field without looking anything up first. Only the first command on each new screen
+    waits for a checkpoint: its anchor element found by its fast locator at the recorded position
+    (or, without an anchor, the recorded screen classified). When a checkpoint does not match,
+    fallback(step, completed_steps) takes over with full locator resolution from that step.
+    """
+
+    def __init__(self, device_actions, checkpoint_timeout=CHECKPOINT_TIMEOUT):
+        self.device_actions = device_actions
+        self.checkpoint_timeout = checkpoint_timeout
+        self.stats = {'commands': 0, 'checkpoints': 0, 'fell_back_at': None}
+
+    def replay(self, trace, values, action_results=None, fallback=None):
+        """Returns the replay stats; records each replayed step as '✅ Success (replayed)' in action_results."""
+        action_results = {} if action_results is None else action_results
+        values = {name: str(value) for name, value in values.items()}
+        start = time.monotonic()
+        steps = trace['steps']
+        current_step = None
+        for action in trace['actions']:
+            if action['step'] != current_step:
+                if current_step is not None:
+                    action_results[current_step] = '✅ Success (replayed)'
+                current_step = action['step']
+            element_id = None
+            if action['checkpoint']:
+                element_id = self._checkpoint(action)
+                if element_id is None:
+                    return self._fall_back(action['step'], steps, fallback, start)
+            self._perform(action, values, element_id)
+        if current_step is not None:
+            action_results[current_step] = '✅ Success (replayed)'
+        if trace.get('end_screen') and not self._wait_for_screen(trace['end_screen']):
+            return self._fall_back(current_step or steps[-1], steps, fallback, start)
+        self.stats['elapsed'] = time.monotonic() - start
+        print(f"🎞️ Replayed {self.stats['commands']} commands with {self.stats['checkpoints']} checkpoints in "
+              f"{self.stats['elapsed']:.2f}s (recorded run: {trace.get('elapsed') or 0:.2f}s) (from {CURRENT_FILE})")
+        return self.stats
+
+    def _fall_back(self, step, steps, fallback, start):
+        self.stats['fell_back_at'] = step
+        if fallback is None:
+            raise ReplayMismatch(f"Checkpoint mismatch at '{step}'")
+        print(f"⚠️ Checkpoint mismatch at '{step}', continuing with full resolution (from {CURRENT_FILE})")
+        self.device_actions.invalidate_snapshot()
+        self.device_actions.invalidate_keypad()
+        fallback(step, steps[:steps.index(step)])
+        self.stats['elapsed'] = time.monotonic() - start
+        return self.stats
+
+    def _checkpoint(self, action):
+        """Returns the anchor's element id (True for an anchorless screen check) or None on a mismatch."""
+        self.stats['checkpoints'] += 1
+        anchor = action['anchor']
+        if anchor is None:
+            return True if self._wait_for_screen(action['screen']) else None
+        return self._poll(lambda: self._anchor_in_place(anchor))
+
+    def _anchor_in_place(self, anchor):
+        """Returns the anchor's element id when it is on screen within ANCHOR_TOLERANCE of its recorded center."""
+        driver = self.device_actions.driver
+        found = driver.execute(Command.FIND_ELEMENTS, {'using': anchor['using'], 'value': anchor['value']})['value']
+        for element in found or []:
+            element_id = _element_id(element)
+            rect = driver.execute(Command.GET_ELEMENT_RECT, {'id': element_id})['value']
+            center = (rect['x'] + rect['width'] // 2, rect['y'] + rect['height'] // 2)
+            if all(abs(a - b) <= ANCHOR_TOLERANCE for a, b in zip(center, anchor['center'])):
+                return element_id
+        return None
+
+    def _find_anchor(self, anchor):
+        """Returns the id of the anchor's first match; between checkpoints its position is not verified."""
+        found = self.device_actions.driver.execute(
+            Command.FIND_ELEMENTS, {'using': anchor['using'], 'value': anchor['value']})['value']
+        return _element_id(found[0]) if found else None
+
+    def _wait_for_screen(self, screen):
+        return self._poll(lambda: self.device_actions.current_screen() == screen or None) is not None
+
+    def _poll(self, check):
+        deadline = time.monotonic() + self.checkpoint_timeout
+        interval = INITIAL_POLL_INTERVAL
+        while True:
+            result = check()
+            if result is not None or time.monotonic() >= deadline:
+                return result
+            time.sleep(interval)
+            interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+    def _perform(self, action, values, element_id=None):
+        driver = self.device_actions.driver
+        kind = action['kind']
+        if kind == 'tap':
+            driver.execute(Command.W3C_ACTIONS, _tap_params([action['anchor']['center']]))
+        elif kind == 'keypad':
+            digits = _render(action['digits'], values)
+            keys = action['keys']
+            missing = sorted(set(digit for digit in digits if digit not in keys))
+            if missing:
+                raise ReplayMismatch(f"The recorded keypad has no keys for {''.join(missing)}")
+            driver.execute(Command.W3C_ACTIONS, _tap_params([keys[digit] for digit in digits]))
+        else:
+            params = _render(action['params'], values)
+            if kind == 'element':
+                if not isinstance(element_id, str) and action['anchor']:
+                    element_id = self._poll(lambda: self._find_anchor(action['anchor']))
+                if not isinstance(element_id, str):
+                    raise ReplayMismatch(f"Could not find the element for {action['command']} in '{action['step']}'")
+                params = _with_element(action['command'], params, element_id)
+            driver.execute(action['command'], params)
+        self.device_actions.invalidate_snapshot()
+        self.stats['commands'] += 1
+
+
+def _element_id(element):
+    """The id of a found element: driver.execute has usually unwrapped it into a WebElement already."""
+    if isinstance(element, WebElement):
+        return element.id
+    if isinstance(element, dict):
+        for key in ELEMENT_KEYS:
+            if key in element:
+                return element[key]
+    return None
+
+
+def _speed(using):
+    """Orders locator strategies by lookup cost; XPath needs a full hierarchy dump on the device."""
+    return LOCATOR_SPEED.get(using, len(LOCATOR_SPEED))
+
+
+def _command_element(driver_command, params):
+    params = params or {}
+    if driver_command in ELEMENT_COMMANDS:
+        return params.get('id')
+    if driver_command in SCRIPT_COMMANDS:
+        args = params.get('args') or [{}]
+        if args and isinstance(args[0], dict):
+            return args[0].get('elementId')
+    return None
+
+
+def _with_element(driver_command, params, element_id):
+    params = copy.deepcopy(params)
+    if driver_command in ELEMENT_COMMANDS:
+        params['id'] = element_id
+    else:
+        params['args'][0]['elementId'] = element_id
+    return params
+
+
+def _text_payloads(driver_command, params):
+    """The (container, key) of each text a command types: send_keys, text scripts, adb input text, clipboard."""
+    params = params or {}
+    if driver_command == Command.SEND_KEYS_TO_ELEMENT:
+        return [(params, key) for key in ('text', 'value') if key in params]
+    if driver_command == MobileCommand.SET_CLIPBOARD:
+        return [(params, 'content')] if 'content' in params else []
+    if driver_command not in SCRIPT_COMMANDS:
+        return []
+    args = params.get('args') or [{}]
+    options = args[0] if isinstance(args[0], dict) else {}
+    if params.get('script') in TEXT_SCRIPTS and 'text' in options:
+        return [(options, 'text')]
+    shell_args = options.get('args') or []
+    if params.get('script') == 'mobile: shell' and options.get('command') == 'input' and shell_args[:1] == ['text']:
+        return [(shell_args, 1)] if len(shell_args) > 1 else []
+    return []
+
+
+def _taps(params):
+    """The (x, y) of every pointer release in a W3C action sequence."""
+    taps = []
+    for source in (params or {}).get('actions', []):
+        position = None
+        for action in source.get('actions', []):
+            if action.get('type') == 'pointerMove':
+                position = [action.get('x'), action.get('y')]
+            elif action.get('type') == 'pointerUp' and position is not None:
+                taps.append(position)
+    return taps
+
+
+def _tap_params(points):
+    """A W3C touch sequence tapping each point in turn, timed like DeviceActions' batched keypad entry."""
+    actions = []
+    for x, y in points:
+        actions += [
+            {'type': 'pointerMove', 'duration': 0, 'x': x, 'y': y, 'origin': 'viewport'},
+            {'type': 'pointerDown', 'button': 0},
+            {'type': 'pause', 'duration': int(KEY_PRESS_SECONDS * 1000)},
+            {'type': 'pointerUp', 'button': 0},
+            {'type': 'pause', 'duration': int(KEY_GAP_SECONDS * 1000)},
+        ]
+    return {'actions': [{'type': 'pointer', 'id': 'finger', 'parameters': {'pointerType': 'touch'},
+                         'actions': actions}]}
+
+
+# Recorded data is stored as {"$value": name, "encoding": ...} so a replay can seed other values
+ENCODINGS = {
+    'plain': lambda text: text,
+    # send_keys also sends the text as a list of characters
+    'chars': lambda text: list(text),
+    'adb': adb_input_text,
+    'base64': lambda text: base64.b64encode(text.encode('utf-8')).decode('ascii'),
+}
+
+
+def _templated_action(action, values):
+    """A copy of a recorded action with the run's data in its typed text and keypad digits as placeholders."""
+    action = copy.deepcopy(action)
+    if action['kind'] == 'keypad':
+        action['digits'] = _templated(action['digits'], values)
+    for container, key in _text_payloads(action['command'], action['params']):
+        container[key] = _templated(container[key], values)
+    return action
+
+
+def _templated(value, values):
+    for name, text in values.items():
+        for encoding, encode in ENCODINGS.items():
+            if value == encode(text):
+                return {'$value': name, 'encoding': encoding}
+    return value
+
+
+def _render(value, values):
+    if isinstance(value, dict) and '$value' in value:
+        return ENCODINGS[value['encoding']](values[value['$value']])
+    if isinstance(value, list):
+        return [_render(item, values) for item in value]
+    if isinstance(value, dict):
+        return {key: _render(item, values) for key, item in value.items()}
+    return value
+
+
+if __name__ == "__main__":
+    # Usage: python trace_recorder.py [TRACE.json] - prints what a recorded trace replays
+    trace = load_trace(sys.argv[1] if len(sys.argv) > 1 else trace_path('enrollment'))
+    print(f"🎞️ {trace['flow']} trace recorded {trace['recorded']}, {len(trace['actions'])} commands, "
+          f"ends on {trace['end_screen']}")
+    for action in trace['actions']:
+        marker = '🚩' if action['checkpoint'] else '  '
+        print(f"{marker} {action['step']} [{action['screen']}] {action['kind']} {action['command']} "
+              f"({action['elapsed_ms']:.0f} ms)")
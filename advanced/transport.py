@@ -0,0 +1,174 @@
+import threading
+from urllib.parse import urlparse
+import urllib3
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from appium.webdriver.appium_connection import AppiumConnection
+from appium.webdriver.client_config import AppiumClientConfig
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+
+# One pool per Appium server and pool settings, shared by every connection (device session) that talks to it.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class TransportConfig:
+    """
+    Settings for the HTTP transport between DeviceActions and an Appium server.
+    pool_size is the number of keep-alive connections kept per server; when block is set, callers
+    wait for a free connection instead of opening throwaway ones. Timeouts are in seconds.
+    """
+
+    def __init__(self, pool_size=4, connect_timeout=5.0, read_timeout=120.0, connect_retries=2,
+                 block=True):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.connect_retries = connect_retries
+        self.block = block
+
+    def timeout(self):
+        return urllib3.Timeout(connect=self.connect_timeout, read=self.read_timeout)
+
+    def pool_settings(self):
+        """The settings a connection pool is built with."""
+        return (self.pool_size, self.connect_timeout, self.read_timeout, self.connect_retries, self.block)
+
+
+class TransportStats:
+    """Request, byte and TCP connection counters for one Appium server."""
+
+    FIELDS = ('requests', 'bytes_sent', 'bytes_received', 'connections', 'reconnects', 'errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def add(self, **counts):
+        with self._lock:
+            for field, count in counts.items():
+                setattr(self, field, getattr(self, field) + count)
+
+    def snapshot(self):
+        with self._lock:
+            return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class CountingHTTPConnection(HTTPConnection):
+    """Counts TCP connection setups and bytes sent. A second connect() on the same object is a reconnect."""
+
+    transport_stats = None
+
+    def connect(self):
+        super().connect()
+        if self.transport_stats is not None:
+            self.transport_stats.add(connections=1, reconnects=1 if getattr(self, '_was_connected', False) else 0)
+        self._was_connected = True
+
+    def send(self, data):
+        if self.transport_stats is not None:
+            self.transport_stats.add(bytes_sent=len(data) if hasattr(data, '__len__') else 0)
+        return super().send(data)
+
+
+class CountingConnectionPool(HTTPConnectionPool):
+    """A keep-alive pool for one server that counts requests and response bytes."""
+
+    ConnectionCls = CountingHTTPConnection
+    transport_stats = None
+
+    def _new_conn(self):
+        connection = super()._new_conn()
+        connection.transport_stats = self.transport_stats
+        return connection
+
+    def urlopen(self, method, url, *args, **kwargs):
+        try:
+            response = super().urlopen(method, url, *args, **kwargs)
+        except Exception:
+            self.transport_stats.add(errors=1)
+            raise
+        self.transport_stats.add(requests=1, bytes_received=len(response.data or b''))
+        return response
+
+
+class CountingPoolManager(urllib3.PoolManager):
+    def __init__(self, transport_stats, **kwargs):
+        super().__init__(**kwargs)
+        self.transport_stats = transport_stats
+        self.pool_classes_by_scheme = {'http': CountingConnectionPool, 'https': self.pool_classes_by_scheme['https']}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.transport_stats = self.transport_stats
+        return pool
+
+
+def _server_key(server_url):
+    parsed = urlparse(server_url)
+    return f"{parsed.scheme}://{parsed.hostname}:{parsed.port or (443 if parsed.scheme == 'https' else 80)}"
+
+
+def shared_pool(server_url, config):
+    """
+    Returns the (pool manager, stats) shared by every connection to a server with the same pool
+    settings; a connection with other settings (pool size, timeouts, retries) gets its own pool.
+    """
+    key = (_server_key(server_url), config.pool_settings())
+    with _pools_lock:
+        if key not in _pools:
+            stats = TransportStats()
+            manager = CountingPoolManager(
+                stats,
+                maxsize=config.pool_size,
+                block=config.block,
+                timeout=config.timeout(),
+                retries=urllib3.Retry(total=config.connect_retries, read=False, redirect=False, status=0),
+            )
+            _pools[key] = (manager, stats)
+        return _pools[key]
+
+
+def transport_stats(server_url=None):
+    """Returns the counters of one server (summed over its pools), or of every server keyed by address."""
+    with _pools_lock:
+        totals = {}
+        for (server, _), (_, stats) in _pools.items():
+            snapshot = stats.snapshot()
+            total = totals.setdefault(server, dict.fromkeys(TransportStats.FIELDS, 0))
+            for field in TransportStats.FIELDS:
+                total[field] += snapshot[field]
+    if server_url is not None:
+        return totals.get(_server_key(server_url)) or TransportStats().snapshot()
+    return totals
+
+
+def close_pools(server_url=None):
+    """Closes the pooled connections to one server (e.g. when it is stopped), or to every server."""
+    with _pools_lock:
+        server = _server_key(server_url) if server_url is not None else None
+        for key in [key for key in _pools if server is None or key[0] == server]:
+            _pools.pop(key)[0].clear()
+
+
+class PooledAppiumConnection(AppiumConnection):
+    """
+    An AppiumConnection that sends its requests through the shared keep-alive pool of its server,
+    with the timeouts of a TransportConfig.
+    """
+
+    def __init__(self, remote_server_addr, config=None):
+        self.config = config or TransportConfig()
+        self._pool, self.stats = shared_pool(remote_server_addr, self.config)
+        client_config = AppiumClientConfig(remote_server_addr=remote_server_addr, keep_alive=True,
+                                           timeout=self.config.timeout())
+        super().__init__(client_config=client_config)
+
+    def _get_connection_manager(self):
+        return self._pool
+
+    def close(self):
+        """Keeps the pooled connections open for other sessions (see close_pools)."""
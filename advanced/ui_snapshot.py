@@ -0,0 +1,119 @@
+import re
+import xml.etree.ElementTree as ET
+import os
+
+CURRENT_FILE = os.path.basename(__file__)
+
+BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+
+def parse_bounds(bounds):
+    """Returns (x1, y1, x2, y2) from a UiAutomator bounds string like '[0,0][100,50]'."""
+    match = BOUNDS_PATTERN.match(bounds or '')
+    if not match:
+        return None
+    return tuple(int(value) for value in match.groups())
+
+
+def bounds_center(bounds):
+    """Returns the (x, y) center of a UiAutomator bounds string."""
+    box = parse_bounds(bounds)
+    if not box:
+        return None
+    x1, y1, x2, y2 = box
+    return (x1 + x2) // 2, (y1 + y2) // 2
+
+
+class UiNode:
+    """One view from the hierarchy dump, with the attributes the validations need."""
+
+    __slots__ = ('resource_id', 'text', 'class_name', 'content_desc', 'bounds',
+                 'clickable', 'enabled', 'displayed')
+
+    def __init__(self, attributes):
+        self.resource_id = attributes.get('resource-id', '')
+        self.text = attributes.get('text', '')
+        self.class_name = attributes.get('class', '')
+        self.content_desc = attributes.get('content-desc', '')
+        self.bounds = attributes.get('bounds', '')
+        self.clickable = attributes.get('clickable') == 'true'
+        self.enabled = attributes.get('enabled', 'true') == 'true'
+        self.displayed = attributes.get('displayed', 'true') == 'true'
+
+    @property
+    def center(self):
+        return bounds_center(self.bounds)
+
+    def __repr__(self):
+        return f"UiNode({self.class_name}, id='{self.resource_id}', text='{self.text}')"
+
+
+class UiSnapshot:
+    """
+    An indexed, read-only copy of one page_source dump.
+    Lookups by resource-id, exact text and class are dictionary hits; 'contains' text scans the nodes.
+    """
+
+    def __init__(self, page_source):
+        root = ET.fromstring(page_source.encode('utf-8') if isinstance(page_source, str) else page_source)
+        self.nodes = [UiNode(element.attrib) for element in root.iter() if element.attrib]
+        self.by_id = {}
+        self.by_text = {}
+        self.by_class = {}
+        for node in self.nodes:
+            if node.resource_id:
+                self.by_id.setdefault(node.resource_id, []).append(node)
+            if node.text:
+                self.by_text.setdefault(node.text, []).append(node)
+            if node.class_name:
+                self.by_class.setdefault(node.class_name, []).append(node)
+
+    def find_by_id(self, resource_id):
+        nodes = self.by_id.get(resource_id)
+        return nodes[0] if nodes else None
+
+    def find_by_text(self, text, class_name=None, contains=False):
+        if contains:
+            candidates = self.by_class.get(class_name, []) if class_name else self.nodes
+            return next((node for node in candidates if text in node.text), None)
+        for node in self.by_text.get(text, []):
+            if class_name is None or node.class_name == class_name:
+                return node
+        return None
+
+    def has_id(self, resource_id):
+        return resource_id in self.by_id
+
+    def text_of(self, resource_id):
+        node = self.find_by_id(resource_id)
+        return node.text if node else None
+
+    def is_clickable(self, resource_id):
+        node = self.find_by_id(resource_id)
+        return bool(node and node.displayed and node.enabled)
+
+    def evaluate(self, check):
+        """
+        Evaluates one assertion tuple against the snapshot and returns (passed, detail).
+        Supported checks:
+            ('text_present', text)               - some view's text contains text
+            ('element_present', resource_id)
+            ('element_text', resource_id, text)  - exact text match
+            ('element_clickable', resource_id)   - displayed and enabled
+            ('text_shown', text[, class_name])   - some view (of that class) shows exactly text
+        """
+        kind = check[0]
+        if kind == 'text_present':
+            node = self.find_by_text(check[1], contains=True)
+            return bool(node and node.displayed), f"text '{check[1]}'"
+        if kind == 'element_present':
+            return self.has_id(check[1]), f"element '{check[1]}'"
+        if kind == 'element_text':
+            found = self.text_of(check[1])
+            return found == check[2], f"element '{check[1]}' text: expected '{check[2]}', found '{found}'"
+        if kind == 'element_clickable':
+            return self.is_clickable(check[1]), f"element '{check[1]}' clickable"
+        if kind == 'text_shown':
+            node = self.find_by_text(check[1], *check[2:3])
+            return node is not None, f"text '{check[1]}' shown"
+        raise ValueError(f"Unknown snapshot check: {kind}")
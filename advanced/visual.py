@@ -0,0 +1,238 @@
+import io
+import sys
+import time
+from functools import lru_cache
+import os
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+CURRENT_FILE = os.path.basename(__file__)
+HEADER_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "header.png")
+# dHash of HASH_SIZE x HASH_SIZE bits; two renders of the same image differ by a few bits at most
+HASH_SIZE = 8
+DEFAULT_MAX_DISTANCE = 8
+DEFAULT_MIN_SCORE = 0.8
+# The reference is located on a copy scaled down until its shorter side is about this many pixels
+SEARCH_SIDE = 24
+MAX_SEARCH_SCALE = 8
+# Sizes the reference is searched at, relative to its own; screens of other densities draw it larger or smaller
+DEFAULT_ZOOMS = tuple(round(1.1 ** step, 3) for step in range(-7, 8))
+# The best coarse match is then refined at this scale, at zooms this close to the one it was found at
+FINE_SCALE = 2
+FINE_ZOOM_STEPS = (0.95, 0.965, 0.98, 1.0, 1.02, 1.035, 1.05)
+
+
+def available():
+    """Whether NumPy and Pillow are installed, which the visual checks need."""
+    return np is not None and Image is not None
+
+
+def _require():
+    if not available():
+        raise ImportError("NumPy and Pillow are required for visual checks: pip install numpy pillow")
+
+
+def dhash(gray):
+    """The difference hash of a grayscale array: one bit per horizontally adjacent pixel pair, as an int."""
+    image = Image.fromarray(np.ascontiguousarray(gray))
+    small = np.asarray(image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.float32)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _downscale(gray, scale):
+    if scale == 1:
+        return gray
+    height, width = gray.shape
+    size = (max(1, width // scale), max(1, height // scale))
+    return np.asarray(Image.fromarray(np.ascontiguousarray(gray)).resize(size, Image.BOX), dtype=np.float32)
+
+
+class ReferenceImage:
+    """
+    A reference image, resized by zoom, with everything a comparison needs computed once:
+    grayscale pixels, search template and dHash.
+    """
+
+    def __init__(self, path, zoom=1.0):
+        _require()
+        self.path = path
+        self.zoom = zoom
+        with Image.open(path) as image:
+            image = image.convert('L')
+            if zoom != 1.0:
+                size = (max(1, round(image.width * zoom)), max(1, round(image.height * zoom)))
+                image = image.resize(size, Image.LANCZOS)
+            self.gray = np.asarray(image, dtype=np.float32)
+        self.height, self.width = self.gray.shape
+        self.scale = max(1, min(MAX_SEARCH_SCALE, min(self.height, self.width) // SEARCH_SIDE))
+        self.hash = dhash(self.gray)
+        self._templates = {}
+
+    def template(self, scale):
+        """The zero-mean search template at a downscale factor, and its norm."""
+        if scale not in self._templates:
+            template = _downscale(self.gray, scale)
+            template = template - template.mean()
+            self._templates[scale] = (template, float(np.sqrt((template ** 2).sum())))
+        return self._templates[scale]
+
+    def __repr__(self):
+        return f"ReferenceImage({os.path.basename(self.path)} x{self.zoom} {self.width}x{self.height} {self.hash:016x})"
+
+
+@lru_cache(maxsize=None)
+def _load_reference(path, modified, zoom):
+    return ReferenceImage(path, zoom)
+
+
+def load_reference(path, zoom=1.0):
+    """Returns the ReferenceImage of a file at a zoom, loading and hashing it only once per process (and per change)."""
+    path = os.path.abspath(path)
+    return _load_reference(path, os.stat(path).st_mtime_ns, zoom)
+
+
+class VisualRegion:
+    """
+    A part of the screen that should look like a reference image. area (x1, y1, x2, y2, in
+    screenshot pixels) bounds where the reference is searched for; None searches the whole
+    screen. The reference is searched for at each of zooms (sizes relative to its own) and the
+    best match wins; the region passes when it correlates at least min_score and its dHash is
+    within max_distance bits of the reference's.
+    """
+
+    def __init__(self, name, reference_path, area=None, max_distance=DEFAULT_MAX_DISTANCE, min_score=DEFAULT_MIN_SCORE,
+                 zooms=DEFAULT_ZOOMS):
+        self.name = name
+        self.reference_path = reference_path
+        self.area = area
+        self.max_distance = max_distance
+        self.min_score = min_score
+        self.zooms = tuple(zooms)
+
+    @property
+    def references(self):
+        return [load_reference(self.reference_path, zoom) for zoom in self.zooms]
+
+    def __repr__(self):
+        return f"VisualRegion({self.name})"
+
+
+class Screenshot:
+    """One decoded screenshot; every region of a visual check is matched against the same capture."""
+
+    def __init__(self, png):
+        _require()
+        with Image.open(io.BytesIO(png)) as image:
+            self.gray = np.asarray(image.convert('L'), dtype=np.float32)
+        self.height, self.width = self.gray.shape
+        self._scaled = {}
+
+    def scaled(self, scale):
+        if scale not in self._scaled:
+            self._scaled[scale] = _downscale(self.gray, scale)
+        return self._scaled[scale]
+
+    def match(self, region):
+        """
+        Locates a region's reference at the zoom that matches best and returns a result dict:
+        name, passed, score, distance, box, zoom, detail.
+        """
+        area = self._clip(region.area or (0, 0, self.width, self.height))
+        coarse = self._best(self._search(reference, reference.scale, area) for reference in region.references)
+        if coarse is None:
+            return self._result(region, False, 0.0, None, None, None,
+                                f"{region.name}: search area is smaller than the reference")
+        # Refine around the coarse match, whose position and zoom are only as exact as its scale and zoom step
+        _, left, top, reference = coarse
+        margin = 2 * reference.scale + round(max(reference.width, reference.height) * (FINE_ZOOM_STEPS[-1] - 1))
+        near = self._clip((max(area[0], left - margin), max(area[1], top - margin),
+                           min(area[2], left + reference.width + 2 * margin),
+                           min(area[3], top + reference.height + 2 * margin)))
+        fine = self._best(self._search(load_reference(region.reference_path, round(reference.zoom * step, 3)),
+                                       FINE_SCALE, near)
+                          for step in FINE_ZOOM_STEPS)
+        score, left, top, reference = self._best([coarse, fine])
+        box = (left, top, left + reference.width, top + reference.height)
+        patch = self.gray[top:top + reference.height, left:left + reference.width]
+        distance = hamming(dhash(patch), reference.hash)
+        passed = score >= region.min_score and distance <= region.max_distance
+        detail = f"{region.name} at {box} (x{reference.zoom}): correlation {score:.2f}, hash distance {distance}"
+        return self._result(region, passed, score, distance, box, reference.zoom, detail)
+
+    def _clip(self, area):
+        x1, y1, x2, y2 = area
+        return max(0, x1), max(0, y1), min(self.width, x2), min(self.height, y2)
+
+    def _search(self, reference, scale, area):
+        """Finds a reference in an area of the screen at a downscale factor: (score, left, top, reference), or None."""
+        x1, y1, x2, y2 = area
+        search = self.scaled(scale)[y1 // scale:y2 // scale, x1 // scale:x2 // scale]
+        template, template_norm = reference.template(scale)
+        if search.shape[0] < template.shape[0] or search.shape[1] < template.shape[1]:
+            return None
+        score, (row, column) = _best_match(search, template, template_norm)
+        return score, (x1 // scale + column) * scale, (y1 // scale + row) * scale, reference
+
+    @staticmethod
+    def _best(matches):
+        return max((match for match in matches if match is not None), key=lambda match: match[0], default=None)
+
+    def _result(self, region, passed, score, distance, box, zoom, detail):
+        return {'name': region.name, 'passed': passed, 'score': score, 'distance': distance, 'box': box,
+                'zoom': zoom, 'detail': detail}
+
+
+def _best_match(search, template, template_norm):
+    """
+    Normalized cross-correlation of a zero-mean template at every offset of search, computed for all
+    offsets at once. Returns the best score and its (row, column).
+    """
+    height, width = template.shape
+    # The window products by FFT: the circular correlation only wraps around at offsets past the last valid one
+    spectrum = np.fft.rfft2(search.astype(np.float64)) * np.conj(np.fft.rfft2(template, s=search.shape))
+    products = np.fft.irfft2(spectrum, s=search.shape)[:search.shape[0] - height + 1, :search.shape[1] - width + 1]
+    # Window sums of x and x^2 from summed-area tables give every window's variance without a loop
+    padded = np.pad(search.astype(np.float64), ((1, 0), (1, 0)))
+    sums = padded.cumsum(0).cumsum(1)
+    squares = (padded ** 2).cumsum(0).cumsum(1)
+
+    def window_sums(table):
+        return table[height:, width:] - table[:-height, width:] - table[height:, :-width] + table[:-height, :-width]
+
+    count = height * width
+    variance = window_sums(squares) - window_sums(sums) ** 2 / count
+    norms = np.sqrt(np.clip(variance, 0, None)) * template_norm
+    # A window flatter than about one gray level cannot match; its score would be FFT rounding noise
+    scores = np.divide(products, norms, out=np.zeros_like(products), where=variance > count)
+    row, column = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return float(scores[row, column]), (int(row), int(column))
+
+
+def check_regions(png, regions):
+    """Matches several regions against one screenshot (PNG bytes) and returns their results and the time taken."""
+    start = time.perf_counter()
+    screenshot = png if isinstance(png, Screenshot) else Screenshot(png)
+    results = [screenshot.match(region) for region in regions]
+    return results, (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    # Usage: python visual.py REFERENCE.png [SCREENSHOT.png]
+    # Prints the reference's dHash and, given a screenshot, where and how well it matches
+    reference_path = sys.argv[1] if len(sys.argv) > 1 else HEADER_IMAGE
+    print(load_reference(reference_path))
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'rb') as f:
+            results, elapsed_ms = check_regions(f.read(), [VisualRegion('reference', reference_path)])
+        for result in results:
+            print(f"{'✅' if result['passed'] else '❌'} {result['detail']} ({elapsed_ms:.0f} ms)")
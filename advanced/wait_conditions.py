@@ -0,0 +1,81 @@
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+
+# Exceptions that mean "the screen is not ready yet" rather than a real failure.
+TRANSIENT_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+
+class ScreenCondition:
+    """
+    A named check against the current screen.
+    Calling it with a driver returns a truthy value (often the element) when the condition holds.
+    Element conditions carry their locator, and whether a match was seen clickable, so the
+    element they return can be reused by the next lookup of the same locator.
+    """
+
+    def __init__(self, description, check, locator=None, clickable=False):
+        self.description = description
+        self.check = check
+        self.locator = locator
+        self.clickable = clickable
+
+    def __call__(self, driver):
+        try:
+            return self.check(driver)
+        except TRANSIENT_EXCEPTIONS:
+            return False
+
+    def __repr__(self):
+        return self.description
+
+
+def activity_is(activity):
+    """The foreground activity matches the given name (full or short '.ui.MainActivity' form)."""
+    expected = activity.split('/')[-1]
+
+    def check(driver):
+        current = driver.current_activity or ''
+        if not current:
+            return False
+        return current == expected or current.endswith(expected) or expected.endswith(current)
+
+    return ScreenCondition(f"activity is '{expected}'", check)
+
+
+def element_present(locator):
+    """An element matching the (by, value) locator exists. Returns the element."""
+    def check(driver):
+        return driver.find_element(*locator)
+
+    return ScreenCondition(f"element present {locator[1]}", check, locator=locator)
+
+
+def element_clickable(locator):
+    """An element matching the locator is displayed and enabled. Returns the element."""
+    def check(driver):
+        element = driver.find_element(*locator)
+        if element.is_displayed() and element.is_enabled():
+            return element
+        return False
+
+    return ScreenCondition(f"element clickable {locator[1]}", check, locator=locator, clickable=True)
+
+
+def element_absent(locator):
+    """No element matches the locator, e.g. the previous screen has gone away."""
+    def check(driver):
+        return len(driver.find_elements(*locator)) == 0
+
+    return ScreenCondition(f"element absent {locator[1]}", check)
+
+
+def all_of(*conditions):
+    """Every condition holds. Returns the result of the last one."""
+    def check(driver):
+        result = True
+        for condition in conditions:
+            result = condition(driver)
+            if not result:
+                return False
+        return result
+
+    return ScreenCondition(" and ".join(c.description for c in conditions), check)